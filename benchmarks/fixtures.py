@@ -0,0 +1,157 @@
+"""
+Synthetic registries and plugins for the benchmarks. Everything is generated locally, so results only depend on the
+machine and the code, not on GitHub or the network.
+"""
+import os
+import shutil
+import threading
+import zipfile
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from typing import Optional
+
+import pygit2
+
+from naevpm.core.config import Config
+
+SIGNATURE = pygit2.Signature('naevpm-benchmark', 'benchmark@naevpm.invalid', 0, 0)
+
+PLUGIN_XML = """<?xml version='1.0' encoding='UTF-8'?>
+<plugin name="{name}">
+  <author>Benchmark</author>
+  <version>1.0.0</version>
+  <description>Synthetic plugin {name} for benchmarks</description>
+  <compatibility>^0.11.0</compatibility>
+  <priority>5</priority>
+  <source>{source}</source>
+</plugin>
+"""
+
+REGISTRY_PLUGIN_XML = """<?xml version='1.0' encoding='UTF-8'?>
+<plugin name="{name}">
+  <author>Benchmark</author>
+  <git>{source}</git>
+  <license>MIT</license>
+  <website>https://naevpm.invalid/{name}</website>
+</plugin>
+"""
+
+
+def _create_tree(repo: pygit2.Repository, files: dict[str, bytes]) -> pygit2.Oid:
+    """
+    @param files: Content by path, with / separating directories
+    """
+    entries = {}
+    for path, content in files.items():
+        name, _, rest = path.partition('/')
+        if rest == '':
+            entries[name] = content
+        else:
+            entries.setdefault(name, {})[rest] = content
+    tree_builder = repo.TreeBuilder()
+    for name, content in entries.items():
+        if isinstance(content, dict):
+            tree_builder.insert(name, _create_tree(repo, content), pygit2.GIT_FILEMODE_TREE)
+        else:
+            tree_builder.insert(name, repo.create_blob(content), pygit2.GIT_FILEMODE_BLOB)
+    return tree_builder.write()
+
+
+def create_bare_repo(path: str, files: dict[str, bytes]) -> str:
+    """
+    Creates a bare repository with one commit of the files on the main branch.
+
+    @return: Commit id
+    """
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    repo = pygit2.init_repository(path, bare=True, initial_head=Config.DEFAULT_GIT_BRANCH_NAME)
+    tree = _create_tree(repo, files)
+    return str(repo.create_commit('HEAD', SIGNATURE, SIGNATURE, 'Initial commit', tree, []))
+
+
+def commit_file(path: str, file_name: str, content: bytes) -> str:
+    """
+    Adds or changes a file in the root of a bare repository with a new commit, like a plugin author pushing an update.
+
+    @return: Commit id
+    """
+    repo = pygit2.Repository(path)
+    head = repo.head.peel(pygit2.Commit)
+    tree_builder = repo.TreeBuilder(head.tree)
+    tree_builder.insert(file_name, repo.create_blob(content), pygit2.GIT_FILEMODE_BLOB)
+    return str(repo.create_commit('HEAD', SIGNATURE, SIGNATURE, f'Change {file_name}', tree_builder.write(),
+                                  [head.id]))
+
+
+def create_registry(path: str, plugin_sources: dict[str, str]):
+    """
+    @param plugin_sources: Source by plugin name
+    """
+    files = {}
+    for name, source in plugin_sources.items():
+        xml = REGISTRY_PLUGIN_XML.format(name=name, source=source)
+        files[f'{Config.PLUGIN_XML_DIR}/{name}.xml'] = xml.encode('utf-8')
+    files['README.md'] = b'Synthetic registry for benchmarks\n'
+    create_bare_repo(path, files)
+
+
+def create_git_plugin(path: str, name: str, file_count: int = 0, file_size: int = 1024):
+    """
+    @param file_count: Number of data files besides plugin.xml, spread over directories of 100 files
+    """
+    files = {'plugin.xml': PLUGIN_XML.format(name=name, source=path).encode('utf-8')}
+    for i in range(file_count):
+        files[f'data/{i // 100:04d}/file{i:06d}.lua'] = (f'-- {name} {i}\n'.encode('utf-8') * file_size)[:file_size]
+    create_bare_repo(path, files)
+
+
+def create_zip_plugin(path: str, name: str, file_count: int = 10, file_size: int = 1024):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr('plugin.xml', PLUGIN_XML.format(name=name, source=path))
+        for i in range(file_count):
+            z.writestr(f'data/file{i:04d}.lua', (f'-- {name} {i}\n'.encode('utf-8') * file_size)[:file_size])
+
+
+class _QuietRequestHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ZipServer:
+    """
+    Serves the files of a directory over HTTP on localhost, standing in for the hosts of remote zip plugins.
+    """
+    directory: str
+    _server: Optional[ThreadingHTTPServer]
+    _thread: Optional[threading.Thread]
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self._server = None
+        self._thread = None
+
+    def url(self, file_name: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/{file_name}'
+
+    def start(self):
+        # Port 0 picks a free port
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietRequestHandler, directory=self.directory))
+        self._thread = threading.Thread(target=self._server.serve_forever, name='naevpm-benchmark-zip-server',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> 'ZipServer':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
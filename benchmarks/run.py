@@ -0,0 +1,542 @@
+"""
+Runs the benchmarks against synthetic local registries and plugins and writes the results as JSON, so they can be
+compared between commits:
+
+    python -m benchmarks.run --output temp/benchmarks/before.json
+    python -m benchmarks.run --compare temp/benchmarks/before.json
+"""
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import click
+import pygit2
+from tabulate import tabulate
+
+from benchmarks import fixtures
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.application_logic import ApplicationLogic, PluginBatchAction
+from naevpm.core.async_application_logic import AsyncApplicationLogic
+from naevpm.core.config import Config
+from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel, PluginState
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.gui.tk_iid_object_sync import TkIidObjSync
+
+RESULTS_VERSION = 1
+
+
+class BenchmarkParams:
+    # Plugins in the registry. Only the git and zip plugins below exist, the others are never fetched.
+    registry_plugins: int
+    # Small git plugins, checked for updates in bulk
+    git_plugins: int
+    # Files in the git plugin which is installed and updated
+    large_tree_files: int
+    # Zip plugins served over HTTP
+    zip_plugins: int
+    # Timed runs per benchmark
+    repeat: int
+
+    def __init__(self, registry_plugins: int = 1000, git_plugins: int = 10, large_tree_files: int = 2000,
+                 zip_plugins: int = 10, repeat: int = 5):
+        super().__init__()
+        self.registry_plugins = registry_plugins
+        self.git_plugins = git_plugins
+        self.large_tree_files = large_tree_files
+        self.zip_plugins = zip_plugins
+        self.repeat = repeat
+
+
+class Fixtures:
+    """
+    Source repositories and files, generated once for all benchmarks.
+    """
+    registry_source: str
+    git_plugin_sources: list[str]
+    large_tree_plugin_source: str
+    zip_plugin_sources: list[str]
+    zip_server: fixtures.ZipServer
+
+    def __init__(self, path: str, params: BenchmarkParams):
+        super().__init__()
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        zip_dir = os.path.join(path, 'zips')
+        os.makedirs(zip_dir)
+        self.zip_server = fixtures.ZipServer(zip_dir)
+        self.zip_server.start()
+
+        plugin_sources = {}
+        self.git_plugin_sources = []
+        for i in range(params.git_plugins):
+            name = f'git{i:04d}'
+            source = os.path.join(path, 'git', name)
+            fixtures.create_git_plugin(source, name)
+            self.git_plugin_sources.append(source)
+            plugin_sources[name] = source
+        self.large_tree_plugin_source = os.path.join(path, 'git', 'large-tree')
+        fixtures.create_git_plugin(self.large_tree_plugin_source, 'large-tree', params.large_tree_files)
+        plugin_sources['large-tree'] = self.large_tree_plugin_source
+        self.zip_plugin_sources = []
+        for i in range(params.zip_plugins):
+            name = f'zip{i:04d}'
+            fixtures.create_zip_plugin(os.path.join(zip_dir, f'{name}.zip'), name)
+            source = self.zip_server.url(f'{name}.zip')
+            self.zip_plugin_sources.append(source)
+            plugin_sources[name] = source
+        for i in range(len(plugin_sources), params.registry_plugins):
+            name = f'synthetic{i:06d}'
+            plugin_sources[name] = f'https://naevpm.invalid/{name}'
+        self.registry_source = os.path.join(path, 'registry')
+        fixtures.create_registry(self.registry_source, plugin_sources)
+
+    def close(self):
+        self.zip_server.stop()
+
+
+class Environment:
+    """
+    A new package manager and Naev directory with its own DB, like after a fresh installation.
+    """
+    config: Config
+    database_connector: SqliteDatabaseConnector
+    logic: ApplicationLogic
+    tc: AbstractCommunication
+
+    def __init__(self, path: str):
+        super().__init__()
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        self.config = Config(os.path.join(path, 'naev-package-manager'), os.path.join(path, 'naev'))
+        self.database_connector = SqliteDatabaseConnector(self.config.DATABASE)
+        self.logic = ApplicationLogic(self.database_connector, self.config)
+        self.tc = AbstractCommunication()
+
+    def add_and_fetch_registry(self, source: str) -> RegistryDbModel:
+        registry = self.logic.add_registry(source, self.tc)
+        self.logic.fetch_registry_plugin_metadatas(registry, self.tc)
+        return registry
+
+    def get_plugins(self, sources: list[str]) -> list[IndexedPluginDbModel]:
+        return [self.logic.get_plugin(source) for source in sources]
+
+    def close(self):
+        self.database_connector.db.close()
+
+
+class Benchmark:
+    """
+    setup is called once, before_run and after_run around each timed call of run. Only run is timed.
+    """
+    name: str
+    path: str
+    fixtures: Fixtures
+    env: Optional[Environment] = None
+
+    def __init__(self, path: str, fixtures_: Fixtures):
+        super().__init__()
+        self.path = path
+        self.fixtures = fixtures_
+
+    def setup(self):
+        pass
+
+    def before_run(self):
+        pass
+
+    def run(self):
+        pass
+
+    def after_run(self):
+        pass
+
+    def teardown(self):
+        if self.env is not None:
+            self.env.close()
+
+
+class RegistryFetch(Benchmark):
+    """
+    Clones the registry, reads its plugin XMLs and saves them in a new DB.
+    """
+    name = 'registry_fetch'
+    registry: RegistryDbModel
+
+    def before_run(self):
+        self.env = Environment(self.path)
+        self.registry = self.env.logic.add_registry(self.fixtures.registry_source, self.env.tc)
+
+    def run(self):
+        self.env.logic.fetch_registry_plugin_metadatas(self.registry, self.env.tc)
+
+    def after_run(self):
+        self.env.close()
+        self.env = None
+
+
+class RegistryReindex(Benchmark):
+    """
+    Fetches an unchanged registry again and reads and saves all its plugin XMLs again.
+    """
+    name = 'registry_reindex'
+    registry: RegistryDbModel
+
+    def setup(self):
+        self.env = Environment(self.path)
+        self.registry = self.env.add_and_fetch_registry(self.fixtures.registry_source)
+
+    def before_run(self):
+        # Otherwise, reading the unchanged commit is skipped
+        self.env.database_connector.set_registry_commit_oid(self.registry.source, None)
+
+    def run(self):
+        self.env.logic.fetch_registry_plugin_metadatas(self.registry, self.env.tc)
+
+
+class PluginListStream(Benchmark):
+    """
+    Streams all plugins from the DB, as plugin list of the CLI does.
+    """
+    name = 'plugin_list_stream'
+
+    def setup(self):
+        self.env = Environment(self.path)
+        self.env.add_and_fetch_registry(self.fixtures.registry_source)
+
+    def run(self):
+        for plugin in self.env.logic.iter_plugins():
+            pass
+
+
+class PluginListIndexLoad(Benchmark):
+    """
+    Loads the in-memory index of all plugins, as the GUI does on start.
+    """
+    name = 'plugin_list_index_load'
+
+    def setup(self):
+        self.env = Environment(self.path)
+        self.env.add_and_fetch_registry(self.fixtures.registry_source)
+
+    def before_run(self):
+        # A new application logic has not loaded the index yet
+        self.env.logic = ApplicationLogic(self.env.database_connector, self.env.config)
+
+    def run(self):
+        self.env.logic.get_plugins()
+
+
+class PluginListPages(Benchmark):
+    """
+    Reads all plugins page by page from the loaded index, as the virtual list of the GUI does while scrolling.
+    """
+    name = 'plugin_list_pages'
+    PAGE_SIZE = 100
+
+    def setup(self):
+        self.env = Environment(self.path)
+        self.env.add_and_fetch_registry(self.fixtures.registry_source)
+        self.env.logic.get_plugins()
+
+    def run(self):
+        count = self.env.logic.count_plugins()
+        for offset in range(0, count, self.PAGE_SIZE):
+            self.env.logic.get_plugins_page(offset, self.PAGE_SIZE)
+
+
+class PluginCheckAll(Benchmark):
+    """
+    Checks all installed git plugins for updates, which fetches from each plugin repository.
+    """
+    name = 'plugin_check_all'
+    plugins: list[IndexedPluginDbModel]
+
+    def setup(self):
+        self.env = Environment(self.path)
+        self.env.add_and_fetch_registry(self.fixtures.registry_source)
+        plugins = self.env.get_plugins(self.fixtures.git_plugin_sources)
+        self.env.logic.run_plugin_batch(PluginBatchAction.FETCH, plugins, self.env.tc)
+        self.env.logic.run_plugin_batch(PluginBatchAction.INSTALL, plugins, self.env.tc)
+
+    def before_run(self):
+        self.plugins = self.env.get_plugins(self.fixtures.git_plugin_sources)
+
+    def run(self):
+        self.env.logic.check_plugins(self.plugins, self.env.tc)
+
+
+class PluginCheckAllAsync(PluginCheckAll):
+    """
+    Checks all installed git plugins for updates concurrently from an event loop.
+    """
+    name = 'plugin_check_all_async'
+
+    def run(self):
+        async def check_plugins():
+            async with AsyncApplicationLogic(self.env.logic) as async_logic:
+                await async_logic.check_plugins(self.plugins, self.env.tc)
+
+        asyncio.run(check_plugins())
+
+
+class PluginInstallLargeTree(Benchmark):
+    """
+    Installs a cached git plugin with many files.
+    """
+    name = 'plugin_install_large_tree'
+    plugin: IndexedPluginDbModel
+
+    def setup(self):
+        self.env = Environment(self.path)
+        self.env.add_and_fetch_registry(self.fixtures.registry_source)
+        self.env.logic.fetch_plugin(self.env.logic.get_plugin(self.fixtures.large_tree_plugin_source), self.env.tc)
+
+    def before_run(self):
+        self.plugin = self.env.logic.get_plugin(self.fixtures.large_tree_plugin_source)
+        if self.plugin.state == PluginState.INSTALLED:
+            self.env.logic.uninstall_plugin(self.plugin, self.env.tc)
+
+    def run(self):
+        self.env.logic.install_plugin(self.plugin, self.env.tc)
+
+
+class PluginUpdateLargeTree(Benchmark):
+    """
+    Updates an installed git plugin with many files after its author pushed a new commit.
+    """
+    name = 'plugin_update_large_tree'
+    plugin: IndexedPluginDbModel
+    _version: int = 0
+
+    def setup(self):
+        self.env = Environment(self.path)
+        self.env.add_and_fetch_registry(self.fixtures.registry_source)
+        plugin = self.env.logic.get_plugin(self.fixtures.large_tree_plugin_source)
+        self.env.logic.fetch_plugin(plugin, self.env.tc)
+        self.env.logic.install_plugin(plugin, self.env.tc)
+
+    def before_run(self):
+        self._version += 1
+        fixtures.commit_file(self.fixtures.large_tree_plugin_source, 'version.txt', str(self._version).encode())
+        self.plugin = self.env.logic.get_plugin(self.fixtures.large_tree_plugin_source)
+
+    def run(self):
+        self.env.logic.update_plugin(self.plugin, self.env.tc)
+
+
+class PluginFetchRemoteZips(Benchmark):
+    """
+    Downloads all zip plugins from the local HTTP server as one batch.
+    """
+    name = 'plugin_fetch_remote_zips'
+    plugins: list[IndexedPluginDbModel]
+
+    def setup(self):
+        self.env = Environment(self.path)
+        self.env.add_and_fetch_registry(self.fixtures.registry_source)
+
+    def before_run(self):
+        plugins = self.env.get_plugins(self.fixtures.zip_plugin_sources)
+        self.env.logic.run_plugin_batch(PluginBatchAction.DELETE, plugins, self.env.tc)
+        self.plugins = self.env.get_plugins(self.fixtures.zip_plugin_sources)
+
+    def run(self):
+        self.env.logic.run_plugin_batch(PluginBatchAction.FETCH, self.plugins, self.env.tc)
+
+
+class PluginFetchRemoteZipsAsync(PluginFetchRemoteZips):
+    """
+    Downloads all zip plugins from the local HTTP server concurrently from an event loop. With aiohttp if installed.
+    """
+    name = 'plugin_fetch_remote_zips_async'
+
+    def run(self):
+        async def fetch_plugins():
+            async with AsyncApplicationLogic(self.env.logic) as async_logic:
+                await async_logic.fetch_plugins(self.plugins, self.env.tc)
+
+        asyncio.run(fetch_plugins())
+
+
+class GuiRowsBulkRemove(Benchmark):
+    """
+    Removes every fifth row from the iid to object map of a large plugin list, as the GUI does after a batch delete.
+    Needs no display.
+    """
+    name = 'gui_rows_bulk_remove'
+    ROWS = 50000
+    REMOVED_ROWS = 10000
+    plugins: list[IndexedPluginDbModel]
+    sync: TkIidObjSync
+
+    def setup(self):
+        self.plugins = [IndexedPluginDbModel(f'name{i:06d}', f'source{i:06d}', PluginState.INDEXED)
+                        for i in range(self.ROWS)]
+
+    def before_run(self):
+        self.sync = TkIidObjSync(lambda plugin: plugin.source)
+        for i, plugin in enumerate(self.plugins):
+            self.sync.put(f'I{i:06d}', plugin)
+
+    def run(self):
+        step = self.ROWS // self.REMOVED_ROWS
+        for plugin in self.plugins[::step]:
+            self.sync.remove_by_object(plugin)
+
+
+BENCHMARKS = [RegistryFetch, RegistryReindex, PluginListStream, PluginListIndexLoad, PluginListPages,
+              PluginCheckAll, PluginCheckAllAsync, PluginInstallLargeTree, PluginUpdateLargeTree,
+              PluginFetchRemoteZips, PluginFetchRemoteZipsAsync, GuiRowsBulkRemove]
+
+
+def time_benchmark(benchmark: Benchmark, repeat: int) -> list[float]:
+    """
+    @return: Seconds of each run
+    """
+    benchmark.setup()
+    try:
+        durations = []
+        for i in range(repeat):
+            benchmark.before_run()
+            start_time = time.perf_counter()
+            benchmark.run()
+            durations.append(time.perf_counter() - start_time)
+            benchmark.after_run()
+        return durations
+    finally:
+        benchmark.teardown()
+
+
+def get_commit_oid() -> Optional[str]:
+    repository_path = pygit2.discover_repository(os.getcwd())
+    if repository_path is None:
+        return None
+    repo = pygit2.Repository(repository_path)
+    return None if repo.head_is_unborn else str(repo.head.target)
+
+
+def run_benchmarks(work_path: str, params: BenchmarkParams, name_filter: Optional[str] = None) -> dict:
+    """
+    @param name_filter: Only runs the benchmarks whose name contains it
+    @return: Results, see write_results
+    """
+    benchmark_results = {}
+    fixtures_ = Fixtures(os.path.join(work_path, 'fixtures'), params)
+    try:
+        for benchmark_class in BENCHMARKS:
+            if name_filter is not None and name_filter not in benchmark_class.name:
+                continue
+            benchmark = benchmark_class(os.path.join(work_path, benchmark_class.name), fixtures_)
+            durations = time_benchmark(benchmark, params.repeat)
+            benchmark_results[benchmark.name] = {
+                'runs': durations,
+                'min': min(durations),
+                'median': statistics.median(durations),
+                'mean': statistics.mean(durations),
+            }
+    finally:
+        fixtures_.close()
+    return {
+        'version': RESULTS_VERSION,
+        'commit': get_commit_oid(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'params': params.__dict__,
+        'benchmarks': benchmark_results,
+    }
+
+
+def write_results(results: dict, path: str):
+    """
+    Durations are in seconds:
+
+        {"version": 1, "commit": "<commit id>", "created": "<ISO date>", "python": "3.11.7", "platform": "...",
+         "params": {"registry_plugins": 1000, ...},
+         "benchmarks": {"registry_fetch": {"runs": [0.52, ...], "min": 0.5, "median": 0.52, "mean": 0.53}, ...}}
+    """
+    directory = os.path.dirname(path)
+    if directory != '' and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+
+
+def compare_results(baseline: dict, results: dict, threshold: float) -> tuple[list[list], list[str]]:
+    """
+    Compares the medians, which are less sensitive to single slow runs than the means.
+
+    @param threshold: e.g. 0.2 reports benchmarks which are more than 20 % slower than the baseline
+    @return: Table rows and the names of the regressed benchmarks
+    """
+    rows = []
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        baseline_result = baseline['benchmarks'].get(name, None)
+        if baseline_result is None:
+            rows.append([name, '', f"{result['median'] * 1000:.1f}", '', 'new'])
+            continue
+        ratio = result['median'] / baseline_result['median']
+        status = ''
+        if ratio > 1 + threshold:
+            status = 'slower'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = 'faster'
+        rows.append([name, f"{baseline_result['median'] * 1000:.1f}", f"{result['median'] * 1000:.1f}",
+                     f'{ratio:.2f}', status])
+    return rows, regressions
+
+
+@click.command()
+@click.option('--output', 'output_path', type=click.Path(dir_okay=False),
+              help='Path of the JSON results. Default: temp/benchmarks/<commit id>.json')
+@click.option('--compare', 'baseline_path', type=click.Path(exists=True, dir_okay=False),
+              help='JSON results to compare with. Exits with 1 if a benchmark regressed.')
+@click.option('--threshold', type=float, default=0.2, show_default=True,
+              help='Relative slowdown of the median which counts as regression.')
+@click.option('-k', 'name_filter', help='Only run the benchmarks whose name contains this.')
+@click.option('--work-dir', 'work_path', type=click.Path(file_okay=False), default='temp/benchmarks/work',
+              show_default=True, help='Directory for fixtures and environments. Deleted and created again.')
+@click.option('--repeat', type=int, default=BenchmarkParams().repeat, show_default=True)
+@click.option('--registry-plugins', type=int, default=BenchmarkParams().registry_plugins, show_default=True)
+@click.option('--git-plugins', type=int, default=BenchmarkParams().git_plugins, show_default=True)
+@click.option('--large-tree-files', type=int, default=BenchmarkParams().large_tree_files, show_default=True)
+@click.option('--zip-plugins', type=int, default=BenchmarkParams().zip_plugins, show_default=True)
+def main(output_path: Optional[str], baseline_path: Optional[str], threshold: float, name_filter: Optional[str],
+         work_path: str, repeat: int, registry_plugins: int, git_plugins: int, large_tree_files: int,
+         zip_plugins: int):
+    params = BenchmarkParams(registry_plugins, git_plugins, large_tree_files, zip_plugins, repeat)
+    results = run_benchmarks(work_path, params, name_filter)
+    if output_path is None:
+        output_path = os.path.join('temp', 'benchmarks', f"{results['commit'] or 'results'}.json")
+    write_results(results, output_path)
+
+    print(tabulate([[name, f"{result['min'] * 1000:.1f}", f"{result['median'] * 1000:.1f}",
+                     f"{result['mean'] * 1000:.1f}"]
+                    for name, result in results['benchmarks'].items()],
+                   headers=['Benchmark', 'Min ms', 'Median ms', 'Mean ms']))
+    print(f'Results written to {output_path}')
+    if baseline_path is not None:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params', None) != results['params']:
+            print('Warning: The baseline was run with other parameters', file=sys.stderr)
+        rows, regressions = compare_results(baseline, results, threshold)
+        print()
+        print(tabulate(rows, headers=['Benchmark', 'Baseline ms', 'Median ms', 'Ratio', '']))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,338 @@
+import json
 import locale
 import logging
+import os
+import sys
+from contextlib import closing
 from datetime import datetime, timezone
+from typing import Optional, TYPE_CHECKING, Any, TextIO
+
 import click
-from tabulate import tabulate
 
 from naevpm.core import models
 from naevpm.core.abstract_thread_communication import AbstractCommunication
-from naevpm.core.application_logic import ApplicationLogic, ApplicationLogicRegistrySourceWasAlreadyAdded, \
-    ApplicationLogicEmptyRegistrySource
-from naevpm.core.config import Config
-from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel
-from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.core.config import Config, ConfigInvalid
+from naevpm.core.models import to_record
+from naevpm.core.progress import Progress
+from naevpm.core.timing import Timings
 from naevpm.gui import display_utils
-from naevpm.gui.data_model_to_str_list import registry_to_str_list, plugin_to_str_list
+from naevpm.gui.display_utils import display_progress
+from naevpm.gui.data_model_to_str_list import registry_to_str_list, plugin_to_str_list, span_stats_headers, \
+    span_stats_to_str_list
+
+if TYPE_CHECKING:
+    # Creating the application logic is deferred until a command needs it
+    from naevpm.core.application_logic import ApplicationLogic
 
-config = Config()
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
-database_connector = SqliteDatabaseConnector(config.DATABASE)
-logic = ApplicationLogic(database_connector, config)
 
 
 class Communication(AbstractCommunication):
-
-    def message(self, msg: str, delay: bool = False):
-        super().message(msg, delay)
-        logger.info(msg)
-
-
-comm = Communication()
-
-
-def reminders():
-    registry_update_reminder()
-
-
-def registry_update_reminder():
+    # The progress meter is drawn on it
+    stderr: TextIO
+
+    def __init__(self, stderr: Optional[TextIO] = None):
+        super().__init__()
+        self.stderr = stderr if stderr is not None else sys.stderr
+
+    def message(self, msg: str, delay: bool = False, level: int = logging.INFO):
+        super().message(msg, delay, level)
+        logger.log(level, msg)
+
+    def progress(self, progress: Progress):
+        # Only draw a live meter on a terminal. Redirected output would be cluttered by the carriage returns.
+        if not self.stderr.isatty():
+            return
+        line = f'{progress.label}: {display_progress(progress)}'
+        self.stderr.write(f'\r{line:<79}')
+        if progress.finished:
+            self.stderr.write('\n')
+        self.stderr.flush()
+
+
+class DaemonRequest:
+    """
+    Passed as object to root by the daemon to run the command of a client. The command writes to the streams of the
+    request instead of the streams of the process, and path arguments are resolved against the working directory of
+    the client, so the daemon or the GUI serving the command keeps its own output and working directory. Sources are
+    identifiers and not resolved.
+    """
+    # Application logic of the daemon, which outlives the command
+    logic: 'ApplicationLogic'
+    cwd: str
+    stdout: TextIO
+    stderr: TextIO
+
+    def __init__(self, logic: 'ApplicationLogic', cwd: str, stdout: TextIO, stderr: TextIO):
+        super().__init__()
+        self.logic = logic
+        self.cwd = cwd
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class CliContext:
+    """
+    Context object of the commands. DB and application logic are only created when a command uses them, so e.g.
+    --help does not open the DB.
+    """
+    comm: Communication
+    config: Config
+    # Timings of the command
+    timings: Timings
+    # Print the timings when closing
+    print_timings: bool
+    # Relative paths in the arguments are relative to it
+    cwd: str
+    stdout: TextIO
+    stderr: TextIO
+    _logic: Optional['ApplicationLogic']
+    # Application logic of the daemon, which outlives the command
+    _shared_logic: Optional['ApplicationLogic']
+    # Enabled state of the timings of the shared application logic before show_timings
+    _shared_timings_enabled: Optional[bool]
+
+    def __init__(self, config: Config, timings: Optional[Timings] = None,
+                 request: Optional[DaemonRequest] = None):
+        """
+        @param request: Its application logic is used instead of creating one and not closed with the context.
+        """
+        super().__init__()
+        shared_logic = request.logic if request is not None else None
+        self.cwd = request.cwd if request is not None else os.getcwd()
+        self.stdout = request.stdout if request is not None else sys.stdout
+        self.stderr = request.stderr if request is not None else sys.stderr
+        self.comm = Communication(self.stderr)
+        self.config = config
+        if shared_logic is not None:
+            self.timings = shared_logic.timings
+        else:
+            self.timings = timings if timings is not None else Timings()
+        self.print_timings = False
+        self._logic = None
+        self._shared_logic = shared_logic
+        self._shared_timings_enabled = None
+
+    def show_timings(self):
+        """
+        Prints the timings of the command when closing. The timings of a shared application logic also contain the
+        steps of the commands before, so the steps are recorded in own timings of the command while it runs. The
+        timings of the shared application logic are enabled meanwhile and left as they were when closing.
+        """
+        self.print_timings = True
+        if self._shared_logic is None:
+            self.timings.enabled = True
+            return
+        shared_timings = self._shared_logic.timings
+        self._shared_timings_enabled = shared_timings.enabled
+        self.timings = Timings(enabled=True)
+        shared_timings.add_listener(self.timings.record)
+        shared_timings.enabled = True
+
+    def path(self, path: str) -> str:
+        """
+        @return: The path argument resolved against the working directory of the command
+        """
+        return os.path.join(self.cwd, path)
+
+    @property
+    def logic(self) -> 'ApplicationLogic':
+        return self._get_logic(create_db=True)
+
+    @property
+    def read_only_logic(self) -> 'ApplicationLogic':
+        """
+        For commands which only read the index. A missing DB and its directory are not created, the index is empty
+        then.
+        """
+        return self._get_logic(create_db=False)
+
+    def _get_logic(self, create_db: bool) -> 'ApplicationLogic':
+        if self._logic is None and self._shared_logic is not None:
+            self._logic = self._shared_logic
+        elif self._logic is None:
+            from naevpm.core.application_logic import ApplicationLogic
+            from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+            database_connector = SqliteDatabaseConnector(self.config.DATABASE, create_db)
+            self._logic = ApplicationLogic(database_connector, self.config, self.timings)
+        return self._logic
+
+    def close(self):
+        # Commands which did not need the DB do not pay for the reminders
+        if self._logic is not None:
+            reminders(self._logic)
+            if self._logic is not self._shared_logic:
+                self._logic.close()
+        if self.print_timings:
+            print_timings(self.timings, self.stderr)
+        if self._shared_timings_enabled is not None:
+            shared_timings = self._shared_logic.timings
+            shared_timings.remove_listener(self.timings.record)
+            shared_timings.enabled = self._shared_timings_enabled
+
+
+def print_timings(timings: Timings, file: TextIO):
+    """
+    @param file: stderr of the command, so its output can still be piped
+    """
+    from tabulate import tabulate
+    print(tabulate([span_stats_to_str_list(stats) for stats in timings.get_stats()], headers=span_stats_headers,
+                   colalign=['left'] + ['right'] * (len(span_stats_headers) - 1)),
+          file=file)
+
+
+def start_profiling(ctx: click.Context, profile_path: str):
+    """
+    Profiles the command with cProfile. The stats are written to the path when the command ends and can be read with
+    pstats or viewers like snakeviz.
+    """
+    import cProfile
+    profiler = cProfile.Profile()
+
+    def stop_profiling():
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        logger.info(f'Profile written to {profile_path}')
+
+    # Registered first, so it is called after the other close callbacks and profiles them too
+    ctx.call_on_close(stop_profiling)
+    profiler.enable()
+
+
+def reminders(logic: 'ApplicationLogic'):
+    registry_update_reminder(logic)
+
+
+def registry_update_reminder(logic: 'ApplicationLogic'):
     # Remind the player to update their registries once in a while.
-    registries = logic.get_registries()
-    for r in registries:
-        last_fetched = r.last_fetched
-        if last_fetched is None:
-            continue
-        now = datetime.now(timezone.utc)
-        delta = now - last_fetched
-
-        if delta.days >= 7:
-            logger.info("It has been more than 7 days since you last updated your local package registry.")
-            logger.info("To update, run naevpm registry update. Updating is recommended to keep")
-            logger.info("up to date on the latest plugins for Naev.")
+    # Streamed, so commands which did not need the whole index do not load it for the reminder. Closed right away,
+    # so writes of other threads, e.g. other commands of the daemon, do not wait longer than needed.
+    with closing(logic.iter_registries()) as registries:
+        for r in registries:
+            last_fetched = r.last_fetched
+            if last_fetched is None:
+                continue
+            now = datetime.now(timezone.utc)
+            delta = now - last_fetched
+
+            if delta.days >= 7:
+                logger.info("It has been more than 7 days since you last updated your local package registry.")
+                logger.info("To update, run naevpm registry update. Updating is recommended to keep")
+                logger.info("up to date on the latest plugins for Naev.")
+
+
+OUTPUT_FORMATS = ['table', 'jsonl', 'tsv']
+output_format_option = click.option('--format', 'output_format', type=click.Choice(OUTPUT_FORMATS), default='table',
+                                    show_default=True,
+                                    help='table for humans. jsonl (one JSON object per line) and tsv (tab separated '
+                                         'values with a header line) are written while the rows are read.')
+# Fields of the records written by batch commands for each item
+BATCH_RESULT_FIELDS = ['source', 'status', 'error']
+
+
+def tsv_value(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    # Escapes, so every record stays on one line with the same number of columns
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class RecordWriter:
+    """
+    Writes records to stdout of the command in one of the output formats. jsonl and tsv are written record by record.
+    The table is printed when closing, as its column widths depend on all rows.
+    """
+    _output_format: str
+    _fields: list[str]
+    _file: TextIO
+    # Only for output format table
+    _table: list[list[Any]]
+    _flush: bool
+
+    def __init__(self, output_format: str, fields: list[str], file: TextIO, flush: bool = False):
+        """
+        @param file: stdout of the command
+        @param flush: Flush after every record, e.g. for batches whose items take long, so consumers of a pipe see
+        each result immediately.
+        """
+        super().__init__()
+        self._output_format = output_format
+        self._fields = fields
+        self._file = file
+        self._table = []
+        self._flush = flush
+        if output_format == 'tsv':
+            print('\t'.join(fields), file=file)
+
+    def write(self, record: dict[str, Any], display_values: Optional[list[str]] = None):
+        """
+        @param display_values: Values for the table. By default, the values of the record are shown.
+        """
+        if self._output_format == 'jsonl':
+            print(json.dumps(record, ensure_ascii=False), file=self._file, flush=self._flush)
+        elif self._output_format == 'tsv':
+            print('\t'.join(tsv_value(record[field]) for field in self._fields), file=self._file, flush=self._flush)
+        else:
+            if display_values is None:
+                display_values = ['' if record[field] is None else record[field] for field in self._fields]
+            self._table.append(display_values)
+
+    def close(self):
+        if self._output_format == 'table':
+            # Importing tabulate takes long compared to the other imports. Only commands printing tables need it.
+            from tabulate import tabulate
+            print(tabulate(self._table,
+                           headers=[display_utils.field_name_as_list_header(field) for field in self._fields]),
+                  file=self._file)
+
+
+def batch_result_record(source: str, e: Optional[Exception]) -> dict[str, Any]:
+    return {
+        'source': source,
+        'status': 'ok' if e is None else 'error',
+        'error': None if e is None else str(e)
+    }
 
 
 @click.group()
-def root():
-    reminders()
-    pass
+@click.option('-v', '--verbose', is_flag=True, help='Also show the detailed steps of the commands.')
+@click.option('--timings', is_flag=True, help='Show the duration, bytes and items of the steps of the command.')
+@click.option('--profile', 'profile_path', metavar='PATH', type=click.Path(dir_okay=False),
+              help='Profile the command with cProfile and write the stats to PATH.')
+@click.option('--config', 'config_path', metavar='PATH', type=click.Path(dir_okay=False),
+              help=f'Read the settings from PATH instead of the default config file. Also set by '
+                   f'${Config.CONFIG_PATH_VARIABLE}.')
+@click.option('--naevpm-root', metavar='DIR', type=click.Path(file_okay=False),
+              help='Directory of the data of the package manager. Also set by $NAEVPM_ROOT.')
+@click.option('--naev-root', metavar='DIR', type=click.Path(file_okay=False),
+              help='Data directory of Naev, whose plugins directory the plugins are installed into. Also set by '
+                   '$NAEV_ROOT.')
+@click.pass_context
+def root(ctx: click.Context, verbose: bool, timings: bool, profile_path: Optional[str], config_path: Optional[str],
+         naevpm_root: Optional[str], naev_root: Optional[str]):
+    if verbose:
+        logger.setLevel(logging.DEBUG)
+    request: Optional[DaemonRequest] = ctx.obj
+    if profile_path is not None:
+        start_profiling(ctx, os.path.join(request.cwd, profile_path) if request is not None else profile_path)
+    if request is not None:
+        config = request.logic.config
+    else:
+        try:
+            config = Config.load({'naevpm_root': naevpm_root, 'naev_root': naev_root}, config_path)
+        except ConfigInvalid as e:
+            logger.error(str(e))
+            ctx.exit(1)
+    # Metrics are recorded from the timings
+    cli_context = CliContext(config, Timings(enabled=config.RECORD_METRICS), request)
+    if timings:
+        cli_context.show_timings()
+    ctx.obj = cli_context
+    # Reminders are shown after the command
+    ctx.call_on_close(cli_context.close)
 
 
 @root.group()
@@ -62,51 +340,52 @@ def registry():
     pass
 
 
-def create_plugin_table(plugins: list[IndexedPluginDbModel]):
-    table = []
-    for p in plugins:
-        table.append(plugin_to_str_list(p))
-    return table
-
-
-def create_registry_table(registries: list[RegistryDbModel]):
-    table = []
-    for r in registries:
-        table.append(registry_to_str_list(r))
-    return table
-
-
 @registry.command("list")
-def registry_list():
-    registries = logic.get_registries()
-    print(tabulate(create_registry_table(registries),
-                   headers=[display_utils.field_name_as_list_header(field) for field in models.registry_fields]))
+@output_format_option
+@click.pass_obj
+def registry_list(obj: CliContext, output_format: str):
+    writer = RecordWriter(output_format, models.registry_fields, obj.stdout)
+    with closing(obj.read_only_logic.iter_registries()) as registries:
+        for r in registries:
+            writer.write(to_record(r, models.registry_fields), registry_to_str_list(r))
+    writer.close()
 
 
 @registry.command("fetch")
 @click.argument("source")
-def registry_fetch(source: str):
-    r = database_connector.get_registry(source.strip())
+@click.pass_obj
+def registry_fetch(obj: CliContext, source: str):
+    r = obj.logic.get_registry(source.strip())
     if r is None:
         logger.warning('Could not fetch as registry is not added')
     else:
-        logic.fetch_registry_plugin_metadatas(r, comm)
+        obj.logic.fetch_registry_plugin_metadatas(r, obj.comm)
 
 
 @registry.command("fetch-all")
-def registry_fetch():
-    registries = database_connector.get_registries()
-    for r in registries:
-        logic.fetch_registry_plugin_metadatas(r, comm)
+@output_format_option
+@click.pass_obj
+def registry_fetch(obj: CliContext, output_format: str):
+    registries = obj.logic.get_registries()
+    writer = RecordWriter(output_format, BATCH_RESULT_FIELDS, obj.stdout, flush=True)
+
+    def on_item_done(source: str, e: Optional[Exception]):
+        writer.write(batch_result_record(source, e))
+
+    obj.logic.fetch_registries_plugin_metadatas(registries, obj.comm, on_item_done)
+    writer.close()
 
 
 @registry.command("add")
 @click.argument("source")
-def registry_add(source: str):
+@click.pass_obj
+def registry_add(obj: CliContext, source: str):
     if source not in TRUSTED:
         logger.warning(UNTRUSTED_WARNING)
+    from naevpm.core.application_logic import ApplicationLogicRegistrySourceWasAlreadyAdded, \
+        ApplicationLogicEmptyRegistrySource
     try:
-        logic.add_registry(source.strip(), comm)
+        obj.logic.add_registry(source.strip(), obj.comm)
     except ApplicationLogicRegistrySourceWasAlreadyAdded:
         logger.warning("Already added")
     except ApplicationLogicEmptyRegistrySource:
@@ -115,10 +394,11 @@ def registry_add(source: str):
 
 @registry.command("remove")
 @click.argument("source")
-def registry_add(source: str):
-    r = logic.get_registry(source.strip())
+@click.pass_obj
+def registry_add(obj: CliContext, source: str):
+    r = obj.logic.get_registry(source.strip())
     if r is not None:
-        logic.remove_registry(r, comm)
+        obj.logic.remove_registry(r, obj.comm)
 
 
 # https://github.com/naev/naev-plugins is the only trusted
@@ -140,109 +420,367 @@ def plugin():
 
 
 @plugin.command(name='list')
-def plugin_list():
-    plugins = logic.get_plugins()
-    print(tabulate(create_plugin_table(plugins),
-                   headers=[display_utils.field_name_as_list_header(field) for field in models.indexed_plugin_fields]))
+@output_format_option
+@click.pass_obj
+def plugin_list(obj: CliContext, output_format: str):
+    writer = RecordWriter(output_format, models.indexed_plugin_fields, obj.stdout)
+    with closing(obj.read_only_logic.iter_plugins()) as plugins:
+        for p in plugins:
+            writer.write(to_record(p, models.indexed_plugin_fields), plugin_to_str_list(p))
+    writer.close()
 
 
 @plugin.command('delete')
 @click.argument("source")
-def plugin_delete(source: str):
-    p = logic.get_plugin(source)
+@click.pass_obj
+def plugin_delete(obj: CliContext, source: str):
+    p = obj.logic.get_plugin(source)
     if p is None:
         logger.warning('Plugin is not in index')
     else:
         try:
-            logic.delete_plugin(p, comm)
+            obj.logic.delete_plugin(p, obj.comm)
         except AssertionError:
             logger.error(f'Operation invalid for state {p.state.name} of plugin.')
 
 
 @plugin.command('fetch')
 @click.argument("source")
-def plugin_fetch(source: str):
-    p = logic.get_plugin(source)
+@click.pass_obj
+def plugin_fetch(obj: CliContext, source: str):
+    p = obj.logic.get_plugin(source)
     if p is None:
         logger.warning('Plugin is not in index')
     else:
         try:
-            logic.fetch_plugin(p, comm)
+            obj.logic.fetch_plugin(p, obj.comm)
         except AssertionError:
             logger.error(f'Operation invalid for state {p.state.name} of plugin.')
 
 
 @plugin.command('install')
 @click.argument("source")
-def plugin_install(source: str):
-    p = logic.get_plugin(source)
+@click.pass_obj
+def plugin_install(obj: CliContext, source: str):
+    p = obj.logic.get_plugin(source)
     if p is None:
         logger.warning('Plugin is not in index')
     else:
         try:
-            logic.install_plugin(p, comm)
+            obj.logic.install_plugin(p, obj.comm)
         except AssertionError:
             logger.error(f'Operation invalid for state {p.state.name} of plugin.')
 
 
 @plugin.command('remove')
 @click.argument("source")
-def plugin_remove(source: str):
-    p = logic.get_plugin(source)
+@click.pass_obj
+def plugin_remove(obj: CliContext, source: str):
+    p = obj.logic.get_plugin(source)
     if p is None:
         logger.warning('Plugin is not in index')
     else:
         try:
-            logic.remove_plugin(p, comm)
+            obj.logic.remove_plugin(p, obj.comm)
         except AssertionError:
             logger.error(f'Operation invalid for state {p.state.name} of plugin.')
 
 
 @plugin.command('uninstall')
 @click.argument("source")
-def plugin_uninstall(source: str):
-    p = logic.get_plugin(source)
+@click.pass_obj
+def plugin_uninstall(obj: CliContext, source: str):
+    p = obj.logic.get_plugin(source)
     if p is None:
         logger.warning('Plugin is not in index')
     else:
         try:
-            logic.uninstall_plugin(p, comm)
+            obj.logic.uninstall_plugin(p, obj.comm)
         except AssertionError:
             logger.error(f'Operation invalid for state {p.state.name} of plugin.')
 
 
 @plugin.command('update')
 @click.argument("source")
-def plugin_update(source: str):
-    p = logic.get_plugin(source)
+@click.pass_obj
+def plugin_update(obj: CliContext, source: str):
+    p = obj.logic.get_plugin(source)
     if p is None:
         logger.warning('Plugin is not in index')
     else:
         try:
-            logic.update_plugin(p, comm)
+            obj.logic.update_plugin(p, obj.comm)
         except AssertionError:
             logger.error(f'Operation invalid for state {p.state.name} of plugin.')
 
 
 @plugin.command('check-for-update')
 @click.argument("source")
-def plugin_check_for_update(source: str):
-    p = logic.get_plugin(source)
+@click.pass_obj
+def plugin_check_for_update(obj: CliContext, source: str):
+    p = obj.logic.get_plugin(source)
     if p is None:
         logger.warning('Plugin is not in index')
     else:
         try:
-            logic.check_plugin(p, comm)
+            obj.logic.check_plugin(p, obj.comm)
         except AssertionError:
             logger.error(f'Operation invalid for state {p.state.name} of plugin.')
 
 
 @plugin.command('check-all-for-update')
-def plugin_check_for_update():
-    plugins = logic.get_plugins()
-    for p in plugins:
-        if p.state == models.PluginState.INSTALLED:
-            logic.check_plugin(p, comm)
+@output_format_option
+@click.pass_obj
+def plugin_check_for_update(obj: CliContext, output_format: str):
+    plugins = obj.logic.get_plugins()
+    plugins_by_source = {p.source: p for p in plugins}
+    writer = RecordWriter(output_format, BATCH_RESULT_FIELDS + ['update_available'], obj.stdout, flush=True)
+
+    def on_item_done(source: str, e: Optional[Exception]):
+        record = batch_result_record(source, e)
+        # The check sets the field of the plugin
+        record['update_available'] = plugins_by_source[source].update_available
+        writer.write(record)
+
+    # The plugins are checked concurrently
+    import asyncio
+    from naevpm.core.async_application_logic import AsyncApplicationLogic
+
+    async def check_plugins():
+        async with AsyncApplicationLogic(obj.logic) as async_logic:
+            await async_logic.check_plugins(plugins, obj.comm, on_item_done)
+
+    asyncio.run(check_plugins())
+    writer.close()
+
+
+@root.group()
+def index():
+    pass
+
+
+@index.command('export')
+@click.argument("path")
+@click.option('--force', is_flag=True, help='Overwrite the file at PATH if it exists.')
+@click.pass_obj
+@click.pass_context
+def index_export(ctx: click.Context, obj: CliContext, path: str, force: bool):
+    try:
+        obj.logic.export_index(obj.path(path), obj.comm, force)
+    except FileExistsError:
+        logger.error(f'{path} already exists. Use --force to overwrite it.')
+        ctx.exit(1)
+
+
+@index.command('import')
+@click.argument("path")
+@click.pass_obj
+def index_import(obj: CliContext, path: str):
+    from naevpm.core.sqlite_database_connector import IndexSnapshotVersionNotSupported
+    try:
+        obj.logic.import_index(obj.path(path), obj.comm)
+    except IndexSnapshotVersionNotSupported as e:
+        logger.error(str(e))
+
+
+# Fields of the records written by apply for each plugin
+APPLY_RESULT_FIELDS = ['source', 'actions', 'status', 'error']
+
+
+@root.command('apply')
+@click.argument("manifest_path", metavar='MANIFEST')
+@click.option('--dry-run', is_flag=True, help='Only show the planned actions.')
+@output_format_option
+@click.pass_obj
+@click.pass_context
+def apply(ctx: click.Context, obj: CliContext, manifest_path: str, dry_run: bool, output_format: str):
+    """
+    Fetches, installs, updates and uninstalls plugins, so exactly the plugins of the manifest are installed.
+    Plugins are handled concurrently. Applying the same manifest again does nothing.
+    """
+    from naevpm.core.manifest import read_manifest, ManifestInvalid
+    try:
+        manifest = read_manifest(obj.path(manifest_path))
+    except (ManifestInvalid, OSError) as e:
+        logger.error(str(e))
+        ctx.exit(1)
+    plan = obj.logic.plan_manifest(manifest)
+    actions_by_source = {plugin_plan.plugin.source: ','.join(action.name.lower() for action in plugin_plan.actions)
+                         for plugin_plan in plan.plugin_plans}
+    writer = RecordWriter(output_format, APPLY_RESULT_FIELDS, obj.stdout, flush=True)
+    for source in plan.missing_sources:
+        writer.write({'source': source, 'actions': '', 'status': 'error',
+                      'error': 'Not in index. Fetch the registries first.'})
+    failed = len(plan.missing_sources) > 0
+    if dry_run:
+        for source, actions in actions_by_source.items():
+            writer.write({'source': source, 'actions': actions, 'status': 'planned', 'error': None})
+    else:
+        def on_item_done(source: str, e: Optional[Exception]):
+            nonlocal failed
+            failed = failed or e is not None
+            writer.write({'source': source, 'actions': actions_by_source[source], **batch_result_record(source, e)})
+
+        obj.logic.apply_plan(plan, obj.comm, on_item_done)
+    writer.close()
+    if failed:
+        ctx.exit(1)
+
+
+@root.command('lock')
+@click.argument("manifest_path", metavar='MANIFEST')
+@click.pass_obj
+def lock(obj: CliContext, manifest_path: str):
+    """
+    Writes a manifest of the installed plugins, pinned to their installed content. Applying it installs exactly the
+    same plugins again.
+    """
+    from naevpm.core.manifest import write_manifest
+    manifest = obj.logic.create_lockfile_manifest()
+    write_manifest(manifest, obj.path(manifest_path))
+    obj.comm.message(f"Locked: {len(manifest.entries)} plugins to {manifest_path}")
+
+
+# Fields of the records written by verify for each plugin
+VERIFY_RESULT_FIELDS = ['source', 'status', 'expected', 'actual']
+
+
+@root.command('verify')
+@click.argument("manifest_path", metavar='MANIFEST')
+@output_format_option
+@click.pass_obj
+@click.pass_context
+def verify(ctx: click.Context, obj: CliContext, manifest_path: str, output_format: str):
+    """
+    Checks without network access that the plugins of the manifest are installed with the pinned content and were not
+    modified. Exits with 1 if any plugin is not ok.
+    """
+    from naevpm.core.manifest import read_manifest, ManifestInvalid, PluginVerifyResult
+    from naevpm.core.plugin_workflows.plugin_workflow import VerifyStatus
+    try:
+        manifest = read_manifest(obj.path(manifest_path))
+    except (ManifestInvalid, OSError) as e:
+        logger.error(str(e))
+        ctx.exit(1)
+    writer = RecordWriter(output_format, VERIFY_RESULT_FIELDS, obj.stdout, flush=True)
+    failed = False
+
+    def on_item_done(result: PluginVerifyResult):
+        nonlocal failed
+        failed = failed or result.status != VerifyStatus.OK
+        writer.write({'source': result.source, 'status': result.status.name.lower(),
+                      'expected': result.expected_content_hash, 'actual': result.actual_content_hash})
+
+    obj.logic.verify_manifest(manifest, obj.comm, on_item_done)
+    writer.close()
+    if failed:
+        ctx.exit(1)
+
+
+# Fields of the records written by stats for each operation. Durations in milliseconds.
+STATS_FIELDS = ['operation', 'count', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'bytes', 'bytes_per_op', 'items']
+
+
+@root.command('stats')
+@click.option('--days', type=click.IntRange(min=1), default=30, show_default=True,
+              help='Only include the steps of the last days.')
+@output_format_option
+@click.pass_obj
+def stats(obj: CliContext, days: int, output_format: str):
+    """
+    Shows percentiles of the durations of the recorded steps, the bytes they transferred, cache hit rates and the DB
+    size over time.
+    """
+    from naevpm.core.metrics import get_cache_hit_rates
+
+    def milliseconds(seconds: Optional[float]) -> Optional[float]:
+        return None if seconds is None else round(seconds * 1000, 1)
+
+    operation_stats = obj.read_only_logic.get_operation_stats(days)
+    writer = RecordWriter(output_format, STATS_FIELDS, obj.stdout)
+    for s in operation_stats:
+        bytes_per_op = s.bytes // s.count if s.count > 0 else 0
+        record = {
+            'operation': s.name, 'count': s.count,
+            'p50_ms': milliseconds(s.p50), 'p90_ms': milliseconds(s.p90), 'p99_ms': milliseconds(s.p99),
+            'max_ms': milliseconds(s.max), 'bytes': s.bytes, 'bytes_per_op': bytes_per_op, 'items': s.items,
+        }
+        writer.write(record, [s.name, s.count, record['p50_ms'], record['p90_ms'], record['p99_ms'], record['max_ms'],
+                              display_utils.display_size(s.bytes) if s.bytes > 0 else '',
+                              display_utils.display_size(bytes_per_op) if bytes_per_op > 0 else '',
+                              s.items if s.items > 0 else ''])
+    writer.close()
+
+    for cache, hit_rate in get_cache_hit_rates(operation_stats).items():
+        if hit_rate is not None:
+            obj.comm.message(f"Cache hit rate: {cache} {hit_rate * 100:.1f} %")
+    database_sizes = obj.read_only_logic.get_database_sizes(days)
+    if len(database_sizes) > 0:
+        last_day, last_size = database_sizes[-1]
+        message = f"DB size: {display_utils.display_size(last_size)} on {last_day}"
+        if len(database_sizes) > 1:
+            first_day, first_size = database_sizes[0]
+            message += f", {display_utils.display_size(first_size)} on {first_day}"
+        obj.comm.message(message)
+
+
+@root.group()
+def daemon():
+    """
+    Runs the commands of naevpm in one long-running process, which keeps the DB open and the caches warm. naevpm
+    runs its commands in the daemon while it is running, else in its own process. The GUI serves the commands too
+    while it is open.
+    """
+    pass
+
+
+@daemon.command('run')
+@click.pass_obj
+@click.pass_context
+def daemon_run(ctx: click.Context, obj: CliContext):
+    """
+    Serves the commands until naevpm daemon stop, Ctrl+C or SIGTERM.
+    """
+    from naevpm.daemon import DaemonServer, DaemonAlreadyRunning, DaemonNotSupported
+    server = DaemonServer(obj.logic, obj.config.DAEMON_SOCKET)
+    try:
+        server.start()
+    except (DaemonAlreadyRunning, DaemonNotSupported) as e:
+        logger.error(str(e))
+        ctx.exit(1)
+    obj.comm.message(f"Serving on {server.socket_path}")
+    server.wait()
+    obj.comm.message(f"Stopped after {server.requests_served} commands")
+
+
+@daemon.command('stop')
+@click.pass_obj
+def daemon_stop(obj: CliContext):
+    """
+    Stops the daemon after its current command.
+    """
+    from naevpm.daemon import send_control
+    if send_control(obj.config.DAEMON_SOCKET, 'stop') is None:
+        logger.warning('No daemon is running')
+    else:
+        obj.comm.message('Daemon is stopping')
+
+
+@daemon.command('status')
+@click.pass_obj
+@click.pass_context
+def daemon_status(ctx: click.Context, obj: CliContext):
+    """
+    Exits with 1 if no daemon is running.
+    """
+    from naevpm.daemon import send_control
+    status = send_control(obj.config.DAEMON_SOCKET, 'status')
+    if status is None:
+        obj.comm.message('No daemon is running')
+        ctx.exit(1)
+    uptime = datetime.now(timezone.utc) - datetime.fromtimestamp(status['start_time'], timezone.utc)
+    obj.comm.message(f"Daemon with PID {status['pid']} is running since {int(uptime.total_seconds()) // 60} minutes "
+                     f"and served {status['requests_served']} commands")
 
 
 if __name__ == '__main__':
@@ -1,4 +1,20 @@
+import logging
+
+from naevpm.core.progress import Progress
+
+
 class AbstractCommunication:
 
-    def message(self, msg: str, delay: bool = False):
+    def message(self, msg: str, delay: bool = False, level: int = logging.INFO):
+        """
+        @param level: Logging level of the message. Use logging.DEBUG for detailed steps which are only of interest
+        when looking for problems, e.g. the single DB writes of a workflow.
+        """
+        pass
+
+    def progress(self, progress: Progress):
+        """
+        Reports the progress of a transfer or a job, e.g. a git fetch, a download or a batch of plugins. Use a
+        ProgressReporter, which rate limits the reports.
+        """
         pass
@@ -1,19 +1,31 @@
 import base64
+import logging
 import os
 import shutil
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from enum import Enum
+from functools import partial
 from hashlib import md5
-from typing import Optional
-from lxml import etree
+from threading import Event
+from typing import Optional, Callable, Iterator
 
-from naevpm.core import git_utils
 from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.batch_saver import BatchSaver, BatchItemDoneCallback
 from naevpm.core.config import Config
+from naevpm.core.manifest import Manifest, ApplyPlan, PluginApplyPlan, ApplyAction, ManifestEntry, \
+    PluginVerifyResult
+from naevpm.core.metrics import MetricsRecorder, OperationStats, get_operation_stats, get_database_sizes
 from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel, RegistryPluginMetaDataModel, \
-    PluginMetadataDbModel
+    PluginMetadataDbModel, PluginState
+from naevpm.core.plugin_index import PluginIndex
+from naevpm.core.plugin_workflows.plugin_workflow import VerifyStatus
 from naevpm.core.plugin_workflows.plugin_workflow_manager import PluginWorkflowManager
-from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector, RegistrySourceUniqueConstraintViolation
+from naevpm.core.progress import ProgressReporter
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector, RegistrySourceUniqueConstraintViolation, \
+    IndexChanges
+from naevpm.core.timing import Timings
 
 
 class ApplicationLogicRegistrySourceWasAlreadyAdded(Exception):
@@ -24,16 +36,40 @@ class ApplicationLogicEmptyRegistrySource(Exception):
     pass
 
 
+class PluginBatchAction(Enum):
+    FETCH = 0
+    INSTALL = 1
+    UPDATE = 2
+    UNINSTALL = 3
+    DELETE = 4
+
+
 class ApplicationLogic:
     database_connector: SqliteDatabaseConnector
     plugin_workflow_manager: PluginWorkflowManager
+    plugin_index: PluginIndex
     config: Config
-
-    def __init__(self, database_connector: SqliteDatabaseConnector, config: Config):
+    # Durations of the steps. Disabled unless passed enabled.
+    timings: Timings
+    # History of the timings
+    metrics: MetricsRecorder
+    # Whether a transaction changed the index since creation. Only then the metrics history is maintained on close.
+    _index_changed: bool = False
+
+    def __init__(self, database_connector: SqliteDatabaseConnector, config: Config,
+                 timings: Optional[Timings] = None):
         super().__init__()
         self.config = config
         self.database_connector = database_connector
-        self.plugin_workflow_manager = PluginWorkflowManager(database_connector, config)
+        self.timings = timings if timings is not None else Timings()
+        self.metrics = MetricsRecorder(database_connector)
+        self.timings.add_listener(self.metrics.record_span)
+        self.plugin_workflow_manager = PluginWorkflowManager(database_connector, config, self.timings)
+        self.plugin_index = PluginIndex(database_connector)
+        database_connector.add_commit_listener(self._on_commit)
+
+    def _on_commit(self, changes: IndexChanges):
+        self._index_changed = True
 
     def _get_folder_name_for_registry(self, source: str) -> str:
         # Still add some part of the source to the name, so that it can be recognized in the file browser by a human
@@ -60,6 +96,8 @@ class ApplicationLogic:
         """
         Specification at https://github.com/naev/naev-plugins#plugin-information-format
         """
+        # Importing lxml takes long. Only import it when needed.
+        from lxml import etree
         with open(file_path, 'r') as f:
             text_content = f.read()
             plugin = etree.XML(text_content.encode('utf-8'))
@@ -73,6 +111,7 @@ class ApplicationLogic:
             )
 
     def _parse_plugin_metadata_xml_string(self, xml_string: str):
+        from lxml import etree
         plugin = etree.XML(xml_string.encode('utf-8'))
         priority = plugin.findtext("priority")
         priority_int = None
@@ -101,6 +140,8 @@ class ApplicationLogic:
 
     def parse_plugin_metadata_xml_file(self, plugin: IndexedPluginDbModel) -> Optional[PluginMetadataDbModel]:
         cache_location, install_location = self.plugin_workflow_manager.get_locations(plugin)
+        if not os.path.exists(cache_location):
+            return None
         if plugin.source.endswith('.zip'):
             with zipfile.ZipFile(cache_location) as z:
                 fd = None
@@ -114,6 +155,8 @@ class ApplicationLogic:
                         fd.close()
         else:
             file_path = os.path.join(cache_location, 'plugin.xml')
+            if not os.path.exists(file_path):
+                return None
             return self._parse_plugin_metadata_xml_file(file_path)
 
     def _read_cached_registry(self, absolute_registry_folder_path: str) -> list[RegistryPluginMetaDataModel]:
@@ -147,7 +190,13 @@ class ApplicationLogic:
     # ----------------------------------NEW
     def _sync_repo(self, source: str, target: str, tc: AbstractCommunication):
         tc.message(f"Syncing: {source} -> {target}")
-        git_utils.sync_repo(source, target, self.config.DEFAULT_GIT_REMOTE_NAME, self.config.REGISTRY_GIT_BRANCH_NAME)
+        # Importing pygit2 takes long. Only import it when needed.
+        from naevpm.core import git_utils
+        with self.timings.span('registry.sync') as span:
+            progress_reporter = ProgressReporter(tc, source, 'objects')
+            git_utils.sync_repo(source, target, self.config.DEFAULT_GIT_REMOTE_NAME,
+                                self.config.REGISTRY_GIT_BRANCH_NAME, progress_reporter)
+            span.add_bytes(progress_reporter.transferred_bytes)
         tc.message(f"Synced: {source} -> {target}")
 
     def _hard_link(self, source: str, target: str, tc: AbstractCommunication):
@@ -162,42 +211,128 @@ class ApplicationLogic:
                                absolute_registry_folder_path: str,
                                tc: AbstractCommunication) -> list[RegistryPluginMetaDataModel]:
         tc.message(f"Reading: {absolute_registry_folder_path}")
-        plugin_metadatas = self._read_cached_registry(absolute_registry_folder_path)
+        with self.timings.span('registry.read') as span:
+            plugin_metadatas = self._read_cached_registry(absolute_registry_folder_path)
+            span.add_items(len(plugin_metadatas))
         tc.message(f"Read: {absolute_registry_folder_path}")
         return plugin_metadatas
 
     def _save_plugin_metadatas(self, source: str,
                                plugin_metadatas: list[RegistryPluginMetaDataModel],
                                tc: AbstractCommunication):
-        tc.message(f"Saving: Plugin metadata from {source}")
-        for plugin_metadata in plugin_metadatas:
-            self.database_connector.index_plugin(source, plugin_metadata)
-        tc.message(f"Saved: Plugin metadata from {source}")
+        tc.message(f"Saving: Plugin metadata from {source}", level=logging.DEBUG)
+        with self.timings.span('registry.save') as span:
+            for plugin_metadata in plugin_metadatas:
+                self.database_connector.index_plugin(source, plugin_metadata)
+            span.add_items(len(plugin_metadatas))
+        tc.message(f"Saved: Plugin metadata from {source}", level=logging.DEBUG)
 
     def _save_registry_last_fetched(self, registry: RegistryDbModel, tc: AbstractCommunication):
         # Make sure to create a timezone-aware datetime object
-        tc.message(f"Saving: Registry field last_fetched for registry {registry.source}")
+        tc.message(f"Saving: Registry field last_fetched for registry {registry.source}", level=logging.DEBUG)
         last_fetched = datetime.now(timezone.utc)
         self.database_connector.set_registry_last_fetched(registry.source, last_fetched)
         registry.last_fetched = datetime.now(tz=timezone.utc)
-        tc.message(f"Saved: Registry field last_fetched '{str(last_fetched)}' for registry {registry.source}")
+        tc.message(f"Saved: Registry field last_fetched '{str(last_fetched)}' for registry {registry.source}",
+                   level=logging.DEBUG)
 
     def fetch_registry_plugin_metadatas(self, registry: RegistryDbModel, tc: AbstractCommunication):
-        tc.message(f"Fetching: Plugin meta from {registry.source}")
-        if registry.source == self.config.LOCAL_REGISTRY:
-            # Skip fetch from git remote as there is none for local registry
-            plugin_metadatas = self._read_plugin_metadatas(self.config.LOCAL_REGISTRY, tc)
-        else:
-            absolute_registry_folder_path = self._get_absolute_registry_folder_path2(registry)
-            # Make sure the registry repo is uptodate
-            self._sync_repo(registry.source, absolute_registry_folder_path, tc)
-            # Read XML files in the registry repo to get plugin metadata
-            plugin_metadatas = self._read_plugin_metadatas(absolute_registry_folder_path, tc)
-        # Save in DB
-        self._save_plugin_metadatas(registry.source, plugin_metadatas, tc)
-        # set last_fetched field
-        self._save_registry_last_fetched(registry, tc)
-        tc.message(f"Fetched: Plugin meta data from {registry.source}")
+        save = self._prepare_registry_fetch(registry, tc)
+        with self.database_connector.transaction():
+            save()
+
+    def _prepare_registry_fetch(self, registry: RegistryDbModel, tc: AbstractCommunication) -> Callable[[], None]:
+        """
+        Syncs the registry repository and reads its plugin metadata without writing the DB.
+
+        @return: Saves the index of the registry, its commit and the last_fetched field. Run it in a transaction.
+        """
+        with self.timings.span('registry.fetch'):
+            tc.message(f"Fetching: Plugin meta from {registry.source}")
+            commit_oid = None
+            if registry.source == self.config.LOCAL_REGISTRY:
+                # Skip fetch from git remote as there is none for local registry
+                plugin_metadatas = self._read_plugin_metadatas(self.config.LOCAL_REGISTRY, tc)
+            else:
+                absolute_registry_folder_path = self._get_absolute_registry_folder_path2(registry)
+                # Make sure the registry repo is uptodate
+                self._sync_repo(registry.source, absolute_registry_folder_path, tc)
+                from naevpm.core import git_utils
+                commit_oid = git_utils.get_head_commit_oid(absolute_registry_folder_path)
+                if commit_oid == self.database_connector.get_registry_commit_oid(registry.source):
+                    # The index was already read from this commit. Removing plugins from the index or merging an
+                    # index snapshot clears the commit.
+                    tc.message(f"Skipping: Reading unchanged registry {registry.source} at commit {commit_oid}")
+                    plugin_metadatas = []
+                else:
+                    # Read XML files in the registry repo to get plugin metadata
+                    plugin_metadatas = self._read_plugin_metadatas(absolute_registry_folder_path, tc)
+
+        def save():
+            # The index, its commit and the last_fetched field are committed together
+            self._save_plugin_metadatas(registry.source, plugin_metadatas, tc)
+            self.database_connector.set_registry_commit_oid(registry.source, commit_oid)
+            # set last_fetched field
+            self._save_registry_last_fetched(registry, tc)
+            tc.message(f"Fetched: Plugin meta data from {registry.source}")
+
+        return save
+
+    def fetch_registries_plugin_metadatas(self, registries: list[RegistryDbModel], tc: AbstractCommunication,
+                                          on_item_done: Optional[BatchItemDoneCallback] = None):
+        """
+        Batch version of fetch_registry_plugin_metadatas. The registries are synced and read outside of transactions
+        and their indexes are saved in chunks, see BatchSaver.
+
+        @param on_item_done: Called after each registry was saved. If set, a failing registry does not stop the batch.
+        """
+        saver = BatchSaver(self.database_connector, tc, on_item_done)
+        try:
+            for registry in registries:
+                try:
+                    save = self._prepare_registry_fetch(registry, tc)
+                except Exception as e:
+                    if on_item_done is None:
+                        raise
+                    saver.add_failed(registry.source, e)
+                    continue
+                saver.add(registry.source, save)
+        finally:
+            saver.flush()
+
+    def _run_batch_item(self, source: str, fn: Callable[[], None], tc: AbstractCommunication,
+                        on_item_done: Optional[BatchItemDoneCallback]):
+        if on_item_done is None:
+            fn()
+            return
+        try:
+            fn()
+        except Exception as e:
+            tc.message(f"Failed: {source}: {str(e)}", level=logging.ERROR)
+            on_item_done(source, e)
+            return
+        on_item_done(source, None)
+
+    def export_index(self, path: str, tc: AbstractCommunication, overwrite: bool = False):
+        """
+        @param overwrite: Replace an existing file at path
+        @raise FileExistsError: If a file exists at path and overwrite is False
+        """
+        tc.message(f"Exporting: Index to {path}")
+        with self.timings.span('index.export') as span:
+            self.database_connector.export_index_snapshot(path, overwrite)
+            span.add_bytes(os.path.getsize(path))
+        tc.message(f"Exported: Index to {path}")
+
+    def import_index(self, path: str, tc: AbstractCommunication):
+        """
+        @raise IndexSnapshotVersionNotSupported
+        """
+        tc.message(f"Importing: Index from {path}")
+        with self.timings.span('index.import') as span:
+            span.add_bytes(os.path.getsize(path))
+            self.database_connector.import_index_snapshot(path)
+        tc.message(f"Imported: Index from {path}")
 
     def remove_registry(self, registry: RegistryDbModel, tc: AbstractCommunication):
         tc.message(f"Removing: Registry {registry.source}")
@@ -205,16 +340,36 @@ class ApplicationLogic:
         tc.message(f"Removed: Registry {registry.source}")
 
     def get_registries(self) -> list[RegistryDbModel]:
-        return self.database_connector.get_registries()
+        return self.plugin_index.get_registries()
 
     def get_registry(self, source: str) -> Optional[RegistryDbModel]:
-        return self.database_connector.get_registry(source)
+        return self.plugin_index.get_registry(source)
 
     def get_plugins(self) -> list[IndexedPluginDbModel]:
-        return self.database_connector.get_plugins()
+        return self.plugin_index.get_plugins()
+
+    def iter_plugins(self) -> Iterator[IndexedPluginDbModel]:
+        """
+        Streams the plugins from the DB without loading the in-memory index. Writes of other threads wait until the
+        iterator is exhausted or closed, see SqliteDatabaseConnector.iter_plugins.
+        """
+        return self.database_connector.iter_plugins()
+
+    def iter_registries(self) -> Iterator[RegistryDbModel]:
+        """
+        Streams the registries from the DB without loading the in-memory index. Writes of other threads wait until the
+        iterator is exhausted or closed, see SqliteDatabaseConnector.iter_plugins.
+        """
+        return self.database_connector.iter_registries()
+
+    def get_plugins_page(self, offset: int, limit: int) -> list[IndexedPluginDbModel]:
+        return self.plugin_index.get_plugins_page(offset, limit)
+
+    def count_plugins(self) -> int:
+        return self.plugin_index.count_plugins()
 
     def get_plugin(self, source: str) -> Optional[IndexedPluginDbModel]:
-        return self.database_connector.get_plugin(source)
+        return self.plugin_index.get_plugin(source)
 
     def _convert_plugin_metadata_to_registry_plugin_metadata(self, plugin_metadata: PluginMetadataDbModel) \
             -> RegistryPluginMetaDataModel:
@@ -229,6 +384,7 @@ class ApplicationLogic:
         )
 
     def _convert_registry_plugin_metadata_to_xml(self, registry_plugin_metadata: RegistryPluginMetaDataModel) -> bytes:
+        from lxml import etree
         xml_plugin = etree.Element('plugin', name=registry_plugin_metadata.name)
         xml_author = etree.Element('author')
         xml_author.text = registry_plugin_metadata.author
@@ -245,41 +401,406 @@ class ApplicationLogic:
         xml_website.text = registry_plugin_metadata.website
         return etree.tostring(xml_plugin, xml_declaration=True, encoding='UTF-8', pretty_print=True)
 
+    def _extract_plugin_metadata(self, plugin: IndexedPluginDbModel,
+                                 tc: AbstractCommunication) -> Optional[PluginMetadataDbModel]:
+        """
+        Reads plugin.xml from the cached plugin and saves it in the DB together with the hash of the cached content.
+        Nothing is parsed if the saved metadata was extracted from the same content.
+        """
+        plugin_metadata, save = self._read_plugin_metadata(plugin, tc)
+        if save is not None:
+            save()
+        return plugin_metadata
+
+    def _read_plugin_metadata(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication) \
+            -> tuple[Optional[PluginMetadataDbModel], Optional[Callable[[], None]]]:
+        """
+        Reads plugin.xml from the cached plugin without writing the DB, see _extract_plugin_metadata.
+
+        @return: The metadata and the function which saves it, or None if the saved metadata is up to date
+        """
+        with self.timings.span('plugin.extract_metadata'):
+            tc.message(f"Extracting: Plugin metadata {plugin.source}")
+            content_hash = self.plugin_workflow_manager.get_content_hash(plugin)
+            db_plugin_metadata = self.database_connector.get_plugin_metadata(plugin.source)
+            if content_hash is not None and db_plugin_metadata is not None \
+                    and db_plugin_metadata.content_hash == content_hash:
+                tc.message(f"Extracted: Plugin metadata {plugin.source} is up to date")
+                return db_plugin_metadata, None
+            if content_hash is not None and db_plugin_metadata is None \
+                    and self.database_connector.get_plugin_metadata_missing_hash(plugin.source) == content_hash:
+                tc.message(f"Extracted: Plugin {plugin.source} has no metadata")
+                return None, None
+            from lxml import etree
+            try:
+                with self.timings.span('plugin.parse_metadata'):
+                    plugin_metadata = self.parse_plugin_metadata_xml_file(plugin)
+            except (etree.XMLSyntaxError, ValueError, zipfile.BadZipFile) as e:
+                tc.message(f"Extracting failed: Plugin metadata {plugin.source}: {str(e)}")
+                plugin_metadata = None
+            if plugin_metadata is not None:
+                # The metadata is looked up by the source of the indexed plugin. The source given in the plugin.xml is
+                # not necessarily the same.
+                plugin_metadata.source = plugin.source
+                plugin_metadata.content_hash = content_hash
+            tc.message(f"Extracted: Plugin metadata {plugin.source}")
+
+        def save():
+            if plugin_metadata is None:
+                if db_plugin_metadata is not None:
+                    # Stale metadata of a previous content must not be shown
+                    self.database_connector.remove_plugin_metadata(plugin.source)
+                if content_hash is not None:
+                    # The next lookup does not parse the same content again
+                    self.database_connector.set_plugin_metadata_missing_hash(plugin.source, content_hash)
+            else:
+                self.database_connector.save_plugin_metadata(plugin_metadata)
+
+        return plugin_metadata, save
+
+    def _prepare_plugin_action(self, action: PluginBatchAction, plugin: IndexedPluginDbModel,
+                               tc: AbstractCommunication) -> Callable[[], None]:
+        """
+        Does the network and disk work of the action on the plugin without writing the DB.
+
+        @return: Saves the result of the action. Run it in a transaction.
+        """
+        manager = self.plugin_workflow_manager
+        save_metadata = None
+        if action == PluginBatchAction.FETCH:
+            manager.fetch_plugin_content(plugin, tc)
+            save_metadata = self._read_plugin_metadata(plugin, tc)[1]
+            save_plugin = manager.save_fetched_plugin
+        elif action == PluginBatchAction.INSTALL:
+            manager.install_plugin_files(plugin, tc)
+            save_plugin = manager.save_installed_plugin
+        elif action == PluginBatchAction.UPDATE:
+            manager.update_plugin_files(plugin, tc)
+            save_metadata = self._read_plugin_metadata(plugin, tc)[1]
+            save_plugin = manager.save_updated_plugin
+        elif action == PluginBatchAction.UNINSTALL:
+            manager.uninstall_plugin_files(plugin, tc)
+            save_plugin = manager.save_uninstalled_plugin
+        else:
+            manager.delete_plugin_files(plugin, tc)
+            # The metadata was extracted from the deleted cache
+            save_metadata = partial(self.database_connector.remove_plugin_metadata, plugin.source)
+            save_plugin = manager.save_deleted_plugin
+
+        def save():
+            save_plugin(plugin, tc)
+            if save_metadata is not None:
+                save_metadata()
+
+        return save
+
+    def _run_plugin_action(self, action: PluginBatchAction, plugin: IndexedPluginDbModel,
+                           tc: AbstractCommunication):
+        save = self._prepare_plugin_action(action, plugin, tc)
+        # The state and the metadata are committed together
+        with self.database_connector.transaction():
+            save()
+
     def install_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
-        self.plugin_workflow_manager.install_plugin(plugin, tc)
+        self._run_plugin_action(PluginBatchAction.INSTALL, plugin, tc)
 
     def uninstall_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
-        self.plugin_workflow_manager.uninstall_plugin(plugin, tc)
+        self._run_plugin_action(PluginBatchAction.UNINSTALL, plugin, tc)
 
     def delete_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
-        self.plugin_workflow_manager.delete_plugin(plugin, tc)
+        self._run_plugin_action(PluginBatchAction.DELETE, plugin, tc)
 
     def check_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         self.plugin_workflow_manager.check_plugin(plugin, tc)
 
+    def check_plugins(self, plugins: list[IndexedPluginDbModel], tc: AbstractCommunication,
+                      on_item_done: Optional[BatchItemDoneCallback] = None):
+        """
+        Checks all installed plugins of the list for updates. The checks run outside of transactions and their results
+        are saved in chunks, see BatchSaver.
+
+        @param on_item_done: Called after each checked plugin was saved. If set, a failing plugin does not stop the
+        batch.
+        """
+        manager = self.plugin_workflow_manager
+        saver = BatchSaver(self.database_connector, tc, on_item_done)
+        try:
+            for plugin in plugins:
+                if plugin.state != PluginState.INSTALLED:
+                    continue
+                try:
+                    update_available = manager.is_update_available(plugin, tc)
+                except Exception as e:
+                    if on_item_done is None:
+                        raise
+                    saver.add_failed(plugin.source, e)
+                    continue
+                saver.add(plugin.source, partial(manager.save_checked_plugin, plugin, update_available, tc))
+        finally:
+            saver.flush()
+
+    def _is_batch_action_applicable(self, action: PluginBatchAction, plugin: IndexedPluginDbModel) -> bool:
+        if action == PluginBatchAction.FETCH:
+            return plugin.state == PluginState.INDEXED
+        elif action == PluginBatchAction.INSTALL or action == PluginBatchAction.DELETE:
+            return plugin.state == PluginState.CACHED
+        elif action == PluginBatchAction.UPDATE:
+            return plugin.state == PluginState.INSTALLED and bool(plugin.update_available)
+        elif action == PluginBatchAction.UNINSTALL:
+            return plugin.state == PluginState.INSTALLED
+        return False
+
+    def run_plugin_batch(self, action: PluginBatchAction, plugins: list[IndexedPluginDbModel],
+                         tc: AbstractCommunication, cancel_event: Optional[Event] = None) \
+            -> list[IndexedPluginDbModel]:
+        """
+        Runs one action on several plugins as one job. The network and disk work runs outside of transactions and the
+        results are saved in chunks, see BatchSaver. Plugins in a state which does not allow the action are skipped. A
+        failing plugin does not stop the batch. Progress is reported as the number of handled plugins.
+
+        @param cancel_event: When set, the remaining plugins are skipped. The plugins handled until then are saved.
+        @return: The plugins the action succeeded for and whose results were saved
+        """
+        applicable_plugins = [plugin for plugin in plugins if self._is_batch_action_applicable(action, plugin)]
+        plugins_by_source = {plugin.source: plugin for plugin in applicable_plugins}
+        total = len(applicable_plugins)
+        succeeded_plugins = []
+        tc.message(f"Batch {action.name.lower()}: {total} of {len(plugins)} selected plugins")
+        # Every plugin takes long enough to be reported
+        progress_reporter = ProgressReporter(tc, f"Batch {action.name.lower()}", 'plugins', total, min_interval=0)
+        progress_reporter.update(0)
+
+        def on_item_done(source: str, e: Optional[Exception]):
+            # Only reported after the chunk of the plugin was committed
+            succeeded_plugins.append(plugins_by_source[source])
+
+        saver = BatchSaver(self.database_connector, tc, on_item_done)
+
+        def save_chunk(add_to_chunk: Callable[[], None]):
+            try:
+                add_to_chunk()
+            except Exception as e:
+                # The chunk was rolled back. Its plugins did not succeed, but the batch goes on.
+                tc.message(f"Batch {action.name.lower()} failed to save: {str(e)}", level=logging.ERROR)
+
+        try:
+            for i, plugin in enumerate(applicable_plugins):
+                if cancel_event is not None and cancel_event.is_set():
+                    tc.message(f"Batch {action.name.lower()} cancelled: {total - i} plugins skipped")
+                    break
+                try:
+                    save = self._prepare_plugin_action(action, plugin, tc)
+                except Exception as e:
+                    tc.message(f"Batch {action.name.lower()} failed: {plugin.source}: {str(e)}", level=logging.ERROR)
+                else:
+                    save_chunk(partial(saver.add, plugin.source, save,
+                                       partial(self._restore_plugin_fields, plugin, plugin.state,
+                                               plugin.update_available)))
+                progress_reporter.update(i + 1)
+        finally:
+            save_chunk(saver.flush)
+        progress_reporter.finish()
+        tc.message(f"Batch {action.name.lower()}: {len(succeeded_plugins)} of {total} plugins succeeded")
+        return succeeded_plugins
+
+    @staticmethod
+    def _restore_plugin_fields(plugin: IndexedPluginDbModel, state: PluginState, update_available: Optional[bool]):
+        plugin.state = state
+        plugin.update_available = update_available
+
+    def plan_manifest(self, manifest: Manifest) -> ApplyPlan:
+        """
+        Computes the actions which make the installed plugins match the manifest: Plugins of the manifest are fetched
+        and installed if needed. Installed plugins which do not pass verify_manifest, e.g. because their installed
+        content does not match the pinned content hash, are updated.
+        Installed plugins which are not in the manifest are uninstalled. Plugins which already match need no action.
+        """
+        plugin_plans = []
+        missing_sources = []
+        manifest_sources = set()
+        for entry in manifest.entries:
+            manifest_sources.add(entry.source)
+            plugin = self.get_plugin(entry.source)
+            if plugin is None:
+                missing_sources.append(entry.source)
+                continue
+            if plugin.state == PluginState.INDEXED:
+                actions = [ApplyAction.FETCH, ApplyAction.INSTALL]
+            elif plugin.state == PluginState.CACHED:
+                actions = [ApplyAction.INSTALL]
+            elif entry.content_hash is not None and \
+                    self.plugin_workflow_manager.verify_plugin(plugin, entry.content_hash)[0] != VerifyStatus.OK:
+                actions = [ApplyAction.UPDATE]
+            else:
+                actions = []
+            if len(actions) > 0:
+                plugin_plans.append(PluginApplyPlan(plugin, entry.content_hash, actions))
+        for plugin in self.get_plugins():
+            if plugin.state == PluginState.INSTALLED and plugin.source not in manifest_sources:
+                plugin_plans.append(PluginApplyPlan(plugin, None, [ApplyAction.UNINSTALL]))
+        self.plugin_workflow_manager.file_digest_cache.flush()
+        return ApplyPlan(plugin_plans, missing_sources)
+
+    def _run_plugin_apply_plan(self, plugin_plan: PluginApplyPlan, tc: AbstractCommunication):
+        plugin = plugin_plan.plugin
+        for action in plugin_plan.actions:
+            if action == ApplyAction.FETCH:
+                self.fetch_plugin(plugin, tc)
+            elif action == ApplyAction.INSTALL:
+                if plugin_plan.content_hash is not None:
+                    self.plugin_workflow_manager.pin_plugin(plugin, plugin_plan.content_hash, tc)
+                self.install_plugin(plugin, tc)
+            elif action == ApplyAction.UPDATE:
+                self.plugin_workflow_manager.pin_plugin(plugin, plugin_plan.content_hash, tc)
+                save_metadata = self._read_plugin_metadata(plugin, tc)[1]
+                # Saved like update_plugin does
+                with self.database_connector.transaction():
+                    self.plugin_workflow_manager.save_updated_plugin(plugin, tc)
+                    if save_metadata is not None:
+                        save_metadata()
+            elif action == ApplyAction.UNINSTALL:
+                self.uninstall_plugin(plugin, tc)
+
+    def apply_plan(self, plan: ApplyPlan, tc: AbstractCommunication,
+                   on_item_done: Optional[BatchItemDoneCallback] = None,
+                   max_workers: Optional[int] = None) -> list[IndexedPluginDbModel]:
+        """
+        Runs the actions of the plugins concurrently. The actions of one plugin run in order. Every action commits on
+        its own, so a failing plugin neither stops nor rolls back the others and applying the manifest again only
+        repeats what failed.
+
+        @param on_item_done: Called in the calling thread after each plugin
+        @param max_workers: None uses NETWORK_WORKERS of the config
+        @return: The plugins all actions succeeded for
+        """
+        if max_workers is None:
+            max_workers = self.config.NETWORK_WORKERS
+        succeeded_plugins = []
+        progress_reporter = ProgressReporter(tc, 'Apply', 'plugins', len(plan.plugin_plans), min_interval=0)
+        progress_reporter.update(0)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='naevpm-apply') as executor:
+            futures = {executor.submit(self._run_plugin_apply_plan, plugin_plan, tc): plugin_plan
+                       for plugin_plan in plan.plugin_plans}
+            for i, future in enumerate(as_completed(futures)):
+                plugin = futures[future].plugin
+                try:
+                    future.result()
+                except Exception as e:
+                    tc.message(f"Failed: {plugin.source}: {str(e)}", level=logging.ERROR)
+                    if on_item_done is not None:
+                        on_item_done(plugin.source, e)
+                else:
+                    succeeded_plugins.append(plugin)
+                    if on_item_done is not None:
+                        on_item_done(plugin.source, None)
+                progress_reporter.update(i + 1)
+        progress_reporter.finish()
+        tc.message(f"Applied: {len(succeeded_plugins)} of {len(plan.plugin_plans)} plugins succeeded")
+        return succeeded_plugins
+
+    def create_lockfile_manifest(self) -> Manifest:
+        """
+        @return: Manifest of the installed plugins, pinned to their installed content
+        """
+        entries = []
+        for plugin in self.get_plugins():
+            if plugin.state != PluginState.INSTALLED:
+                continue
+            content_hash = self.plugin_workflow_manager.get_installed_content_hash(plugin)
+            entries.append(ManifestEntry(plugin.source, content_hash, plugin.name))
+        self.plugin_workflow_manager.file_digest_cache.flush()
+        return Manifest(entries)
+
+    def _verify_manifest_entry(self, entry: ManifestEntry) -> PluginVerifyResult:
+        plugin = self.get_plugin(entry.source)
+        if plugin is None or plugin.state != PluginState.INSTALLED:
+            return PluginVerifyResult(entry.source, VerifyStatus.NOT_INSTALLED, entry.content_hash, None)
+        status, actual_content_hash = self.plugin_workflow_manager.verify_plugin(plugin, entry.content_hash)
+        return PluginVerifyResult(entry.source, status, entry.content_hash, actual_content_hash)
+
+    def verify_manifest(self, manifest: Manifest, tc: AbstractCommunication,
+                        on_item_done: Optional[Callable[[PluginVerifyResult], None]] = None,
+                        max_workers: Optional[int] = None) -> list[PluginVerifyResult]:
+        """
+        Checks that the installed plugins match the manifest without network access. Plugins are checked concurrently.
+        Zip plugins are only hashed again if their size, modification time or inode changed since the last check.
+
+        @param on_item_done: Called in the calling thread after each plugin
+        @param max_workers: None uses the default of ThreadPoolExecutor
+        @return: The results in the order of the manifest
+        """
+        progress_reporter = ProgressReporter(tc, 'Verify', 'plugins', len(manifest.entries), min_interval=0)
+        progress_reporter.update(0)
+        results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='naevpm-verify') as executor:
+                futures = {executor.submit(self._verify_manifest_entry, entry): entry for entry in manifest.entries}
+                for i, future in enumerate(as_completed(futures)):
+                    result = future.result()
+                    results[result.source] = result
+                    if on_item_done is not None:
+                        on_item_done(result)
+                    progress_reporter.update(i + 1)
+        finally:
+            self.plugin_workflow_manager.file_digest_cache.flush()
+        progress_reporter.finish()
+        ok_count = sum(1 for result in results.values() if result.status == VerifyStatus.OK)
+        tc.message(f"Verified: {ok_count} of {len(manifest.entries)} plugins are ok")
+        return [results[entry.source] for entry in manifest.entries]
+
+    def get_operation_stats(self, days: int) -> list[OperationStats]:
+        """
+        @param days: Only steps of the last days are included
+        """
+        self.metrics.flush()
+        return get_operation_stats(self.database_connector, days)
+
+    def get_database_sizes(self, days: int) -> list[tuple[str, int]]:
+        """
+        @return: (ISO date, DB size in bytes) of the last days, see metrics.get_database_sizes
+        """
+        self.metrics.flush()
+        return get_database_sizes(self.database_connector, days)
+
+    def close(self):
+        """
+        Writes buffered digests and metrics. Call before exiting. The metrics history is only maintained if metrics are
+        recorded and the index was changed, so read-only commands like plugin list and stats do not write it.
+        """
+        self.plugin_workflow_manager.file_digest_cache.flush()
+        if self.config.RECORD_METRICS and self._index_changed:
+            self.metrics.maintain()
+        else:
+            # Writes nothing if no spans were recorded
+            self.metrics.flush()
+
     def update_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
-        self.plugin_workflow_manager.update_plugin(plugin, tc)
+        self._run_plugin_action(PluginBatchAction.UPDATE, plugin, tc)
 
     def fetch_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
-        self.plugin_workflow_manager.fetch_plugin(plugin, tc)
+        self._run_plugin_action(PluginBatchAction.FETCH, plugin, tc)
+
+    def save_fetched_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        """
+        Completes fetching a plugin whose content was already written to its cache location, e.g. downloaded by
+        AsyncApplicationLogic.
+        """
+        save_metadata = self._read_plugin_metadata(plugin, tc)[1]
+        with self.database_connector.transaction():
+            self.plugin_workflow_manager.save_fetched_plugin(plugin, tc)
+            if save_metadata is not None:
+                save_metadata()
 
     def remove_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         self.plugin_workflow_manager.remove_plugin(plugin, tc)
 
-    def get_plugin_metadata(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication) -> PluginMetadataDbModel:
-        tc.message(f"Getting: Plugin metadata {plugin.source}")
-
-        # Try the source in the registry plugin metadata first
-        # TODO A bit messy here. Maybe check somewhere if source in registry is same as in plugin.xml
-        db_plugin_metadata = self.database_connector.get_plugin_metadata(plugin.source)
-        if db_plugin_metadata is None:
-            plugin_metadata = self.parse_plugin_metadata_xml_file(plugin)
-            # Check if the source in the plugin metadata from the xml is already used
-            db_plugin_metadata2 = self.database_connector.get_plugin_metadata(plugin.source)
-            if db_plugin_metadata2 is None:
-                self.database_connector.insert_plugin_metadata(plugin_metadata)
-                return plugin_metadata
-            else:
-                return db_plugin_metadata2
-        tc.message(f"Got: Plugin metadata {plugin.source}")
-        return db_plugin_metadata
+    def get_plugin_metadata(self, plugin: IndexedPluginDbModel,
+                            tc: AbstractCommunication) -> Optional[PluginMetadataDbModel]:
+        tc.message(f"Getting: Plugin metadata {plugin.source}", level=logging.DEBUG)
+        # The metadata is extracted when the plugin is fetched or updated
+        plugin_metadata = self.database_connector.get_plugin_metadata(plugin.source)
+        if plugin_metadata is None:
+            # Plugins fetched by older versions of this application were never extracted
+            plugin_metadata = self._extract_plugin_metadata(plugin, tc)
+        tc.message(f"Got: Plugin metadata {plugin.source}", level=logging.DEBUG)
+        return plugin_metadata
@@ -0,0 +1,201 @@
+import asyncio
+import importlib.util
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Callable, Any, Awaitable, TypeVar, TYPE_CHECKING
+
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.application_logic import ApplicationLogic
+from naevpm.core.batch_saver import BatchItemDoneCallback, BatchSaver
+from naevpm.core.config import Config
+from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel, PluginState
+
+if TYPE_CHECKING:
+    import aiohttp
+
+T = TypeVar('T')
+
+
+def is_aiohttp_installed() -> bool:
+    # Without importing it, which takes long
+    return importlib.util.find_spec('aiohttp') is not None
+
+
+class AsyncApplicationLogic:
+    """
+    asyncio facade over the network operations of an application logic, so many plugins and registries are fetched
+    and checked concurrently from one event loop:
+
+        async with AsyncApplicationLogic(application_logic) as async_logic:
+            await async_logic.check_plugins(plugins, tc)
+
+    Remote zip plugins are downloaded with aiohttp if it is installed, which does not block a thread while waiting for
+    the network. Blocking calls, like pygit2, which has no async API, hashing files and writing the DB, run in a
+    bounded executor. A semaphore limits the operations running at the same time, so thousands of checks neither open
+    thousands of connections nor queue thousands of calls in the executor at once.
+
+    Must only be used from one event loop.
+    """
+    logic: ApplicationLogic
+    _max_concurrency: int
+    _semaphore: asyncio.Semaphore
+    _executor: ThreadPoolExecutor
+    _use_aiohttp: bool
+    # Created in the event loop on first use
+    _session: Optional['aiohttp.ClientSession']
+
+    def __init__(self, logic: ApplicationLogic, max_concurrency: int = Config.ASYNC_MAX_CONCURRENCY,
+                 max_workers: int = Config.NETWORK_WORKERS, use_aiohttp: bool = True):
+        """
+        @param max_concurrency: Maximum number of operations running at the same time
+        @param max_workers: Maximum number of threads running blocking calls
+        @param use_aiohttp: False downloads remote zips with requests in the executor, even if aiohttp is installed
+        """
+        super().__init__()
+        self.logic = logic
+        self._max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='naevpm-async')
+        self._use_aiohttp = use_aiohttp and is_aiohttp_installed()
+        self._session = None
+
+    async def __aenter__(self) -> 'AsyncApplicationLogic':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        # All calls were awaited, so nothing is left to wait for
+        self._executor.shutdown(wait=False)
+
+    async def _run_blocking(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args))
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._max_concurrency))
+        return self._session
+
+    def _downloads_async(self, plugin: IndexedPluginDbModel) -> bool:
+        return self._use_aiohttp and self.logic.plugin_workflow_manager.is_remote_zip(plugin)
+
+    async def fetch_registry(self, registry: RegistryDbModel, tc: AbstractCommunication):
+        async with self._semaphore:
+            await self._run_blocking(self.logic.fetch_registry_plugin_metadatas, registry, tc)
+
+    async def fetch_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        async with self._semaphore:
+            if not self._downloads_async(plugin):
+                await self._run_blocking(self.logic.fetch_plugin, plugin, tc)
+                return
+            manager = self.logic.plugin_workflow_manager
+            assert plugin.state == PluginState.INDEXED
+            tc.message(f"Fetching: Plugin from {plugin.source}")
+            cache_location, install_location = manager.get_locations(plugin)
+            self.logic.config.ensure_directory(self.logic.config.PLUGINS_CACHE)
+            with self.logic.timings.span('plugin.fetch') as span:
+                span.add_bytes(await manager.remote_zip_plugin_workflow.fetch_plugin_async(
+                    self._get_session(), plugin.source, cache_location, tc))
+            await self._run_blocking(self.logic.save_fetched_plugin, plugin, tc)
+
+    async def _is_update_available(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication) -> bool:
+        manager = self.logic.plugin_workflow_manager
+        if not self._downloads_async(plugin):
+            return await self._run_blocking(manager.is_update_available, plugin, tc)
+        assert plugin.state == PluginState.INSTALLED
+        tc.message(f"Checking for updates: Plugin {plugin.source}")
+        cache_location, install_location = manager.get_locations(plugin)
+        workflow = manager.remote_zip_plugin_workflow
+        with self.logic.timings.span('plugin.check'):
+            if not os.path.exists(install_location):
+                return True
+            await workflow.fetch_plugin_async(self._get_session(), plugin.source, cache_location, tc)
+            # Hashing reads both files completely
+            return await self._run_blocking(workflow.is_cache_different, cache_location, install_location)
+
+    async def check_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        async with self._semaphore:
+            update_available = await self._is_update_available(plugin, tc)
+        await self._run_blocking(self.logic.plugin_workflow_manager.save_checked_plugin, plugin, update_available, tc)
+
+    async def _run_batch_item(self, source: str, awaitable: Awaitable[Any], tc: AbstractCommunication,
+                              on_item_done: Optional[BatchItemDoneCallback]) -> bool:
+        try:
+            await awaitable
+        except Exception as e:
+            if on_item_done is None:
+                raise
+            tc.message(f"Failed: {source}: {str(e)}", level=logging.ERROR)
+            on_item_done(source, e)
+            return False
+        if on_item_done is not None:
+            on_item_done(source, None)
+        return True
+
+    async def fetch_registries(self, registries: list[RegistryDbModel], tc: AbstractCommunication,
+                               on_item_done: Optional[BatchItemDoneCallback] = None):
+        """
+        Fetches the registries concurrently. Each registry is committed on its own.
+
+        @param on_item_done: Called in the event loop after each registry. If set, a failing registry does not stop
+        the batch.
+        """
+        await asyncio.gather(*(self._run_batch_item(registry.source, self.fetch_registry(registry, tc), tc,
+                                                    on_item_done)
+                               for registry in registries))
+
+    async def fetch_plugins(self, plugins: list[IndexedPluginDbModel], tc: AbstractCommunication,
+                            on_item_done: Optional[BatchItemDoneCallback] = None) -> list[IndexedPluginDbModel]:
+        """
+        Fetches the indexed plugins of the list concurrently. Each plugin is committed on its own.
+
+        @param on_item_done: Called in the event loop after each plugin. If set, a failing plugin does not stop the
+        batch.
+        @return: The plugins which were fetched
+        """
+        indexed_plugins = [plugin for plugin in plugins if plugin.state == PluginState.INDEXED]
+        succeeded = await asyncio.gather(*(self._run_batch_item(plugin.source, self.fetch_plugin(plugin, tc), tc,
+                                                                on_item_done)
+                                           for plugin in indexed_plugins))
+        return [plugin for plugin, ok in zip(indexed_plugins, succeeded) if ok]
+
+    async def check_plugins(self, plugins: list[IndexedPluginDbModel], tc: AbstractCommunication,
+                            on_item_done: Optional[BatchItemDoneCallback] = None):
+        """
+        Checks the installed plugins of the list concurrently. The results are saved in chunks while the checks run,
+        see BatchSaver, so they are reported as they come in and the plugin index is reloaded once per chunk and not
+        after every plugin.
+
+        @param on_item_done: Called in the event loop for each plugin after its result was saved. If set, a failing
+        plugin does not stop the batch. Else, the first failure is raised after saving the other results.
+        """
+        installed_plugins = [plugin for plugin in plugins if plugin.state == PluginState.INSTALLED]
+        manager = self.logic.plugin_workflow_manager
+        saver = BatchSaver(self.logic.database_connector, tc, on_item_done)
+
+        async def check(plugin: IndexedPluginDbModel):
+            try:
+                async with self._semaphore:
+                    update_available = await self._is_update_available(plugin, tc)
+            except Exception as e:
+                if on_item_done is None:
+                    raise
+                saver.add_failed(plugin.source, e)
+                return
+            if saver.add_pending(plugin.source, partial(manager.save_checked_plugin, plugin, update_available, tc)):
+                saver.report(await self._run_blocking(saver.save))
+
+        try:
+            outcomes = await asyncio.gather(*(check(plugin) for plugin in installed_plugins), return_exceptions=True)
+        finally:
+            saver.report(await self._run_blocking(saver.save))
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
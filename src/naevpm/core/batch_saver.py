@@ -0,0 +1,119 @@
+import logging
+import time
+from threading import Lock
+from typing import Optional, Callable
+
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+
+# Called with the source of a plugin or registry of a batch and the exception if handling it failed
+BatchItemDoneCallback = Callable[[str, Optional[Exception]], None]
+
+
+class BatchSaver:
+    """
+    Collects the DB writes of the items of a batch and saves them in chunks, each in one short transaction. The
+    network and disk work of the items runs before, outside of any transaction, so other threads can write between
+    the chunks and the plugin index is reloaded once per chunk and not after every item:
+
+        saver = BatchSaver(database_connector, tc, on_item_done)
+        try:
+            for plugin in plugins:
+                try:
+                    save = prepare(plugin)
+                except Exception as e:
+                    saver.add_failed(plugin.source, e)
+                    continue
+                saver.add(plugin.source, save)
+        finally:
+            saver.flush()
+
+    A chunk is saved when it is full or its oldest item waited longer than the save interval, so results are saved
+    and reported while the batch is still running and work done before a crash is not lost. Items are reported to
+    on_item_done after their chunk was saved. If saving a chunk fails, its rollback callables restore what the saves
+    changed in memory. Thread safe.
+    """
+    CHUNK_SIZE = 100
+    # Seconds
+    SAVE_INTERVAL = 1.0
+
+    _database_connector: SqliteDatabaseConnector
+    _tc: AbstractCommunication
+    _on_item_done: Optional[BatchItemDoneCallback]
+    # (source, save, rollback)
+    _pending: list[tuple[str, Callable[[], None], Optional[Callable[[], None]]]]
+    _pending_start_time: Optional[float]
+    _lock: Lock
+
+    def __init__(self, database_connector: SqliteDatabaseConnector, tc: AbstractCommunication,
+                 on_item_done: Optional[BatchItemDoneCallback] = None):
+        super().__init__()
+        self._database_connector = database_connector
+        self._tc = tc
+        self._on_item_done = on_item_done
+        self._pending = []
+        self._pending_start_time = None
+        self._lock = Lock()
+
+    def add(self, source: str, save: Callable[[], None], rollback: Optional[Callable[[], None]] = None):
+        """
+        @param save: Writes the result of the item. Runs in the transaction of its chunk.
+        @param rollback: Called if the chunk is rolled back after save ran, e.g. to restore the state of the plugin
+        object changed by save
+        """
+        if self.add_pending(source, save, rollback):
+            self.flush()
+
+    def add_pending(self, source: str, save: Callable[[], None],
+                    rollback: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Like add, but leaves saving the chunk to the caller, e.g. to save it in another thread.
+
+        @return: True if the chunk should be saved now, see save and report
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._pending.append((source, save, rollback))
+            if self._pending_start_time is None:
+                self._pending_start_time = now
+            return len(self._pending) >= self.CHUNK_SIZE or now - self._pending_start_time >= self.SAVE_INTERVAL
+
+    def add_failed(self, source: str, e: Exception):
+        """
+        Reports a failed item right away, as it has nothing to save.
+        """
+        self._tc.message(f"Failed: {source}: {str(e)}", level=logging.ERROR)
+        if self._on_item_done is not None:
+            self._on_item_done(source, e)
+
+    def flush(self):
+        self.report(self.save())
+
+    def save(self) -> list[str]:
+        """
+        Saves the pending items in one transaction. If saving fails, the chunk is rolled back and not saved again.
+
+        @return: Sources of the saved items
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            self._pending_start_time = None
+        saved = []
+        try:
+            if len(pending) > 0:
+                with self._database_connector.transaction():
+                    for item in pending:
+                        saved.append(item)
+                        item[1]()
+        except BaseException:
+            for source, save, rollback in saved:
+                if rollback is not None:
+                    rollback()
+            raise
+        return [source for source, save, rollback in pending]
+
+    def report(self, sources: list[str]):
+        if self._on_item_done is not None:
+            for source in sources:
+                self._on_item_done(source, None)
@@ -1,10 +1,44 @@
-from typing import Optional
+import configparser
+from typing import Optional, Any, Mapping, Callable
 
 import appdirs
 import os
 
 
+class ConfigInvalid(Exception):
+    pass
+
+
+def default_naevpm_root() -> str:
+    return appdirs.user_data_dir("naev-package-manager")
+
+
+def default_naev_root() -> str:
+    return appdirs.user_data_dir("naev", appauthor=False, roaming=True)
+
+
+def default_config_path() -> str:
+    return os.path.join(appdirs.user_config_dir("naev-package-manager"), "naevpm.ini")
+
+
+def _to_path(value: str) -> str:
+    return os.path.abspath(os.path.expanduser(value))
+
+
+def _to_bool(value: str) -> bool:
+    boolean = configparser.ConfigParser.BOOLEAN_STATES.get(value.strip().lower(), None)
+    if boolean is None:
+        raise ValueError(f"'{value}' is not a boolean")
+    return boolean
+
+
 class Config:
+    """
+    Settings of the package manager. Immutable, so it can be shared by threads and passed to worker processes.
+
+    Creating it does not touch the file system. Directories are created when something is first written into them,
+    see ensure_directory. Config.load layers the settings of the config file and the environment over the defaults.
+    """
     REGISTRY_GIT_BRANCH_NAME = 'main'
     DEFAULT_GIT_REMOTE_NAME = 'origin'
     DEFAULT_GIT_BRANCH_NAME = 'main'
@@ -15,21 +49,117 @@ class Config:
 
     GLOBAL_GRID_PADDING = {'padx': 5, 'pady': 5}
 
+    # Keep a history of the durations of the steps in the DB, shown by naevpm stats
+    RECORD_METRICS = True
+
+    # Size of the thread pools for background tasks
+    NETWORK_WORKERS = 4
+    DISK_WORKERS = 2
+    # Network operations of AsyncApplicationLogic running at the same time
+    ASYNC_MAX_CONCURRENCY = 64
+
+    # In the package manager directory. naevpm daemon listens on it.
+    DAEMON_SOCKET_NAME = "daemon.sock"
+
+    # Path of the config file, instead of the default path
+    CONFIG_PATH_VARIABLE = 'NAEVPM_CONFIG'
+    # Settings which can be set in the config file and by environment variables:
+    # (argument of __init__, section and option in the config file, environment variable, conversion)
+    SETTINGS: list[tuple[str, str, str, str, Callable[[str], Any]]] = [
+        ('naevpm_root', 'paths', 'naevpm_root', 'NAEVPM_ROOT', _to_path),
+        ('naev_root', 'paths', 'naev_root', 'NAEV_ROOT', _to_path),
+        ('record_metrics', 'metrics', 'record', 'NAEVPM_RECORD_METRICS', _to_bool),
+    ]
+
     def __init__(self,
-                 naevpm_root: Optional[str] = appdirs.user_data_dir("naev-package-manager"),
-                 naev_root: Optional[str] = appdirs.user_data_dir("naev", appauthor=False, roaming=True)):
+                 naevpm_root: Optional[str] = None,
+                 naev_root: Optional[str] = None,
+                 record_metrics: Optional[bool] = None):
+        """
+        Only uses the given settings and the defaults. See load for the config file and the environment.
+        """
         super().__init__()
 
-        self.PM_ROOT = naevpm_root
+        self.PM_ROOT = naevpm_root if naevpm_root is not None else default_naevpm_root()
         self.DATABASE = os.path.join(self.PM_ROOT, "naevpm.db")
         self.REGISTRIES = os.path.join(self.PM_ROOT, "registries")
         self.LOCAL_REGISTRY = os.path.join(self.REGISTRIES, 'LOCAL')
         self.PLUGINS_CACHE = os.path.join(self.PM_ROOT, "plugins")
+        self.DAEMON_SOCKET = os.path.join(self.PM_ROOT, self.DAEMON_SOCKET_NAME)
 
-        self.NAEV_ROOT = naev_root
+        self.NAEV_ROOT = naev_root if naev_root is not None else default_naev_root()
         self.NAEV_PLUGIN_DIR = os.path.join(self.NAEV_ROOT, "plugins")
 
-        if not os.path.exists(self.LOCAL_REGISTRY):
-            os.makedirs(self.LOCAL_REGISTRY)
-        if not os.path.exists(self.PLUGINS_CACHE):
-            os.makedirs(self.PLUGINS_CACHE)
+        if record_metrics is not None:
+            self.RECORD_METRICS = record_metrics
+
+        self._frozen = True
+
+    def __setattr__(self, name: str, value: Any):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"Config is immutable, cannot set {name}")
+        super().__setattr__(name, value)
+
+    def ensure_directory(self, path: str) -> str:
+        """
+        Creates the directory with its parents if it does not exist yet. Call before writing into it.
+
+        @return: The path
+        """
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @classmethod
+    def load(cls, overrides: Optional[Mapping[str, Any]] = None, config_path: Optional[str] = None,
+             environ: Optional[Mapping[str, str]] = None) -> 'Config':
+        """
+        Reads the settings of the sources, each overriding the ones before: defaults, config file, environment
+        variables and the overrides, e.g. given as CLI flags.
+
+        The config file is an INI file, e.g.
+
+            [paths]
+            naevpm_root = ~/games/naevpm
+            naev_root = ~/games/naev
+
+            [metrics]
+            record = no
+
+        @param overrides: Arguments of __init__. None values are skipped, e.g. of CLI flags which were not given.
+        @param config_path: Defaults to $NAEVPM_CONFIG, else naevpm.ini in the user config directory, which is skipped
+        if it does not exist.
+        @param environ: Defaults to os.environ
+        @raise ConfigInvalid: If the config file cannot be read or a setting cannot be converted
+        """
+        if environ is None:
+            environ = os.environ
+        if config_path is None:
+            config_path = environ.get(cls.CONFIG_PATH_VARIABLE, None)
+        if config_path is None:
+            config_path = default_config_path()
+        elif not os.path.isfile(config_path):
+            # Only the default file is optional
+            raise ConfigInvalid(f"Config file {config_path} does not exist")
+        parser = configparser.ConfigParser(interpolation=None)
+        try:
+            # Skips a missing file
+            parser.read(config_path, encoding='utf-8')
+        except (configparser.Error, UnicodeDecodeError) as e:
+            raise ConfigInvalid(f"Config file {config_path} is invalid: {str(e)}")
+
+        settings = {}
+        for name, section, option, variable, convert in cls.SETTINGS:
+            value, origin = None, None
+            if parser.has_option(section, option):
+                value, origin = parser.get(section, option), f"option {option} in section [{section}] of {config_path}"
+            if variable in environ:
+                value, origin = environ[variable], f"environment variable {variable}"
+            if value is None:
+                continue
+            try:
+                settings[name] = convert(value)
+            except ValueError as e:
+                raise ConfigInvalid(f"Invalid {origin}: {str(e)}")
+        if overrides is not None:
+            settings.update((name, value) for name, value in overrides.items() if value is not None)
+        return cls(**settings)
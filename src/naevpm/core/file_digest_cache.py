@@ -0,0 +1,80 @@
+import os
+import time
+from hashlib import sha256
+from threading import Lock
+from typing import Optional
+
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.core.timing import Timings
+
+
+def sha256_file(path: str) -> str:
+    h = sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 64), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FileDigestCache:
+    """
+    SHA-256 digests of files, keyed by path and validated by size, modification time and inode like the index of
+    git. A file is only hashed again if one of them changed.
+
+    Digests are kept in memory and stored in the DB by flush, so hashing many files in parallel does not commit once
+    per file. Thread safe.
+    """
+    # A file modified again within the resolution of its modification time would keep its stat. Digests of files
+    # modified that recently are not cached.
+    RACY_SECONDS = 2
+
+    _database_connector: SqliteDatabaseConnector
+    _timings: Timings
+    # (size, mtime_ns, inode, digest) by path
+    _digests: dict[str, tuple[int, int, int, str]]
+    # Computed digests which are not stored in the DB yet
+    _pending: list[tuple[str, int, int, int, str]]
+    _lock: Lock
+
+    def __init__(self, database_connector: SqliteDatabaseConnector, timings: Optional[Timings] = None):
+        super().__init__()
+        self._database_connector = database_connector
+        self._timings = timings if timings is not None else Timings()
+        self._digests = {}
+        self._pending = []
+        self._lock = Lock()
+
+    def sha256(self, path: str) -> Optional[str]:
+        """
+        @return: None if the file does not exist
+        """
+        with self._timings.span('file_digest.lookup'):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return None
+            path = os.path.abspath(path)
+            key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            with self._lock:
+                entry = self._digests.get(path, None)
+            if entry is not None and entry[:3] == key:
+                return entry[3]
+            digest = self._database_connector.get_file_digest(path, *key)
+            if digest is None:
+                with self._timings.span('file_digest.hash') as span:
+                    digest = sha256_file(path)
+                    span.add_bytes(stat.st_size)
+                if time.time() - stat.st_mtime_ns / 1e9 < self.RACY_SECONDS:
+                    return digest
+                with self._lock:
+                    self._pending.append((path, *key, digest))
+            with self._lock:
+                self._digests[path] = (*key, digest)
+            return digest
+
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        if len(pending) > 0:
+            self._database_connector.set_file_digests(pending)
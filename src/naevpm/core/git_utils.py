@@ -1,7 +1,15 @@
+import logging
 import os
+from typing import Optional
+from urllib.parse import urlparse
+
 import pygit2
 from pygit2 import Repository
 
+from naevpm.core.progress import ProgressReporter
+
+logger = logging.getLogger(__name__)
+
 
 class MergeConflict(Exception):
     pass
@@ -11,11 +19,20 @@ class OriginNotFound(Exception):
     pass
 
 
-# class NaevPMRemoteCallbacks(git.RemoteCallbacks):
-#     def transfer_progress(self, stats):
-#         print(
-#             f'Cloning... {stats.indexed_objects} of {stats.total_objects} objects so far')
-# TODO clone progress
+class CommitNotFound(Exception):
+    pass
+
+
+def get_fetch_depth(url: str) -> int:
+    """
+    @return: 1 to fetch only the latest commit. 0 to fetch the whole history for local repositories, as the local
+    transport of libgit2 does not support shallow fetches. Copying local objects is cheap anyway.
+    """
+    # Windows paths like C:\foo are parsed as scheme c
+    if urlparse(url).scheme == 'file' or os.path.exists(url):
+        return 0
+    return 1
+
 
 def is_local_update_available(repo: Repository, remote_name='origin', branch='main'):
     for remote in repo.remotes:
@@ -29,15 +46,63 @@ def is_local_update_available(repo: Repository, remote_name='origin', branch='ma
     raise OriginNotFound(f"Could not find git origin '{remote_name}' to check for updates.")
 
 
-def fetch_latest_commit(repo: Repository, remote_name: str):
+def fetch_latest_commit(repo: Repository, remote_name: str,
+                        progress_reporter: Optional[ProgressReporter] = None):
     for remote in repo.remotes:
         if remote.name == remote_name:
             # Fetch only the latest commit
-            remote.fetch(depth=1)
+            remote.fetch(depth=get_fetch_depth(remote.url), callbacks=MyRemoteCallbacks(progress_reporter))
+            if progress_reporter is not None:
+                progress_reporter.finish()
             return
     raise OriginNotFound(f"Could not find git origin '{remote_name}' to fetch last commit")
 
 
+def get_head_commit_oid(path: str) -> str:
+    return str(pygit2.Repository(path).head.target)
+
+
+def checkout_commit(path: str, remote_name: str, commit_oid: str,
+                    progress_reporter: Optional[ProgressReporter] = None):
+    """
+    Resets the checked out branch and the working tree to the commit. Fetches only the commit if it is not in the
+    repository, e.g. in a shallow clone.
+
+    @raise CommitNotFound: If the remote does not have the commit either
+    """
+    repo = pygit2.Repository(path)
+    try:
+        oid = pygit2.Oid(hex=commit_oid)
+    except ValueError:
+        raise CommitNotFound(f"'{commit_oid}' is not a commit id")
+    if oid not in repo:
+        for remote in repo.remotes:
+            if remote.name == remote_name:
+                try:
+                    remote.fetch([commit_oid], depth=get_fetch_depth(remote.url),
+                                 callbacks=MyRemoteCallbacks(progress_reporter))
+                except pygit2.GitError as e:
+                    raise CommitNotFound(f"Could not fetch commit {commit_oid} from '{remote_name}': {str(e)}")
+                if progress_reporter is not None:
+                    progress_reporter.finish()
+                break
+        else:
+            raise OriginNotFound(f"Could not find git origin '{remote_name}' to fetch commit {commit_oid}")
+    commit = repo.get(oid)
+    if not isinstance(commit, pygit2.Commit):
+        raise CommitNotFound(f"Commit {commit_oid} not found")
+    repo.reset(oid, pygit2.GIT_RESET_HARD)
+
+
+def is_working_tree_clean(path: str) -> bool:
+    """
+    Compares the working tree with the index and HEAD. Only files whose stat differs from the index are hashed.
+
+    @return: False if tracked files were changed or deleted or untracked files were added
+    """
+    return len(pygit2.Repository(path).status()) == 0
+
+
 def is_remote_and_local_commit_same(repo: pygit2.Repository, remote_name: str, branch: str):
     # Current local commit:
     current = repo.lookup_reference(f'refs/heads/{branch}').target
@@ -46,13 +111,16 @@ def is_remote_and_local_commit_same(repo: pygit2.Repository, remote_name: str, b
     return current == latest
 
 
-def git_repository_pull(repo: Repository, remote_name: str, branch: str):
+def git_repository_pull(repo: Repository, remote_name: str, branch: str,
+                        progress_reporter: Optional[ProgressReporter] = None):
     """
     Taken from <https://github.com/MichaelBoselowitz/pygit2-examples/blob/master/examples.py>
     """
     for remote in repo.remotes:
         if remote.name == remote_name:
-            remote.fetch()
+            remote.fetch(callbacks=MyRemoteCallbacks(progress_reporter))
+            if progress_reporter is not None:
+                progress_reporter.finish()
             remote_master_id = repo.lookup_reference(f'refs/remotes/{remote_name}/{branch}').target
             merge_result, _ = repo.merge_analysis(remote_master_id)
             # Up to date, do nothing
@@ -91,35 +159,48 @@ def git_repository_pull(repo: Repository, remote_name: str, branch: str):
 
 
 class MyRemoteCallbacks(pygit2.RemoteCallbacks):
+    _progress_reporter: Optional[ProgressReporter]
+
+    def __init__(self, progress_reporter: Optional[ProgressReporter] = None):
+        super().__init__()
+        self._progress_reporter = progress_reporter
 
     def transfer_progress(self, stats):
-        print(f'{stats.indexed_objects}/{stats.total_objects}')
+        # Called for every received object. The reporter drops reports which come too fast.
+        if self._progress_reporter is not None:
+            self._progress_reporter.update(stats.indexed_objects, stats.total_objects, stats.received_bytes)
 
     def sideband_progress(self, string):
         super().sideband_progress(string)
-        print(string)
+        logger.debug(string)
 
     def credentials(self, url, username_from_url, allowed_types):
-        print(url, username_from_url, allowed_types)
+        logger.debug(f'{url} {username_from_url} {allowed_types}')
         return super().credentials(url, username_from_url, allowed_types)
 
     def certificate_check(self, certificate, valid, host):
-        print(certificate, valid, host)
+        logger.debug(f'{certificate} {valid} {host}')
         return super().certificate_check(certificate, valid, host)
 
     def update_tips(self, refname, old, new):
         super().update_tips(refname, old, new)
-        print(refname, old, new)
+        logger.debug(f'{refname} {old} {new}')
 
     def push_update_reference(self, refname, message):
         super().push_update_reference(refname, message)
-        print(refname, message)
+        logger.debug(f'{refname} {message}')
 
 
-def sync_repo(source: str, target: str, remote_name: str, branch: str):
+def sync_repo(source: str, target: str, remote_name: str, branch: str,
+              progress_reporter: Optional[ProgressReporter] = None):
+    """
+    @param progress_reporter: Receives the transfer progress in git objects
+    """
     if os.path.exists(target):
         repo = pygit2.Repository(target)
-        git_repository_pull(repo, remote_name=remote_name, branch=branch)
+        git_repository_pull(repo, remote_name=remote_name, branch=branch, progress_reporter=progress_reporter)
     else:
         pygit2.clone_repository(source, target, checkout_branch=branch,
-                                callbacks=MyRemoteCallbacks(), depth=1)
+                                callbacks=MyRemoteCallbacks(progress_reporter), depth=get_fetch_depth(source))
+        if progress_reporter is not None:
+            progress_reporter.finish()
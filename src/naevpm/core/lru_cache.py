@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from typing import Generic, TypeVar, Optional, Hashable
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class LruCache(Generic[K, V]):
+    """
+    Bounded mapping which evicts the least recently used entry when it is full. Not thread safe.
+    """
+    _max_size: int
+    # Least recently used first
+    _entries: OrderedDict[K, V]
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        if max_size < 1:
+            raise ValueError(f'max_size must be at least 1, got {max_size}')
+        self._max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key: K) -> Optional[V]:
+        """
+        @return: None if the key is not cached. Marks the entry as recently used.
+        """
+        value = self._entries.get(key, None)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: K):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
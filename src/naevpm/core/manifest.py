@@ -0,0 +1,136 @@
+import json
+from enum import Enum
+from typing import Optional
+
+from naevpm.core.models import IndexedPluginDbModel
+from naevpm.core.plugin_workflows.plugin_workflow import VerifyStatus
+
+
+class ManifestInvalid(Exception):
+    pass
+
+
+class ManifestEntry:
+    source: str
+    # Commit id of a git plugin or SHA-256 of a zip plugin. None installs whatever the source provides.
+    content_hash: Optional[str]
+    # Only for humans reading the manifest
+    name: Optional[str]
+
+    def __init__(self, source: str, content_hash: Optional[str] = None, name: Optional[str] = None):
+        super().__init__()
+        self.source = source
+        self.content_hash = content_hash
+        self.name = name
+
+
+class Manifest:
+    """
+    Set of plugins which should be installed, optionally pinned to their content. Stored as JSON:
+
+        {
+            "version": 1,
+            "plugins": [
+                {"source": "https://github.com/naev/example-plugin", "content_hash": "<commit id>"},
+                {"source": "https://example.com/plugin.zip", "content_hash": "<SHA-256>"},
+                {"source": "https://github.com/naev/unpinned-plugin"}
+            ]
+        }
+    """
+    VERSION = 1
+
+    entries: list[ManifestEntry]
+
+    def __init__(self, entries: list[ManifestEntry]):
+        super().__init__()
+        self.entries = entries
+
+
+def read_manifest(path: str) -> Manifest:
+    """
+    @raise ManifestInvalid
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            obj = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ManifestInvalid(f'Manifest {path} is not valid JSON: {str(e)}')
+    if not isinstance(obj, dict) or obj.get('version', None) != Manifest.VERSION:
+        raise ManifestInvalid(f'Manifest {path} does not have version {Manifest.VERSION}')
+    entries = []
+    sources = set()
+    for plugin in obj.get('plugins', []):
+        if not isinstance(plugin, dict) or not isinstance(plugin.get('source', None), str):
+            raise ManifestInvalid(f'Manifest {path} has a plugin without source')
+        source = plugin['source']
+        if source in sources:
+            raise ManifestInvalid(f'Manifest {path} has plugin {source} more than once')
+        sources.add(source)
+        entries.append(ManifestEntry(source, plugin.get('content_hash', None), plugin.get('name', None)))
+    return Manifest(entries)
+
+
+def write_manifest(manifest: Manifest, path: str):
+    plugins = []
+    for entry in manifest.entries:
+        plugin = {'source': entry.source}
+        if entry.name is not None:
+            plugin['name'] = entry.name
+        if entry.content_hash is not None:
+            plugin['content_hash'] = entry.content_hash
+        plugins.append(plugin)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': Manifest.VERSION, 'plugins': plugins}, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+class ApplyAction(Enum):
+    FETCH = 0
+    # Pins a fetched plugin to the content hash before installing it
+    INSTALL = 1
+    # Pins an installed plugin to the content hash and installs it again
+    UPDATE = 2
+    UNINSTALL = 3
+
+
+class PluginApplyPlan:
+    plugin: IndexedPluginDbModel
+    content_hash: Optional[str]
+    # Run in order
+    actions: list[ApplyAction]
+
+    def __init__(self, plugin: IndexedPluginDbModel, content_hash: Optional[str], actions: list[ApplyAction]):
+        super().__init__()
+        self.plugin = plugin
+        self.content_hash = content_hash
+        self.actions = actions
+
+
+class ApplyPlan:
+    # Only plugins which need at least one action
+    plugin_plans: list[PluginApplyPlan]
+    # Sources of the manifest which are not in the index
+    missing_sources: list[str]
+
+    def __init__(self, plugin_plans: list[PluginApplyPlan], missing_sources: list[str]):
+        super().__init__()
+        self.plugin_plans = plugin_plans
+        self.missing_sources = missing_sources
+
+
+class PluginVerifyResult:
+    source: str
+    # NOT_INSTALLED for plugins which are not in the index
+    status: VerifyStatus
+    # Content hash of the manifest
+    expected_content_hash: Optional[str]
+    # Content hash of the installed plugin
+    actual_content_hash: Optional[str]
+
+    def __init__(self, source: str, status: VerifyStatus, expected_content_hash: Optional[str],
+                 actual_content_hash: Optional[str]):
+        super().__init__()
+        self.source = source
+        self.status = status
+        self.expected_content_hash = expected_content_hash
+        self.actual_content_hash = actual_content_hash
@@ -0,0 +1,315 @@
+import bisect
+import math
+import time
+from datetime import datetime, timezone, timedelta
+from threading import Lock
+from typing import Optional
+
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.core.timing import Span
+
+# Upper bounds in seconds of the buckets the durations of rolled up events are counted in: 1 ms, 2 ms, 4 ms, ... about
+# 2.3 h and a last bucket for longer durations
+DURATION_BUCKETS = [0.001 * 2 ** i for i in range(24)] + [math.inf]
+
+# Name of the measurement of the DB size, taken by maintain
+DATABASE_SIZE = 'db.size'
+
+# Hit rates shown by naevpm stats: (all lookups, misses which did the work) by cache
+CACHE_HIT_RATES = {
+    # Files whose digest was hashed again
+    'file_digest': ('file_digest.lookup', 'file_digest.hash'),
+    # Cached plugins whose plugin.xml was parsed again
+    'plugin_metadata': ('plugin.extract_metadata', 'plugin.parse_metadata'),
+    # Fetched registries whose plugin XMLs were read again
+    'registry_index': ('registry.fetch', 'registry.read'),
+}
+
+
+def get_bucket_index(duration: float) -> int:
+    return bisect.bisect_left(DURATION_BUCKETS, duration)
+
+
+def get_bucket_value(bucket_index: int) -> float:
+    """
+    @return: Duration representing the durations counted in the bucket
+    """
+    upper = DURATION_BUCKETS[bucket_index]
+    lower = DURATION_BUCKETS[bucket_index - 1] if bucket_index > 0 else upper / 2
+    if math.isinf(upper):
+        return lower
+    return math.sqrt(lower * upper)
+
+
+def weighted_percentile(sorted_values: list[tuple[float, int]], percentile: float) -> Optional[float]:
+    """
+    @param sorted_values: (value, weight) sorted by value
+    @param percentile: 0 to 100
+    @return: The smallest value which at least the percentile of the weights is less or equal to
+    """
+    total = sum(weight for value, weight in sorted_values)
+    if total == 0:
+        return None
+    rank = percentile / 100 * total
+    cumulative = 0
+    for value, weight in sorted_values:
+        cumulative += weight
+        if cumulative >= rank:
+            return value
+    return sorted_values[-1][0]
+
+
+def get_day(unix_time: float) -> str:
+    return datetime.fromtimestamp(unix_time, tz=timezone.utc).date().isoformat()
+
+
+class OperationStats:
+    name: str
+    count: int
+    # Seconds. None if no event of the operation has a duration.
+    p50: Optional[float]
+    p90: Optional[float]
+    p99: Optional[float]
+    max: Optional[float]
+    bytes: int
+    items: int
+
+    def __init__(self, name: str, count: int, p50: Optional[float], p90: Optional[float], p99: Optional[float],
+                 max_: Optional[float], bytes_: int, items: int):
+        super().__init__()
+        self.name = name
+        self.count = count
+        self.p50 = p50
+        self.p90 = p90
+        self.p99 = p99
+        self.max = max_
+        self.bytes = bytes_
+        self.items = items
+
+
+class _Rollup:
+    count: int
+    total_duration: float
+    max_duration: float
+    bytes: int
+    items: int
+    histogram: list[int]
+
+    def __init__(self, count: int = 0, total_duration: float = 0.0, max_duration: float = 0.0, bytes_: int = 0,
+                 items: int = 0, histogram: Optional[list[int]] = None):
+        super().__init__()
+        self.count = count
+        self.total_duration = total_duration
+        self.max_duration = max_duration
+        self.bytes = bytes_
+        self.items = items
+        self.histogram = histogram if histogram is not None else [0] * len(DURATION_BUCKETS)
+
+    def add(self, duration: Optional[float], bytes_: int, items: int):
+        self.count += 1
+        if duration is not None:
+            self.total_duration += duration
+            self.max_duration = max(self.max_duration, duration)
+            self.histogram[get_bucket_index(duration)] += 1
+        self.bytes += bytes_
+        self.items += items
+
+
+class MetricsRecorder:
+    """
+    Keeps a history of the durations, bytes and items of the steps in the DB, fed by the spans of Timings.
+
+    Events are buffered in memory and written in one transaction per flush, so recording never commits per event.
+    The buffer is flushed when it is full or its oldest event is older than the flush interval, and by flush.
+
+    maintain rolls raw events up into daily histograms after RAW_RETENTION_DAYS and deletes rollups after
+    ROLLUP_RETENTION_DAYS, so the history stays small. It does so at most once per day. Thread safe.
+    """
+    FLUSH_SIZE = 200
+    # Seconds
+    FLUSH_INTERVAL = 60
+    RAW_RETENTION_DAYS = 14
+    ROLLUP_RETENTION_DAYS = 365
+
+    _database_connector: SqliteDatabaseConnector
+    # (name, time, duration, bytes, items)
+    _buffer: list[tuple[str, int, Optional[float], int, int]]
+    _buffer_start_time: Optional[float]
+    _lock: Lock
+
+    def __init__(self, database_connector: SqliteDatabaseConnector):
+        super().__init__()
+        self._database_connector = database_connector
+        self._buffer = []
+        self._buffer_start_time = None
+        self._lock = Lock()
+
+    def record_span(self, span: Span, seconds: float):
+        """
+        Listener for Timings.add_listener
+        """
+        self.record(span.name, seconds, span.bytes, span.items)
+
+    def record(self, name: str, duration: Optional[float], bytes_: int = 0, items: int = 0,
+               unix_time: Optional[float] = None):
+        """
+        @param duration: Seconds or None for measurements without duration
+        @param unix_time: Defaults to now
+        """
+        now = time.time()
+        with self._lock:
+            self._buffer.append((name, int(unix_time if unix_time is not None else now), duration, bytes_, items))
+            if self._buffer_start_time is None:
+                self._buffer_start_time = now
+            flush = len(self._buffer) >= self.FLUSH_SIZE or now - self._buffer_start_time >= self.FLUSH_INTERVAL
+        if flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            buffer = self._buffer
+            self._buffer = []
+            self._buffer_start_time = None
+        if len(buffer) > 0:
+            self._database_connector.add_metric_events(buffer)
+
+    def maintain(self, now: Optional[float] = None):
+        """
+        Measures the DB size, rolls up old events and deletes expired rollups, unless it was done already on the same
+        day (UTC). Flushes first.
+
+        @param now: Unix time, defaults to now
+        """
+        if now is None:
+            now = time.time()
+        self.flush()
+        today = datetime.fromtimestamp(now, tz=timezone.utc).date()
+        # The DB size is measured once per maintenance, so it tells when the last one was
+        today_start = int(datetime.combine(today, datetime.min.time(), tzinfo=timezone.utc).timestamp())
+        if self._database_connector.has_metric_event(DATABASE_SIZE, today_start):
+            return
+        self.record(DATABASE_SIZE, None, self._database_connector.get_database_size(), unix_time=now)
+        self.flush()
+        # Only whole days are rolled up, so a day never has raw events and a rollup at the same time
+        rollup_before_day = today - timedelta(days=self.RAW_RETENTION_DAYS)
+        events_before = int(datetime.combine(rollup_before_day, datetime.min.time(), tzinfo=timezone.utc).timestamp())
+        expire_before_day = (today - timedelta(days=self.ROLLUP_RETENTION_DAYS)).isoformat()
+
+        rollups: dict[tuple[str, str], _Rollup] = {}
+        for name, unix_time, duration, bytes_, items in self._database_connector.iter_metric_events(0, events_before):
+            key = (name, get_day(unix_time))
+            rollup = rollups.get(key, None)
+            if rollup is None:
+                rollup = _Rollup()
+                rollups[key] = rollup
+            rollup.add(duration, bytes_, items)
+        if len(rollups) > 0:
+            # Events recorded late, e.g. with a wrong clock, are merged into the existing rollups of their day
+            for name, day, count, total_duration, max_duration, bytes_, items, histogram in \
+                    self._database_connector.get_metric_rollups(min(day for name, day in rollups.keys())):
+                rollup = rollups.get((name, day), None)
+                if rollup is not None:
+                    rollup.count += count
+                    rollup.total_duration += total_duration
+                    rollup.max_duration = max(rollup.max_duration, max_duration)
+                    rollup.bytes += bytes_
+                    rollup.items += items
+                    rollup.histogram = [a + b for a, b in zip(rollup.histogram, histogram)]
+        self._database_connector.rollup_metric_events(
+            [(name, day, r.count, r.total_duration, r.max_duration, r.bytes, r.items, r.histogram)
+             for (name, day), r in rollups.items()],
+            events_before, expire_before_day)
+
+
+def get_operation_stats(database_connector: SqliteDatabaseConnector, days: int,
+                        now: Optional[float] = None) -> list[OperationStats]:
+    """
+    Percentiles of raw events are exact. Percentiles of rolled up days are estimated from their histograms.
+
+    @param days: Only events of the last days are included
+    @param now: Unix time, defaults to now
+    @return: Stats of each operation, sorted by name
+    """
+    if now is None:
+        now = time.time()
+    since = now - days * 24 * 60 * 60
+    # (value, weight) of the durations by name
+    durations: dict[str, list[tuple[float, int]]] = {}
+    totals: dict[str, list[int]] = {}
+
+    def get_totals(name_: str) -> list[int]:
+        # count, bytes, items
+        if name_ not in totals:
+            totals[name_] = [0, 0, 0]
+            durations[name_] = []
+        return totals[name_]
+
+    for name, day, count, total_duration, max_duration, bytes_, items, histogram in \
+            database_connector.get_metric_rollups(get_day(since)):
+        if name == DATABASE_SIZE:
+            continue
+        t = get_totals(name)
+        t[0] += count
+        t[1] += bytes_
+        t[2] += items
+        # The largest duration is known exactly. Estimates of its bucket must not exceed it.
+        durations[name].extend((min(get_bucket_value(i), max_duration), weight)
+                               for i, weight in enumerate(histogram) if weight > 0)
+        if max_duration > 0:
+            durations[name].append((max_duration, 0))
+    for name, unix_time, duration, bytes_, items in database_connector.iter_metric_events(int(since)):
+        if name == DATABASE_SIZE:
+            continue
+        t = get_totals(name)
+        t[0] += 1
+        t[1] += bytes_
+        t[2] += items
+        if duration is not None:
+            durations[name].append((duration, 1))
+
+    operation_stats = []
+    for name in sorted(totals.keys()):
+        values = sorted(durations[name])
+        count, bytes_, items = totals[name]
+        operation_stats.append(OperationStats(
+            name, count,
+            weighted_percentile(values, 50), weighted_percentile(values, 90), weighted_percentile(values, 99),
+            values[-1][0] if len(values) > 0 else None,
+            bytes_, items))
+    return operation_stats
+
+
+def get_database_sizes(database_connector: SqliteDatabaseConnector, days: int,
+                       now: Optional[float] = None) -> list[tuple[str, int]]:
+    """
+    @param days: Only measurements of the last days are included
+    @param now: Unix time, defaults to now
+    @return: (ISO date, mean DB size in bytes) of the days the size was measured on, oldest first
+    """
+    if now is None:
+        now = time.time()
+    since = now - days * 24 * 60 * 60
+    # [count, bytes] by day
+    sizes: dict[str, list[int]] = {}
+    for name, day, count, total_duration, max_duration, bytes_, items, histogram in \
+            database_connector.get_metric_rollups(get_day(since)):
+        if name == DATABASE_SIZE:
+            sizes[day] = [count, bytes_]
+    for name, unix_time, duration, bytes_, items in database_connector.iter_metric_events(int(since)):
+        if name == DATABASE_SIZE:
+            size = sizes.setdefault(get_day(unix_time), [0, 0])
+            size[0] += 1
+            size[1] += bytes_
+    return [(day, size[1] // size[0]) for day, size in sorted(sizes.items())]
+
+
+def get_cache_hit_rates(operation_stats: list[OperationStats]) -> dict[str, Optional[float]]:
+    """
+    @return: Hit rate from 0 to 1 by cache, see CACHE_HIT_RATES. None if the cache was not used.
+    """
+    counts = {stats.name: stats.count for stats in operation_stats}
+    hit_rates = {}
+    for cache, (lookups, misses) in CACHE_HIT_RATES.items():
+        lookup_count = counts.get(lookups, 0)
+        hit_rates[cache] = None if lookup_count == 0 else max(0.0, 1 - counts.get(misses, 0) / lookup_count)
+    return hit_rates
@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import Optional, Any
 import inspect
 
 
@@ -15,6 +15,8 @@ class PluginMetadataDbModel:
     blacklist: Optional[list[str]]
     total_conversion: Optional[bool]
     whitelist: Optional[list[str]]
+    # Hash of the cached plugin content the metadata was extracted from
+    content_hash: Optional[str]
 
     def __init__(self,
                  name: Optional[str] = None,
@@ -26,7 +28,8 @@ class PluginMetadataDbModel:
                  source: Optional[str] = None,
                  blacklist: Optional[list[str]] = None,
                  total_conversion: Optional[bool] = None,
-                 whitelist: Optional[list[str]] = None
+                 whitelist: Optional[list[str]] = None,
+                 content_hash: Optional[str] = None
                  ):
         super().__init__()
         self.name = name
@@ -39,6 +42,7 @@ class PluginMetadataDbModel:
         self.blacklist = blacklist
         self.total_conversion = total_conversion
         self.whitelist = whitelist
+        self.content_hash = content_hash
 
 
 class RegistryPluginMetaDataModel:
@@ -118,3 +122,18 @@ class RegistryDbModel:
 indexed_plugin_fields = list(inspect.get_annotations(IndexedPluginDbModel))
 plugin_metadata_fields = list(inspect.get_annotations(PluginMetadataDbModel))
 registry_fields = list(inspect.get_annotations(RegistryDbModel))
+
+
+def to_record(obj: Any, fields: list[str]) -> dict[str, Any]:
+    """
+    @return: The fields of a model as JSON serializable values. Enums are stored by name and datetimes as ISO 8601.
+    """
+    record = {}
+    for field in fields:
+        value = getattr(obj, field)
+        if isinstance(value, Enum):
+            value = value.name
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        record[field] = value
+    return record
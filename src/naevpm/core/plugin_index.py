@@ -0,0 +1,176 @@
+import copy
+from threading import Lock
+from typing import Optional
+
+from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector, IndexChanges
+
+
+class PluginIndexSnapshot:
+    """
+    Immutable view of the index at one point in time. Plugins and registries are stored in tuples in the order of the
+    DB queries. The dicts map a source to the position in the tuples.
+    """
+    plugins: tuple[IndexedPluginDbModel, ...]
+    registries: tuple[RegistryDbModel, ...]
+    _plugin_positions: dict[str, int]
+    _registry_positions: dict[str, int]
+    _registry_plugin_positions: dict[Optional[str], tuple[int, ...]]
+
+    def __init__(self, plugins: list[IndexedPluginDbModel], registries: list[RegistryDbModel]):
+        super().__init__()
+        self.plugins = tuple(plugins)
+        self.registries = tuple(registries)
+        self._plugin_positions = {plugin.source: i for i, plugin in enumerate(self.plugins)}
+        self._registry_positions = {registry.source: i for i, registry in enumerate(self.registries)}
+        registry_plugin_positions: dict[Optional[str], list[int]] = {}
+        for i, plugin in enumerate(self.plugins):
+            registry_plugin_positions.setdefault(plugin.registry_source, []).append(i)
+        self._registry_plugin_positions = {registry_source: tuple(positions)
+                                           for registry_source, positions in registry_plugin_positions.items()}
+
+    def replace(self, plugins: list[IndexedPluginDbModel],
+                registries: Optional[list[RegistryDbModel]]) -> Optional['PluginIndexSnapshot']:
+        """
+        Creates a snapshot with changed rows. The positions of the plugins are shared with this snapshot, so only the
+        tuple of plugins is copied.
+
+        @param plugins: Changed rows of plugins of this snapshot
+        @param registries: All registries if they changed, else None
+        @return: None if a plugin is not in this snapshot or changed its position or registry, so the index must be
+        loaded again
+        """
+        changed_plugins = list(self.plugins)
+        for plugin in plugins:
+            i = self._plugin_positions.get(plugin.source, None)
+            if i is None:
+                return None
+            old_plugin = changed_plugins[i]
+            # The plugins are ordered by name
+            if plugin.name != old_plugin.name or plugin.registry_source != old_plugin.registry_source:
+                return None
+            changed_plugins[i] = plugin
+        snapshot = copy.copy(self)
+        snapshot.plugins = tuple(changed_plugins)
+        if registries is not None:
+            snapshot.registries = tuple(registries)
+            snapshot._registry_positions = {registry.source: i for i, registry in enumerate(snapshot.registries)}
+        return snapshot
+
+    def get_plugin(self, source: str) -> Optional[IndexedPluginDbModel]:
+        i = self._plugin_positions.get(source, None)
+        if i is None:
+            return None
+        return self.plugins[i]
+
+    def get_plugins_of_registry(self, registry_source: Optional[str]) -> list[IndexedPluginDbModel]:
+        return [self.plugins[i] for i in self._registry_plugin_positions.get(registry_source, ())]
+
+    def get_registry(self, source: str) -> Optional[RegistryDbModel]:
+        i = self._registry_positions.get(source, None)
+        if i is None:
+            return None
+        return self.registries[i]
+
+
+class PluginIndex:
+    """
+    In-memory index of plugins and registries shared by the CLI, the GUI and the workflows.
+
+    The index is loaded once and then read without touching the DB. Writes go to the DB through the database
+    connector. A commit which only updated rows in place patches the snapshot with the changed rows. A commit which
+    inserted or deleted rows marks the snapshot stale and the next read loads the index again. Either way, a new
+    snapshot replaces the current one in a single assignment, so readers never wait for a commit and never see a
+    partially loaded index. Commits which did not change the index, e.g. of metrics or caches, are ignored.
+
+    Models are returned as copies which callers can modify without changing the snapshot.
+    """
+    _database_connector: SqliteDatabaseConnector
+    _snapshot: Optional[PluginIndexSnapshot]
+    # The snapshot misses committed changes and is loaded again by the next read
+    _stale: bool
+    # Counts the commits, so a load knows whether a commit happened while it read the DB
+    _generation: int
+    # Guards the fields above. Never held while waiting for the transaction lock of the connector.
+    _lock: Lock
+
+    def __init__(self, database_connector: SqliteDatabaseConnector):
+        super().__init__()
+        self._database_connector = database_connector
+        self._snapshot = None
+        self._stale = False
+        self._generation = 0
+        self._lock = Lock()
+        database_connector.add_commit_listener(self._on_commit)
+
+    def _load(self) -> PluginIndexSnapshot:
+        with self._database_connector.consistent_read() as in_transaction:
+            if in_transaction and self._snapshot is not None:
+                # The reads would see the uncommitted writes of the transaction of this thread. Until it commits,
+                # the committed state is read.
+                return self._snapshot
+            with self._lock:
+                generation = self._generation
+            plugins = self._database_connector.get_plugins()
+            registries = self._database_connector.get_registries()
+        # Indexing the rows takes longest. Writers need not wait for it.
+        snapshot = PluginIndexSnapshot(plugins, registries)
+        with self._lock:
+            self._snapshot = snapshot
+            # Commits while indexing the rows are not in the snapshot
+            self._stale = in_transaction or self._generation != generation
+        return snapshot
+
+    def _on_commit(self, changes: IndexChanges):
+        # Runs with the transaction lock held. Only reads the changed rows.
+        with self._lock:
+            self._generation += 1
+            snapshot = self._snapshot
+            # Only what was already loaded is updated. The first read loads the index.
+            if snapshot is None or self._stale:
+                return
+            if changes.reload:
+                self._stale = True
+                return
+        plugins = self._database_connector.get_plugins_by_sources(changes.plugin_sources)
+        registries = self._database_connector.get_registries() if changes.registries else None
+        changed_snapshot = None
+        if len(plugins) == len(changes.plugin_sources):
+            changed_snapshot = snapshot.replace(plugins, registries)
+        with self._lock:
+            if self._snapshot is not snapshot or self._stale:
+                return
+            if changed_snapshot is None:
+                self._stale = True
+            else:
+                self._snapshot = changed_snapshot
+
+    def get_snapshot(self) -> PluginIndexSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None or self._stale:
+            snapshot = self._load()
+        return snapshot
+
+    def get_plugins(self) -> list[IndexedPluginDbModel]:
+        return [copy.copy(plugin) for plugin in self.get_snapshot().plugins]
+
+    def get_plugins_page(self, offset: int, limit: int) -> list[IndexedPluginDbModel]:
+        """
+        @return: At most limit plugins starting at offset in the same order as get_plugins
+        """
+        return [copy.copy(plugin) for plugin in self.get_snapshot().plugins[offset:offset + limit]]
+
+    def count_plugins(self) -> int:
+        return len(self.get_snapshot().plugins)
+
+    def get_plugin(self, source: str) -> Optional[IndexedPluginDbModel]:
+        return copy.copy(self.get_snapshot().get_plugin(source))
+
+    def get_plugins_of_registry(self, registry_source: Optional[str]) -> list[IndexedPluginDbModel]:
+        return [copy.copy(plugin) for plugin in self.get_snapshot().get_plugins_of_registry(registry_source)]
+
+    def get_registries(self) -> list[RegistryDbModel]:
+        return [copy.copy(registry) for registry in self.get_snapshot().registries]
+
+    def get_registry(self, source: str) -> Optional[RegistryDbModel]:
+        return copy.copy(self.get_snapshot().get_registry(source))
@@ -1,32 +1,43 @@
 import os
 import shutil
+from typing import Optional
 
-import pygit2
-
-from naevpm.core import git_utils
+from naevpm.core.abstract_thread_communication import AbstractCommunication
 from naevpm.core.config import Config
-from naevpm.core.plugin_workflows.plugin_workflow import PluginWorkflow
+from naevpm.core.plugin_workflows.plugin_workflow import PluginWorkflow, PluginContentHashMismatch, VerifyStatus
+from naevpm.core.progress import ProgressReporter
 
 
 class GitPluginWorkflow(PluginWorkflow):
+    """
+    pygit2 and git_utils are imported in the methods, as importing pygit2 takes long and is not needed to start the
+    application.
+    """
 
-    def fetch_plugin(self, source: str, cache_location: str):
-        git_utils.sync_repo(source, cache_location, Config.DEFAULT_GIT_REMOTE_NAME, Config.REGISTRY_GIT_BRANCH_NAME)
+    def fetch_plugin(self, source: str, cache_location: str, tc: AbstractCommunication):
+        from naevpm.core import git_utils
+        git_utils.sync_repo(source, cache_location, Config.DEFAULT_GIT_REMOTE_NAME, Config.REGISTRY_GIT_BRANCH_NAME,
+                            ProgressReporter(tc, source, 'objects'))
 
     def install_plugin(self, cache_location: str, install_location: str):
         if os.path.exists(install_location):
             shutil.rmtree(install_location)
         shutil.copytree(cache_location, install_location, copy_function=os.link)
 
-    def check_plugin(self, source: str, cache_location: str, install_location: str) -> bool:
+    def check_plugin(self, source: str, cache_location: str, install_location: str,
+                     tc: AbstractCommunication) -> bool:
+        import pygit2
+        from naevpm.core import git_utils
         repo = pygit2.Repository(cache_location)
-        git_utils.fetch_latest_commit(repo, Config.DEFAULT_GIT_REMOTE_NAME)
+        git_utils.fetch_latest_commit(repo, Config.DEFAULT_GIT_REMOTE_NAME, ProgressReporter(tc, source, 'objects'))
         return not git_utils.is_remote_and_local_commit_same(repo, Config.DEFAULT_GIT_REMOTE_NAME,
                                                              Config.DEFAULT_GIT_BRANCH_NAME)
 
-    def update_plugin(self, source: str, cache_location: str, install_location: str):
+    def update_plugin(self, source: str, cache_location: str, install_location: str, tc: AbstractCommunication):
+        from naevpm.core import git_utils
         # Update cache
-        git_utils.sync_repo(source, cache_location, Config.DEFAULT_GIT_REMOTE_NAME, Config.REGISTRY_GIT_BRANCH_NAME)
+        git_utils.sync_repo(source, cache_location, Config.DEFAULT_GIT_REMOTE_NAME, Config.REGISTRY_GIT_BRANCH_NAME,
+                            ProgressReporter(tc, source, 'objects'))
 
         # Apply update by deleting installation folder and hard-linking it again to the cache
         if os.path.exists(install_location):
@@ -40,3 +51,30 @@ class GitPluginWorkflow(PluginWorkflow):
     def delete_plugin(self, cache_location: str):
         if os.path.exists(cache_location):
             shutil.rmtree(cache_location)
+
+    def pin_plugin(self, source: str, cache_location: str, content_hash: str, tc: AbstractCommunication):
+        from naevpm.core import git_utils
+        try:
+            git_utils.checkout_commit(cache_location, Config.DEFAULT_GIT_REMOTE_NAME, content_hash,
+                                      ProgressReporter(tc, source, 'objects'))
+        except git_utils.CommitNotFound as e:
+            raise PluginContentHashMismatch(str(e))
+
+    def get_content_hash(self, cache_location: str) -> Optional[str]:
+        if not os.path.exists(cache_location):
+            return None
+        from naevpm.core import git_utils
+        # The checked out commit identifies the content
+        return git_utils.get_head_commit_oid(cache_location)
+
+    def verify_plugin(self, install_location: str, content_hash: Optional[str]) -> tuple[VerifyStatus, Optional[str]]:
+        if not os.path.exists(install_location):
+            return VerifyStatus.NOT_INSTALLED, None
+        from naevpm.core import git_utils
+        # The installation is a copy of the cached repository, including its object DB and index
+        actual_content_hash = git_utils.get_head_commit_oid(install_location)
+        if content_hash is not None and actual_content_hash != content_hash:
+            return VerifyStatus.MISMATCH, actual_content_hash
+        if not git_utils.is_working_tree_clean(install_location):
+            return VerifyStatus.MODIFIED, actual_content_hash
+        return VerifyStatus.OK, actual_content_hash
@@ -1,11 +1,22 @@
 import os
+from typing import Optional
 
-from naevpm.core.plugin_workflows.plugin_workflow import PluginWorkflow
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.file_digest_cache import FileDigestCache, sha256_file
+from naevpm.core.plugin_workflows.plugin_workflow import PluginWorkflow, PluginContentHashMismatch, VerifyStatus
 
 
 class LocalZipPluginWorkflow(PluginWorkflow):
+    _file_digest_cache: Optional[FileDigestCache]
 
-    def fetch_plugin(self, source: str, cache_location: str):
+    def __init__(self, file_digest_cache: Optional[FileDigestCache] = None):
+        """
+        @param file_digest_cache: Without it, files are hashed every time
+        """
+        super().__init__()
+        self._file_digest_cache = file_digest_cache
+
+    def fetch_plugin(self, source: str, cache_location: str, tc: AbstractCommunication):
         if os.path.exists(cache_location):
             os.remove(cache_location)
         os.link(source, cache_location)
@@ -15,7 +26,8 @@ class LocalZipPluginWorkflow(PluginWorkflow):
             os.remove(install_location)
         os.link(cache_location, install_location)
 
-    def check_plugin(self, source: str, cache_location: str, install_location: str) -> bool:
+    def check_plugin(self, source: str, cache_location: str, install_location: str,
+                     tc: AbstractCommunication) -> bool:
         # if same file (hard-linking), no need to update
         if os.path.exists(source) and os.path.exists(cache_location):
             if os.path.samefile(source, cache_location):
@@ -23,7 +35,7 @@ class LocalZipPluginWorkflow(PluginWorkflow):
                     return False
         return True
 
-    def update_plugin(self, source: str, cache_location: str, install_location: str):
+    def update_plugin(self, source: str, cache_location: str, install_location: str, tc: AbstractCommunication):
         # Possibly no need to update because of hard-linking
 
         if os.path.exists(source):
@@ -55,10 +67,26 @@ class LocalZipPluginWorkflow(PluginWorkflow):
         if os.path.exists(cache_location):
             os.remove(cache_location)
 
-
-
-
-
-
-
-
+    def pin_plugin(self, source: str, cache_location: str, content_hash: str, tc: AbstractCommunication):
+        if self.get_content_hash(cache_location) == content_hash:
+            return
+        # The source might have changed since it was fetched
+        self.fetch_plugin(source, cache_location, tc)
+        actual_content_hash = self.get_content_hash(cache_location)
+        if actual_content_hash != content_hash:
+            raise PluginContentHashMismatch(f"Expected SHA-256 {content_hash} of {source}, got {actual_content_hash}")
+
+    def get_content_hash(self, cache_location: str) -> Optional[str]:
+        if not os.path.exists(cache_location):
+            return None
+        if self._file_digest_cache is not None:
+            return self._file_digest_cache.sha256(cache_location)
+        return sha256_file(cache_location)
+
+    def verify_plugin(self, install_location: str, content_hash: Optional[str]) -> tuple[VerifyStatus, Optional[str]]:
+        actual_content_hash = self.get_content_hash(install_location)
+        if actual_content_hash is None:
+            return VerifyStatus.NOT_INSTALLED, None
+        if content_hash is not None and actual_content_hash != content_hash:
+            return VerifyStatus.MISMATCH, actual_content_hash
+        return VerifyStatus.OK, actual_content_hash
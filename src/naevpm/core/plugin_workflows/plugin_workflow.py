@@ -1,14 +1,37 @@
+from enum import Enum
+from typing import Optional
+
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+
+
+class PluginContentHashMismatch(Exception):
+    pass
+
+
+class VerifyStatus(Enum):
+    OK = 0
+    NOT_INSTALLED = 1
+    # The installed content is not the content with the expected hash
+    MISMATCH = 2
+    # The installed content has the expected hash, but files were changed after installing
+    MODIFIED = 3
+
+
 class PluginWorkflow:
-    def fetch_plugin(self, source: str, cache_location: str):
+    """
+    Workflows which transfer data report the transfer progress to the given communication object.
+    """
+    def fetch_plugin(self, source: str, cache_location: str, tc: AbstractCommunication):
         pass
 
     def install_plugin(self, cache_location: str, install_location: str):
         pass
 
-    def check_plugin(self, source: str, cache_location: str, install_location: str) -> bool:
+    def check_plugin(self, source: str, cache_location: str, install_location: str,
+                     tc: AbstractCommunication) -> bool:
         pass
 
-    def update_plugin(self, source: str, cache_location: str, install_location: str):
+    def update_plugin(self, source: str, cache_location: str, install_location: str, tc: AbstractCommunication):
         pass
 
     def uninstall_plugin(self, install_location: str):
@@ -16,3 +39,26 @@ class PluginWorkflow:
 
     def delete_plugin(self, cache_location: str):
         pass
+
+    def pin_plugin(self, source: str, cache_location: str, content_hash: str, tc: AbstractCommunication):
+        """
+        Makes the cached plugin have the content hash, e.g. by checking out the commit of a git plugin.
+
+        @raise PluginContentHashMismatch: If the source does not provide the content
+        """
+        pass
+
+    def get_content_hash(self, cache_location: str) -> Optional[str]:
+        """
+        @return: Hash identifying the content of the cached plugin or None if it is not cached.
+        """
+        pass
+
+    def verify_plugin(self, install_location: str, content_hash: Optional[str]) -> tuple[VerifyStatus, Optional[str]]:
+        """
+        Checks the installed plugin without network access.
+
+        @param content_hash: None only checks that the plugin is installed
+        @return: The status and the content hash of the installed plugin
+        """
+        pass
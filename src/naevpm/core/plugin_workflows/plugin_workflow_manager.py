@@ -1,17 +1,21 @@
 import base64
+import logging
 import os
 import re
 from hashlib import md5
+from typing import Optional
 from urllib.parse import urlparse
 
 from naevpm.core.abstract_thread_communication import AbstractCommunication
 from naevpm.core.config import Config
+from naevpm.core.file_digest_cache import FileDigestCache
 from naevpm.core.models import IndexedPluginDbModel, PluginState
 from naevpm.core.plugin_workflows.git_plugin_workflow import GitPluginWorkflow
 from naevpm.core.plugin_workflows.local_zip_plugin_workflow import LocalZipPluginWorkflow
-from naevpm.core.plugin_workflows.plugin_workflow import PluginWorkflow
+from naevpm.core.plugin_workflows.plugin_workflow import PluginWorkflow, VerifyStatus
 from naevpm.core.plugin_workflows.remote_zip_plugin_workflow import RemoteZipPluginWorkflow
 from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.core.timing import Timings
 
 unsafe_chars_pattern = re.compile(r'[^0-9a-zA-Z_]')
 
@@ -21,14 +25,19 @@ class PluginWorkflowManager:
     local_zip_plugin_workflow: PluginWorkflow
     remote_zip_plugin_workflow: PluginWorkflow
     git_plugin_workflow: PluginWorkflow
+    file_digest_cache: FileDigestCache
     config: Config
+    timings: Timings
 
-    def __init__(self, database_connector: SqliteDatabaseConnector, config: Config):
+    def __init__(self, database_connector: SqliteDatabaseConnector, config: Config,
+                 timings: Optional[Timings] = None):
         super().__init__()
         self.config = config
         self.database_connector = database_connector
-        self.local_zip_plugin_workflow = LocalZipPluginWorkflow()
-        self.remote_zip_plugin_workflow = RemoteZipPluginWorkflow()
+        self.timings = timings if timings is not None else Timings()
+        self.file_digest_cache = FileDigestCache(database_connector, self.timings)
+        self.local_zip_plugin_workflow = LocalZipPluginWorkflow(self.file_digest_cache)
+        self.remote_zip_plugin_workflow = RemoteZipPluginWorkflow(self.file_digest_cache)
         self.git_plugin_workflow = GitPluginWorkflow()
 
     def _get_workflow(self, plugin: IndexedPluginDbModel) -> PluginWorkflow:
@@ -46,6 +55,9 @@ class PluginWorkflowManager:
         else:
             return self.git_plugin_workflow
 
+    def is_remote_zip(self, plugin: IndexedPluginDbModel) -> bool:
+        return self._get_workflow(plugin) is self.remote_zip_plugin_workflow
+
     def _get_source_hash(self, source: str):
         return base64.urlsafe_b64encode(md5(source.encode('utf-8')).digest()).decode(
             'utf-8')
@@ -61,18 +73,39 @@ class PluginWorkflowManager:
         install_location = str(os.path.join(self.config.NAEV_PLUGIN_DIR, file_system_name + suffix))
         return cache_location, install_location
 
+    def get_content_hash(self, plugin: IndexedPluginDbModel) -> Optional[str]:
+        cache_location, install_location = self.get_locations(plugin)
+        with self.timings.span('plugin.content_hash'):
+            return self._get_workflow(plugin).get_content_hash(cache_location)
+
+    def get_installed_content_hash(self, plugin: IndexedPluginDbModel) -> Optional[str]:
+        cache_location, install_location = self.get_locations(plugin)
+        with self.timings.span('plugin.content_hash'):
+            return self._get_workflow(plugin).get_content_hash(install_location)
+
+    def verify_plugin(self, plugin: IndexedPluginDbModel, content_hash: Optional[str]) \
+            -> tuple[VerifyStatus, Optional[str]]:
+        """
+        Checks the installation of the plugin without network access, see PluginWorkflow.verify_plugin.
+        """
+        cache_location, install_location = self.get_locations(plugin)
+        with self.timings.span('plugin.verify'):
+            return self._get_workflow(plugin).verify_plugin(install_location, content_hash)
+
     def _save_plugin_state(self, plugin: IndexedPluginDbModel, state: PluginState, tc: AbstractCommunication):
-        tc.message(f"Saving: State '{state.name}' for plugin {plugin.source}")
+        tc.message(f"Saving: State '{state.name}' for plugin {plugin.source}", level=logging.DEBUG)
         self.database_connector.set_plugin_state(plugin.source, state)
         plugin.state = state
-        tc.message(f"Saved: State '{state.name}' for plugin {plugin.source}")
+        tc.message(f"Saved: State '{state.name}' for plugin {plugin.source}", level=logging.DEBUG)
 
     def _save_plugin_update_available(self, plugin: IndexedPluginDbModel, update_available: bool,
                                       tc: AbstractCommunication):
-        tc.message(f"Saving: Plugin field update_available '{str(update_available)}' for plugin {plugin.source}")
+        tc.message(f"Saving: Plugin field update_available '{str(update_available)}' for plugin {plugin.source}",
+                   level=logging.DEBUG)
         self.database_connector.set_plugin_update_available(plugin.source, update_available)
         plugin.update_available = update_available
-        tc.message(f"Saved: Plugin field update_available '{str(update_available)}' for plugin {plugin.source}")
+        tc.message(f"Saved: Plugin field update_available '{str(update_available)}' for plugin {plugin.source}",
+                   level=logging.DEBUG)
 
     def remove_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         assert plugin.state == PluginState.INDEXED
@@ -81,53 +114,122 @@ class PluginWorkflowManager:
         tc.message(f"Removed: Plugin {plugin.source} from index")
 
     def fetch_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        self.fetch_plugin_content(plugin, tc)
+        self.save_fetched_plugin(plugin, tc)
+
+    def fetch_plugin_content(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        """
+        Writes the content of the plugin to its cache location without saving the state.
+        """
         assert plugin.state == PluginState.INDEXED
         tc.message(f"Fetching: Plugin from {plugin.source}")
         cache_location, install_location = self.get_locations(plugin)
-        self._get_workflow(plugin).fetch_plugin(plugin.source, cache_location)
+        self.config.ensure_directory(self.config.PLUGINS_CACHE)
+        with self.timings.span('plugin.fetch') as span:
+            self._get_workflow(plugin).fetch_plugin(plugin.source, cache_location, tc)
+            if os.path.isfile(cache_location):
+                span.add_bytes(os.path.getsize(cache_location))
+
+    def save_fetched_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        """
+        Saves the plugin as cached after its content was written to the cache location.
+        """
         self._save_plugin_state(plugin, PluginState.CACHED, tc)
         tc.message(f"Fetched: Plugin from {plugin.source}")
 
     def install_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        self.install_plugin_files(plugin, tc)
+        self.save_installed_plugin(plugin, tc)
+
+    def install_plugin_files(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         assert plugin.state == PluginState.CACHED
         tc.message(f"Installing: Plugin {plugin.source} from cache")
         cache_location, install_location = self.get_locations(plugin)
-        self._get_workflow(plugin).install_plugin(cache_location, install_location)
+        self.config.ensure_directory(self.config.NAEV_PLUGIN_DIR)
+        with self.timings.span('plugin.install'):
+            self._get_workflow(plugin).install_plugin(cache_location, install_location)
+
+    def save_installed_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         self._save_plugin_state(plugin, PluginState.INSTALLED, tc)
-        tc.message(f"Installed: Plugin {plugin.source} from cache at {cache_location}")
+        tc.message(f"Installed: Plugin {plugin.source}")
 
     def check_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        update_available = self.is_update_available(plugin, tc)
+        self.save_checked_plugin(plugin, update_available, tc)
+
+    def is_update_available(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication) -> bool:
+        """
+        Checks the source of the installed plugin for an update without saving the result.
+        """
         assert plugin.state == PluginState.INSTALLED
         tc.message(f"Checking for updates: Plugin {plugin.source}")
         cache_location, install_location = self.get_locations(plugin)
-        update_available = self._get_workflow(plugin).check_plugin(plugin.source, cache_location, install_location)
-        if update_available:
-            self._save_plugin_update_available(plugin, True, tc)
-        else:
-            self._save_plugin_update_available(plugin, False, tc)
+        with self.timings.span('plugin.check'):
+            return self._get_workflow(plugin).check_plugin(plugin.source, cache_location, install_location, tc)
+
+    def save_checked_plugin(self, plugin: IndexedPluginDbModel, update_available: bool, tc: AbstractCommunication):
+        self._save_plugin_update_available(plugin, update_available, tc)
         tc.message(f"Checked for updates: Plugin {plugin.source}")
 
     def update_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        self.update_plugin_files(plugin, tc)
+        self.save_updated_plugin(plugin, tc)
+
+    def update_plugin_files(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         assert plugin.state == PluginState.INSTALLED
         tc.message(f"Updating: Plugin {plugin.source}")
         cache_location, install_location = self.get_locations(plugin)
-        self._get_workflow(plugin).update_plugin(plugin.source, cache_location, install_location)
+        with self.timings.span('plugin.update'):
+            self._get_workflow(plugin).update_plugin(plugin.source, cache_location, install_location, tc)
+
+    def save_updated_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         # Clear update available flag after updating
         self._save_plugin_update_available(plugin, False, tc)
         tc.message(f"Updated: Plugin {plugin.source}")
 
+    def pin_plugin(self, plugin: IndexedPluginDbModel, content_hash: str, tc: AbstractCommunication):
+        """
+        Makes the cached plugin have the content hash, see get_content_hash. An installed plugin is installed again
+        from the cache.
+
+        @raise PluginContentHashMismatch
+        """
+        assert plugin.state in [PluginState.CACHED, PluginState.INSTALLED]
+        tc.message(f"Pinning: Plugin {plugin.source} to {content_hash}")
+        cache_location, install_location = self.get_locations(plugin)
+        workflow = self._get_workflow(plugin)
+        with self.timings.span('plugin.pin'):
+            workflow.pin_plugin(plugin.source, cache_location, content_hash, tc)
+            if plugin.state == PluginState.INSTALLED:
+                workflow.install_plugin(cache_location, install_location)
+        tc.message(f"Pinned: Plugin {plugin.source} to {content_hash}")
+
     def uninstall_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        self.uninstall_plugin_files(plugin, tc)
+        self.save_uninstalled_plugin(plugin, tc)
+
+    def uninstall_plugin_files(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         assert plugin.state == PluginState.INSTALLED
         tc.message(f"Uninstalling: Plugin {plugin.source}")
         cache_location, install_location = self.get_locations(plugin)
-        self._get_workflow(plugin).uninstall_plugin(install_location)
+        with self.timings.span('plugin.uninstall'):
+            self._get_workflow(plugin).uninstall_plugin(install_location)
+
+    def save_uninstalled_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         self._save_plugin_state(plugin, PluginState.CACHED, tc)
-        tc.message(f"Uninstalled: Plugin {plugin.source} from {install_location}")
+        tc.message(f"Uninstalled: Plugin {plugin.source}")
 
     def delete_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+        self.delete_plugin_files(plugin, tc)
+        self.save_deleted_plugin(plugin, tc)
+
+    def delete_plugin_files(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         assert plugin.state == PluginState.CACHED
         tc.message(f"Deleting: Plugin {plugin.source} from cache")
         cache_location, install_location = self.get_locations(plugin)
-        self._get_workflow(plugin).delete_plugin(cache_location)
+        with self.timings.span('plugin.delete'):
+            self._get_workflow(plugin).delete_plugin(cache_location)
+
+    def save_deleted_plugin(self, plugin: IndexedPluginDbModel, tc: AbstractCommunication):
         self._save_plugin_state(plugin, PluginState.INDEXED, tc)
         tc.message(f"Deleted: Plugin {plugin.source} from cache")
@@ -1,43 +1,84 @@
 import os
 from hashlib import md5
+from typing import BinaryIO, TYPE_CHECKING
 
-import requests
-
+from naevpm.core.abstract_thread_communication import AbstractCommunication
 from naevpm.core.plugin_workflows.local_zip_plugin_workflow import LocalZipPluginWorkflow
+from naevpm.core.progress import ProgressReporter
+
+if TYPE_CHECKING:
+    import aiohttp
 
 
 class RemoteZipPluginWorkflow(LocalZipPluginWorkflow):
+    CHUNK_SIZE = 1024 * 16
 
-    def _fetch_plugin(self, source: str, cache_location: str):
-        response = requests.get(source, stream=True)
-        response.raise_for_status()
+    def _open_cache_file(self, cache_location: str) -> BinaryIO:
         # Make sure it is a new inode by deleting an existing file first
         if os.path.exists(cache_location):
             os.remove(cache_location)
-        with open(cache_location, 'wb') as fd:
-            for chunk in response.iter_content(chunk_size=1024*16):
+        return open(cache_location, 'wb')
+
+    def _fetch_plugin(self, source: str, cache_location: str, tc: AbstractCommunication):
+        # Importing requests takes long. Only import it when needed.
+        import requests
+        response = requests.get(source, stream=True)
+        response.raise_for_status()
+        # Unknown without Content-Length, e.g. for chunked transfers
+        content_length = response.headers.get('Content-Length', None)
+        total = int(content_length) if isinstance(content_length, str) and content_length.isdigit() else None
+        progress_reporter = ProgressReporter(tc, source, 'B', total)
+        received_bytes = 0
+        with self._open_cache_file(cache_location) as fd:
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
                 fd.write(chunk)
+                received_bytes += len(chunk)
+                progress_reporter.update(received_bytes, received_bytes=received_bytes)
+        progress_reporter.finish()
 
-    def fetch_plugin(self, source: str, cache_location: str):
-        self._fetch_plugin(source, cache_location)
+    async def fetch_plugin_async(self, session: 'aiohttp.ClientSession', source: str, cache_location: str,
+                                 tc: AbstractCommunication) -> int:
+        """
+        Downloads like fetch_plugin, but without blocking a thread while waiting for the network.
 
-    def check_plugin(self, source: str, cache_location: str, install_location: str) -> bool:
-        if not os.path.exists(install_location):
-            return True
-        self._fetch_plugin(source, cache_location)
+        @return: Received bytes
+        """
+        async with session.get(source) as response:
+            response.raise_for_status()
+            progress_reporter = ProgressReporter(tc, source, 'B', response.content_length)
+            received_bytes = 0
+            with self._open_cache_file(cache_location) as fd:
+                async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                    fd.write(chunk)
+                    received_bytes += len(chunk)
+                    progress_reporter.update(received_bytes, received_bytes=received_bytes)
+            progress_reporter.finish()
+        return received_bytes
+
+    def is_cache_different(self, cache_location: str, install_location: str) -> bool:
         with open(cache_location, 'rb') as f:
             cached_hash = md5(f.read()).hexdigest()
         with open(install_location, 'rb') as f:
             installed_hash = md5(f.read()).hexdigest()
         return cached_hash != installed_hash
 
-    def update_plugin(self, source: str, cache_location: str, install_location: str):
+    def fetch_plugin(self, source: str, cache_location: str, tc: AbstractCommunication):
+        self._fetch_plugin(source, cache_location, tc)
+
+    def check_plugin(self, source: str, cache_location: str, install_location: str,
+                     tc: AbstractCommunication) -> bool:
+        if not os.path.exists(install_location):
+            return True
+        self._fetch_plugin(source, cache_location, tc)
+        return self.is_cache_different(cache_location, install_location)
+
+    def update_plugin(self, source: str, cache_location: str, install_location: str, tc: AbstractCommunication):
         install_exists = os.path.exists(install_location)
         if os.path.exists(cache_location):
             if install_exists and os.path.samefile(cache_location, install_location):
                 return
         else:
-            self._fetch_plugin(source, cache_location)
+            self._fetch_plugin(source, cache_location, tc)
         if install_exists:
             os.remove(install_location)
         os.link(cache_location, install_location)
@@ -0,0 +1,120 @@
+import time
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Only needed for type hints. Importing it at runtime would be an import cycle.
+    from naevpm.core.abstract_thread_communication import AbstractCommunication
+
+
+class Progress:
+    """
+    Progress of one transfer or job, e.g. a git fetch, a download or a batch of plugins.
+    """
+    label: str
+    # Done units of the transfer or job, e.g. indexed git objects, downloaded bytes or handled plugins
+    done: int
+    # None if unknown, e.g. a download without Content-Length
+    total: Optional[int]
+    unit: str
+    # Bytes received over the network so far if known
+    received_bytes: Optional[int]
+    # Done units per second since the start
+    rate: Optional[float]
+    # Estimated seconds until the end
+    eta: Optional[float]
+    # Last report of the transfer or job
+    finished: bool
+
+    def __init__(self, label: str, done: int, total: Optional[int], unit: str,
+                 received_bytes: Optional[int] = None,
+                 rate: Optional[float] = None,
+                 eta: Optional[float] = None,
+                 finished: bool = False):
+        super().__init__()
+        self.label = label
+        self.done = done
+        self.total = total
+        self.unit = unit
+        self.received_bytes = received_bytes
+        self.rate = rate
+        self.eta = eta
+        self.finished = finished
+
+
+class ProgressReporter:
+    """
+    Reports the progress of one transfer or job to a communication object and computes rate and ETA.
+
+    Reports are rate limited at the source: updates within the minimum interval of the last report are dropped, so
+    callbacks which fire for every received chunk or object do not flood the GUI or the terminal. Reaching the total
+    and finishing are always reported.
+    """
+    MIN_INTERVAL = 0.1
+
+    _tc: 'AbstractCommunication'
+    _label: str
+    _unit: str
+    _total: Optional[int]
+    _done: int
+    _received_bytes: Optional[int]
+    _min_interval: float
+    _start_time: float
+    _last_report_time: Optional[float]
+
+    def __init__(self, tc: 'AbstractCommunication', label: str, unit: str, total: Optional[int] = None,
+                 min_interval: float = MIN_INTERVAL):
+        """
+        @param min_interval: Minimum seconds between two reports. 0 reports every update.
+        """
+        super().__init__()
+        self._tc = tc
+        self._label = label
+        self._unit = unit
+        self._total = total
+        self._done = 0
+        self._received_bytes = None
+        self._min_interval = min_interval
+        self._start_time = time.monotonic()
+        self._last_report_time = None
+
+    def update(self, done: int, total: Optional[int] = None, received_bytes: Optional[int] = None):
+        """
+        @param total: Only needed if the total was not known when creating the reporter.
+        """
+        if total is not None:
+            self._total = total
+        self._done = done
+        if received_bytes is not None:
+            self._received_bytes = received_bytes
+        now = time.monotonic()
+        total_reached = self._total is not None and done >= self._total
+        if self._last_report_time is not None and now - self._last_report_time < self._min_interval \
+                and not total_reached:
+            return
+        self._report(now, False)
+
+    def finish(self):
+        self._report(time.monotonic(), True)
+
+    @property
+    def transferred_bytes(self) -> Optional[int]:
+        """
+        @return: Bytes received so far or None if unknown
+        """
+        if self._received_bytes is not None:
+            return self._received_bytes
+        if self._unit == 'B':
+            return self._done
+        return None
+
+    def _report(self, now: float, finished: bool):
+        self._last_report_time = now
+        elapsed = now - self._start_time
+        rate = None
+        eta = None
+        if elapsed > 0 and self._done > 0:
+            rate = self._done / elapsed
+            if self._total is not None:
+                eta = max(0.0, (self._total - self._done) / rate)
+        self._tc.progress(Progress(self._label, self._done, self._total, self._unit, self._received_bytes, rate, eta,
+                                   finished))
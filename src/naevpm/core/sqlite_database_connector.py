@@ -1,14 +1,22 @@
+import copy
+import functools
 import json
 import logging
+import os
+import pathlib
 import sqlite3
 from datetime import datetime, timezone
 from sqlite3 import Connection, IntegrityError, Cursor
-from typing import Optional
+from contextlib import contextmanager
+from threading import RLock
+from typing import Optional, Callable, TypeVar, Iterator, Iterable
 
 from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel, RegistryPluginMetaDataModel, registry_fields, \
     indexed_plugin_fields, \
     PluginState, PluginMetadataDbModel, plugin_metadata_fields
 
+T = TypeVar('T')
+
 logger = logging.getLogger(__name__)
 if sqlite3.threadsafety != 3:
     logger.critical("The underlying SQLite library your python version is using is not in the 'Serialized' mode which "
@@ -25,6 +33,31 @@ class RegistrySourceUniqueConstraintViolation(Exception):
     pass
 
 
+class IndexSnapshotVersionNotSupported(Exception):
+    pass
+
+
+class IndexChanges:
+    """
+    Changes of the tables of the plugin index by one transaction, passed to the commit listeners.
+    """
+    # Plugins whose row was updated in place
+    plugin_sources: set[str]
+    # Rows of the registry table changed
+    registries: bool
+    # Rows were inserted or deleted, or the changes are not known in detail. The whole index must be read again.
+    reload: bool
+
+    def __init__(self):
+        super().__init__()
+        self.plugin_sources = set()
+        self.registries = False
+        self.reload = False
+
+    def is_empty(self) -> bool:
+        return len(self.plugin_sources) == 0 and not self.registries and not self.reload
+
+
 def dict_factory(cursor: Cursor, row):
     fields = [column[0] for column in cursor.description]
     return {key: value for key, value in zip(fields, row)}
@@ -48,6 +81,34 @@ def plugin_metadata_factory(cursor: Cursor, row):
     return PluginMetadataDbModel(**obj)
 
 
+def unit_of_work(fn):
+    """
+    Decorator for write methods of the connector. The write joins the transaction that is currently open or runs in
+    a transaction of its own which commits when the method returns.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(self: 'SqliteDatabaseConnector', *args, **kwargs):
+        with self.transaction():
+            return fn(self, *args, **kwargs)
+
+    return wrapper
+
+
+def bookkeeping_unit_of_work(fn):
+    """
+    Like unit_of_work for writes of tables which are not part of the plugin index, e.g. caches and metrics. They
+    record no IndexChanges, so a transaction which only contains such writes does not call the commit listeners.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(self: 'SqliteDatabaseConnector', *args, **kwargs):
+        with self.transaction(notify_listeners=False):
+            return fn(self, *args, **kwargs)
+
+    return wrapper
+
+
 def registry_factory(cursor: Cursor, row):
     obj = dict_factory(cursor, row)
     # Make sure datetime strings are converted into objects
@@ -87,61 +148,348 @@ class SqliteDatabaseConnector:
             source text primary key,
             blacklist JSON,
             total_conversion bool,
-            whitelist JSON
-    )
+            whitelist JSON,
+            content_hash text
+    );
+    CREATE TABLE IF NOT EXISTS plugin_metadata_missing (
+            source text primary key,
+            -- Content of the cached plugin which has no readable plugin.xml
+            content_hash text
+    );
+    CREATE TABLE IF NOT EXISTS file_digest (
+            path text primary key,
+            size integer,
+            mtime_ns integer,
+            inode integer,
+            digest text
+    );
+    CREATE TABLE IF NOT EXISTS metric_event (
+            name text,
+            -- Unix time in seconds
+            time integer,
+            -- Seconds. Null for measurements without duration, e.g. the DB size.
+            duration real,
+            bytes integer,
+            items integer
+    );
+    CREATE INDEX IF NOT EXISTS metric_event_time ON metric_event(time);
+    CREATE TABLE IF NOT EXISTS metric_rollup (
+            name text,
+            -- ISO date in UTC
+            day text,
+            count integer,
+            total_duration real,
+            max_duration real,
+            bytes integer,
+            items integer,
+            -- Number of durations per bucket of metrics.DURATION_BUCKETS
+            histogram JSON,
+            PRIMARY KEY (name, day)
+    );
     """
+    # Columns added to tables after they were first released. Databases created by older versions get them added.
+    ADDED_COLUMNS = {
+        'plugin_metadata': [('content_hash', 'text')],
+        # Commit of the registry repository the indexed plugins were read from
+        'registry': [('commit_oid', 'text')],
+    }
+
+    # Version of the file format written by export_index_snapshot. Increase it on incompatible changes.
+    INDEX_SNAPSHOT_VERSION = 1
+    INDEX_SNAPSHOT_TABLES = ['registry', 'indexed_plugin', 'plugin_metadata']
     db: Connection
 
-    def __init__(self, path: str):
+    # SQL of the read statements, built once per connector. Reusing the identical SQL string lets the sqlite3 module
+    # hit its per-connection cache of compiled statements instead of preparing the statement again.
+    _statements: dict[str, str]
+
+    # Read-through caches for single-row lookups by source. Invalidated by the write methods of this class.
+    _registry_cache: dict[str, RegistryDbModel]
+    _plugin_cache: dict[str, IndexedPluginDbModel]
+    _plugin_metadata_cache: dict[str, PluginMetadataDbModel]
+    _cache_lock: RLock
+
+    # Serializes transactions between threads. All threads share one connection and therefore one transaction.
+    _transaction_lock: RLock
+    _transaction_depth: int
+    # Changes of the index by the open transaction
+    _index_changes: IndexChanges
+    # Called after every commit of a transaction which changed the index
+    _commit_listeners: list[Callable[[IndexChanges], None]]
+
+    def __init__(self, path: str, create: bool = True):
+        """
+        @param create: False does not create a missing DB file or its directory. The index is empty then and writes
+        are kept in memory only, e.g. for commands which only read the index.
+        """
         super().__init__()
 
-        # db file will be created if it does not exist already
+        if not create and not os.path.exists(path):
+            path = ':memory:'
+        # db file will be created if it does not exist already, but not its directory
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.isdir(directory):
+            os.makedirs(directory)
         # See header of this file for check_same_thread reasoning. Allows multi-threaded access.
         self.db = sqlite3.connect(path, check_same_thread=False)
 
         # Make sure tables exist
         self.db.executescript(self.SCHEMA)
+        self._add_missing_columns()
 
         # Enable foreign key constraints
         self.db.execute('PRAGMA foreign_keys = ON;')
         self.db.commit()
 
+        self._statements = {
+            'get_registries': f"SELECT {','.join(registry_fields)} FROM registry ORDER BY source;",
+            'get_registry': f"SELECT {','.join(registry_fields)} FROM registry WHERE source = ?;",
+            'get_plugins': f"SELECT {','.join(indexed_plugin_fields)} FROM indexed_plugin ORDER BY name, source;",
+            'get_plugin': f"SELECT {','.join(indexed_plugin_fields)} FROM indexed_plugin WHERE source = ?;",
+            'get_plugin_metadata': f"SELECT {','.join(plugin_metadata_fields)} FROM plugin_metadata "
+                                   f"WHERE source = ?;",
+        }
+        self._registry_cache = {}
+        self._plugin_cache = {}
+        self._plugin_metadata_cache = {}
+        self._cache_lock = RLock()
+        self._transaction_lock = RLock()
+        self._transaction_depth = 0
+        self._index_changes = IndexChanges()
+        self._commit_listeners = []
+
+    def add_commit_listener(self, listener: Callable[[IndexChanges], None]):
+        """
+        @param listener: Called with the changes after every commit of a transaction which changed the tables of the
+        index. Runs while the transaction lock is still held, so it must be fast.
+        """
+        self._commit_listeners.append(listener)
+
+    def _add_missing_columns(self):
+        for table, columns in self.ADDED_COLUMNS.items():
+            existing_columns = [row[1] for row in self.db.execute(f"PRAGMA table_info({table});")]
+            for column, column_type in columns:
+                if column not in existing_columns:
+                    self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type};")
+
+    @contextmanager
+    def transaction(self, notify_listeners: bool = True) -> Iterator[None]:
+        """
+        Unit of work: All writes done inside the with-block are committed once at the end of the outermost block or
+        rolled back together if an exception leaves it. Blocks can be nested and write methods join the open
+        transaction automatically.
+
+            with database_connector.transaction():
+                database_connector.set_plugin_state(...)
+                database_connector.set_plugin_update_available(...)
+
+        Writes of other threads wait until the transaction is finished.
+
+        @param notify_listeners: Only used by the outermost block. False commits without calling the commit listeners.
+        The listeners are not called either if the transaction did not change the index.
+        """
+        with self._transaction_lock:
+            self._transaction_depth += 1
+            try:
+                yield
+                if self._transaction_depth == 1:
+                    self.db.commit()
+                    changes = self._take_index_changes()
+                    # Still holding the transaction lock, so listeners see exactly this transaction's result
+                    if notify_listeners and not changes.is_empty():
+                        for listener in self._commit_listeners:
+                            listener(changes)
+            except BaseException:
+                if self._transaction_depth == 1:
+                    self.db.rollback()
+                    self._take_index_changes()
+                    # Rows read inside the transaction might have been cached
+                    self.clear_caches()
+                raise
+            finally:
+                self._transaction_depth -= 1
+
+    @contextmanager
+    def consistent_read(self) -> Iterator[bool]:
+        """
+        Holds the transaction lock, so reads inside the with-block see no uncommitted writes of other threads.
+
+        @return: True if this thread has a transaction open. Reads see its uncommitted writes.
+        """
+        with self._transaction_lock:
+            yield self._transaction_depth > 0
+
+    def _take_index_changes(self) -> IndexChanges:
+        changes = self._index_changes
+        self._index_changes = IndexChanges()
+        return changes
+
+    def _get_cached(self, cache: dict[str, T], statement: str, factory: Callable[[Cursor, tuple], T],
+                    source: str) -> Optional[T]:
+        """
+        Read-through lookup of a single row by source. Returns a deep copy so callers can modify the returned object,
+        including its lists, without changing the cached one.
+        """
+        # The lock is held during the query as well. Otherwise, a value read before a concurrent write could be put
+        # into the cache after the write already invalidated it.
+        with self._cache_lock:
+            obj = cache.get(source, None)
+            if obj is None:
+                cur = self.db.cursor()
+                cur.row_factory = factory
+                obj = cur.execute(self._statements[statement], [source]).fetchone()
+                if obj is None:
+                    return None
+                cache[source] = obj
+        return copy.deepcopy(obj)
+
+    def _invalidate(self, cache: dict[str, T], source: str):
+        with self._cache_lock:
+            cache.pop(source, None)
+
+    def clear_caches(self):
+        with self._cache_lock:
+            self._registry_cache.clear()
+            self._plugin_cache.clear()
+            self._plugin_metadata_cache.clear()
+
+    @unit_of_work
     def add_registry(self, registry: RegistryDbModel) -> None:
         try:
             self.db.execute("""INSERT INTO registry (source, last_fetched) VALUES (?,?)""", [
                 registry.source,
                 registry.last_fetched
             ])
-            self.db.commit()
+            self._invalidate(self._registry_cache, registry.source)
+            self._index_changes.registries = True
         except IntegrityError as e:
             if len(e.args) > 0:
                 if e.args[0] == 'UNIQUE constraint failed: registry.source':
                     raise RegistrySourceUniqueConstraintViolation()
             raise e
 
+    @unit_of_work
     def remove_registry(self, source: str) -> None:
         self.db.execute("DELETE FROM registry WHERE source = ?;", [source])
-        self.db.commit()
+        self._invalidate(self._registry_cache, source)
+        # Also moves plugins of the registry to the group of plugins without registry
+        self._index_changes.reload = True
+        # The foreign key of indexed plugins to the registry was set to NULL by the deletion
+        with self._cache_lock:
+            self._plugin_cache.clear()
 
     def get_registries(self) -> list[RegistryDbModel]:
         cur = self.db.cursor()
         cur.row_factory = registry_factory
-        return cur.execute(f"SELECT {','.join(registry_fields)} FROM registry ORDER BY source;").fetchall()
+        return cur.execute(self._statements['get_registries']).fetchall()
+
+    def iter_registries(self) -> Iterator[RegistryDbModel]:
+        """
+        Same as get_registries, but the rows are read from the cursor while iterating. See iter_plugins.
+        """
+        with self.consistent_read():
+            cur = self.db.cursor()
+            cur.row_factory = registry_factory
+            yield from cur.execute(self._statements['get_registries'])
 
     def get_registry(self, source: str) -> Optional[RegistryDbModel]:
-        cur = self.db.cursor()
-        cur.row_factory = registry_factory
-        return cur.execute(
-            f"SELECT {','.join(registry_fields)} FROM registry WHERE source = ?", [source]
-        ).fetchone()
+        return self._get_cached(self._registry_cache, 'get_registry', registry_factory, source)
 
+    @unit_of_work
     def set_registry_last_fetched(self, source: str, last_fetched: datetime):
         self.db.execute("""UPDATE registry SET last_fetched = ? WHERE source = ?""", [
             last_fetched.astimezone(tz=timezone.utc).isoformat(),
             source
         ])
-        self.db.commit()
+        self._invalidate(self._registry_cache, source)
+        self._index_changes.registries = True
+
+    def get_registry_commit_oid(self, source: str) -> Optional[str]:
+        row = self.db.execute("SELECT commit_oid FROM registry WHERE source = ?", [source]).fetchone()
+        if row is None:
+            return None
+        return row[0]
 
+    def get_file_digest(self, path: str, size: int, mtime_ns: int, inode: int) -> Optional[str]:
+        """
+        @return: The digest stored for the file if it still has the same size, modification time and inode
+        """
+        row = self.db.execute("SELECT digest FROM file_digest WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                              [path, size, mtime_ns, inode]).fetchone()
+        return None if row is None else row[0]
+
+    @bookkeeping_unit_of_work
+    def set_file_digests(self, file_digests: list[tuple[str, int, int, int, str]]):
+        """
+        @param file_digests: (path, size, mtime_ns, inode, digest)
+        """
+        self.db.executemany("INSERT OR REPLACE INTO file_digest (path, size, mtime_ns, inode, digest) "
+                            "VALUES (?, ?, ?, ?, ?);", file_digests)
+
+    @bookkeeping_unit_of_work
+    def add_metric_events(self, metric_events: list[tuple[str, int, Optional[float], int, int]]):
+        """
+        @param metric_events: (name, time, duration, bytes, items)
+        """
+        self.db.executemany("INSERT INTO metric_event (name, time, duration, bytes, items) VALUES (?, ?, ?, ?, ?);",
+                            metric_events)
+
+    def iter_metric_events(self, since: int, before: Optional[int] = None) \
+            -> Iterator[tuple[str, int, Optional[float], int, int]]:
+        """
+        Streams the events. Must be consumed before the next write.
+
+        @return: (name, time, duration, bytes, items) ordered by time
+        """
+        if before is None:
+            return self.db.execute("SELECT name, time, duration, bytes, items FROM metric_event WHERE time >= ? "
+                                   "ORDER BY time;", [since])
+        return self.db.execute("SELECT name, time, duration, bytes, items FROM metric_event "
+                               "WHERE time >= ? AND time < ? ORDER BY time;", [since, before])
+
+    def has_metric_event(self, name: str, since: int) -> bool:
+        return self.db.execute("SELECT 1 FROM metric_event WHERE time >= ? AND name = ? LIMIT 1;",
+                               [since, name]).fetchone() is not None
+
+    def get_metric_rollups(self, since_day: str) -> list[tuple[str, str, int, float, float, int, int, list[int]]]:
+        """
+        @return: (name, day, count, total_duration, max_duration, bytes, items, histogram)
+        """
+        rows = self.db.execute("SELECT name, day, count, total_duration, max_duration, bytes, items, histogram "
+                               "FROM metric_rollup WHERE day >= ? ORDER BY day;", [since_day]).fetchall()
+        return [(*row[:7], json.loads(row[7])) for row in rows]
+
+    @bookkeeping_unit_of_work
+    def rollup_metric_events(self, rollups: list[tuple[str, str, int, float, float, int, int, list[int]]],
+                             events_before: int, rollups_before_day: str):
+        """
+        Replaces raw events by rollups and deletes expired rollups in one transaction.
+
+        @param rollups: Rows like get_metric_rollups returns. Replace existing rows of the same name and day, so they
+        must already contain the existing counts.
+        @param events_before: Events older than this Unix time are deleted
+        @param rollups_before_day: Rollups of days before this ISO date are deleted
+        """
+        self.db.executemany("INSERT OR REPLACE INTO metric_rollup "
+                            "(name, day, count, total_duration, max_duration, bytes, items, histogram) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+                            [(*rollup[:7], json.dumps(rollup[7])) for rollup in rollups])
+        self.db.execute("DELETE FROM metric_event WHERE time < ?;", [events_before])
+        self.db.execute("DELETE FROM metric_rollup WHERE day < ?;", [rollups_before_day])
+
+    def get_database_size(self) -> int:
+        """
+        @return: Size of the DB in bytes
+        """
+        page_count = self.db.execute("PRAGMA page_count;").fetchone()[0]
+        page_size = self.db.execute("PRAGMA page_size;").fetchone()[0]
+        return page_count * page_size
+
+    @unit_of_work
+    def set_registry_commit_oid(self, source: str, commit_oid: Optional[str]):
+        self.db.execute("""UPDATE registry SET commit_oid = ? WHERE source = ?""", [commit_oid, source])
+
+    @unit_of_work
     def index_plugin(self, registry_source: str, registry_plugin_meta_data: RegistryPluginMetaDataModel):
         """
         Used to UPDATE indexed_plugin list from registry index. Overwrites only fields provided by the index.
@@ -165,6 +513,7 @@ class SqliteDatabaseConnector:
                                 PluginState.INDEXED.name
                             ]
                             )
+            self._index_changes.reload = True
         else:
             self.db.execute("""
                 UPDATE indexed_plugin SET author=?, license=?, website=?,
@@ -180,19 +529,45 @@ class SqliteDatabaseConnector:
                                 registry_plugin_meta_data.source
                             ]
                             )
-        self.db.commit()
+            self._index_changes.plugin_sources.add(registry_plugin_meta_data.source)
+        self._invalidate(self._plugin_cache, registry_plugin_meta_data.source)
 
     def get_plugins(self) -> list[IndexedPluginDbModel]:
         cur = self.db.cursor()
         cur.row_factory = indexed_plugin_factory
-        return cur.execute(f"SELECT {','.join(indexed_plugin_fields)} FROM indexed_plugin ORDER BY name, source;").fetchall()
+        return cur.execute(self._statements['get_plugins']).fetchall()
 
-    def get_plugin(self, source: str) -> Optional[IndexedPluginDbModel]:
+    def iter_plugins(self) -> Iterator[IndexedPluginDbModel]:
+        """
+        Same as get_plugins, but the rows are read from the cursor while iterating, so big indexes are never held in
+        memory as a whole.
+
+        The cursor reads from the shared connection, so the transaction lock is held until the iterator is exhausted
+        or closed and writes of other threads wait meanwhile. Consume or close it in the thread which created it, e.g.
+        with contextlib.closing.
+        """
+        with self.consistent_read():
+            cur = self.db.cursor()
+            cur.row_factory = indexed_plugin_factory
+            yield from cur.execute(self._statements['get_plugins'])
+
+    def get_plugins_by_sources(self, sources: Iterable[str]) -> list[IndexedPluginDbModel]:
+        """
+        Reads the rows without the cache of get_plugin. Missing plugins are skipped.
+        """
+        sources = list(sources)
+        plugins = []
         cur = self.db.cursor()
         cur.row_factory = indexed_plugin_factory
-        return cur.execute(
-            f"SELECT {','.join(indexed_plugin_fields)} FROM indexed_plugin WHERE source = ?", [source]
-        ).fetchone()
+        # Stay below the limit of SQL variables of older SQLite versions
+        for i in range(0, len(sources), 500):
+            chunk = sources[i:i + 500]
+            plugins.extend(cur.execute(f"SELECT {','.join(indexed_plugin_fields)} FROM indexed_plugin "
+                                       f"WHERE source IN ({','.join(['?'] * len(chunk))});", chunk).fetchall())
+        return plugins
+
+    def get_plugin(self, source: str) -> Optional[IndexedPluginDbModel]:
+        return self._get_cached(self._plugin_cache, 'get_plugin', indexed_plugin_factory, source)
 
     def exists_plugin(self, source: str) -> bool:
         return self.db.execute('SELECT EXISTS(SELECT 1 FROM indexed_plugin WHERE source=? LIMIT 1);',
@@ -202,36 +577,44 @@ class SqliteDatabaseConnector:
         return self.db.execute('SELECT EXISTS(SELECT 1 FROM registry WHERE source=? LIMIT 1);',
                                [source]).fetchone()[0]
 
+    @unit_of_work
     def remove_plugin(self, source: str) -> None:
+        row = self.db.execute("SELECT registry_source FROM indexed_plugin WHERE source = ?;", [source]).fetchone()
+        if row is not None and row[0] is not None:
+            # The index of the registry no longer matches its commit. The next fetch reads the registry again.
+            self.db.execute("UPDATE registry SET commit_oid = NULL WHERE source = ?;", [row[0]])
+            self._invalidate(self._registry_cache, row[0])
         self.db.execute("DELETE FROM indexed_plugin WHERE source = ?", [source])
-        self.db.commit()
+        self._invalidate(self._plugin_cache, source)
+        self._index_changes.reload = True
 
+    @unit_of_work
     def set_plugin_state(self, source: str, state: PluginState):
         self.db.execute("""UPDATE indexed_plugin SET state = ? WHERE source = ?""", [
             state.name,
             source
         ])
-        self.db.commit()
+        self._invalidate(self._plugin_cache, source)
+        self._index_changes.plugin_sources.add(source)
 
+    @unit_of_work
     def set_plugin_update_available(self, source: str, update_available: bool):
         self.db.execute("""UPDATE indexed_plugin SET update_available = ? WHERE source = ?""", [
             update_available,
             source
         ])
-        self.db.commit()
+        self._invalidate(self._plugin_cache, source)
+        self._index_changes.plugin_sources.add(source)
 
     def get_plugin_metadata(self, source: str) -> Optional[PluginMetadataDbModel]:
-        cur = self.db.cursor()
-        cur.row_factory = plugin_metadata_factory
-        return cur.execute(
-            f"SELECT {','.join(plugin_metadata_fields)} FROM plugin_metadata WHERE source = ?", [source]
-        ).fetchone()
+        return self._get_cached(self._plugin_metadata_cache, 'get_plugin_metadata', plugin_metadata_factory, source)
 
+    @unit_of_work
     def insert_plugin_metadata(self, plugin_meta_data: PluginMetadataDbModel):
         self.db.execute("""
             INSERT INTO plugin_metadata (name, author, version, description, compatibility, 
-                    priority, source, blacklist, total_conversion, whitelist)
-            VALUES             (?,?,?,?,?,?,?,?,?,?);
+                    priority, source, blacklist, total_conversion, whitelist, content_hash)
+            VALUES             (?,?,?,?,?,?,?,?,?,?,?);
             """,
                         [
                             plugin_meta_data.name,
@@ -243,6 +626,113 @@ class SqliteDatabaseConnector:
                             plugin_meta_data.source,
                             json.dumps(plugin_meta_data.blacklist),
                             plugin_meta_data.total_conversion,
-                            json.dumps(plugin_meta_data.whitelist)
+                            json.dumps(plugin_meta_data.whitelist),
+                            plugin_meta_data.content_hash
                         ]
                         )
+        self._invalidate(self._plugin_metadata_cache, plugin_meta_data.source)
+
+    @unit_of_work
+    def save_plugin_metadata(self, plugin_meta_data: PluginMetadataDbModel):
+        """
+        Inserts the metadata or replaces the existing metadata of the same source.
+        """
+        self.remove_plugin_metadata(plugin_meta_data.source)
+        self.insert_plugin_metadata(plugin_meta_data)
+
+    @unit_of_work
+    def remove_plugin_metadata(self, source: str):
+        self.db.execute("DELETE FROM plugin_metadata WHERE source = ?", [source])
+        self.db.execute("DELETE FROM plugin_metadata_missing WHERE source = ?", [source])
+        self._invalidate(self._plugin_metadata_cache, source)
+
+    def get_plugin_metadata_missing_hash(self, source: str) -> Optional[str]:
+        """
+        @return: The content hash of the cached plugin if its metadata could not be extracted from that content
+        """
+        row = self.db.execute("SELECT content_hash FROM plugin_metadata_missing WHERE source = ?", [source]).fetchone()
+        return None if row is None else row[0]
+
+    @bookkeeping_unit_of_work
+    def set_plugin_metadata_missing_hash(self, source: str, content_hash: str):
+        self.db.execute("INSERT OR REPLACE INTO plugin_metadata_missing (source, content_hash) VALUES (?, ?);",
+                        [source, content_hash])
+
+    def export_index_snapshot(self, path: str, overwrite: bool = False):
+        """
+        Writes the tables of the index to a new SQLite file at path by using the SQLite backup API. Local state of the
+        plugins (cached, installed, update available) is not part of the snapshot.
+
+        @param overwrite: Replace an existing file at path
+        @raise FileExistsError: If a file exists at path and overwrite is False
+        """
+        if os.path.exists(path):
+            if not overwrite:
+                raise FileExistsError(f"{path} already exists")
+            os.remove(path)
+        snapshot = sqlite3.connect(path)
+        try:
+            # Make sure no other thread is in the middle of a transaction
+            with self._transaction_lock:
+                self.db.backup(snapshot)
+            tables = [row[0] for row in snapshot.execute("SELECT name FROM sqlite_master WHERE type = 'table';")]
+            for table in tables:
+                if table not in self.INDEX_SNAPSHOT_TABLES:
+                    snapshot.execute(f"DROP TABLE {table};")
+            snapshot.execute("UPDATE indexed_plugin SET state = ?, installed = NULL, cached = NULL, "
+                             "update_available = NULL;", [PluginState.INDEXED.name])
+            snapshot.execute(f"PRAGMA user_version = {self.INDEX_SNAPSHOT_VERSION};")
+            snapshot.commit()
+            snapshot.execute("VACUUM;")
+        finally:
+            snapshot.close()
+
+    def import_index_snapshot(self, path: str):
+        """
+        Merges a snapshot written by export_index_snapshot into the index. Rows of the snapshot overwrite existing
+        rows of the same source, except for the local state of plugins and for metadata extracted locally.
+
+        Registries which are new to the index keep the commit their index was read from, so the next fetch skips reading
+        them if it is unchanged. The index of a registry merged into an existing one, or which loses plugins to another
+        registry, is not exactly the one read from its commit anymore, so its commit is cleared and the next fetch
+        reads it again.
+
+        @raise IndexSnapshotVersionNotSupported
+        """
+        # Open read-only. The snapshot file is never modified.
+        snapshot = sqlite3.connect(pathlib.Path(os.path.abspath(path)).as_uri() + '?mode=ro', uri=True)
+        try:
+            version = snapshot.execute("PRAGMA user_version;").fetchone()[0]
+            if version != self.INDEX_SNAPSHOT_VERSION:
+                raise IndexSnapshotVersionNotSupported(
+                    f"Index snapshot version {version} is not supported. Expected {self.INDEX_SNAPSHOT_VERSION}.")
+            registries = snapshot.execute("SELECT source, last_fetched, commit_oid FROM registry;").fetchall()
+            plugins = snapshot.execute("SELECT name, author, license, website, source, registry_source "
+                                       "FROM indexed_plugin;").fetchall()
+            plugin_metadatas = snapshot.execute(
+                f"SELECT {','.join(plugin_metadata_fields)} FROM plugin_metadata;").fetchall()
+        finally:
+            snapshot.close()
+
+        with self.transaction():
+            self.db.executemany("""
+                INSERT INTO registry (source, last_fetched, commit_oid) VALUES (?,?,?)
+                ON CONFLICT(source) DO UPDATE SET last_fetched=excluded.last_fetched, commit_oid=NULL;
+                """, registries)
+            # Before the plugins are moved to the registry of the snapshot
+            self.db.executemany("""
+                UPDATE registry SET commit_oid = NULL WHERE source IN (
+                    SELECT registry_source FROM indexed_plugin WHERE source = ? AND registry_source IS NOT ?);
+                """, [(plugin[4], plugin[5]) for plugin in plugins])
+            self.db.executemany(f"""
+                INSERT INTO indexed_plugin (name, author, license, website, source, registry_source, state)
+                VALUES (?,?,?,?,?,?,'{PluginState.INDEXED.name}')
+                ON CONFLICT(source) DO UPDATE SET name=excluded.name, author=excluded.author,
+                    license=excluded.license, website=excluded.website, registry_source=excluded.registry_source;
+                """, plugins)
+            self.db.executemany(f"""
+                INSERT OR IGNORE INTO plugin_metadata ({','.join(plugin_metadata_fields)})
+                VALUES ({','.join(['?'] * len(plugin_metadata_fields))});
+                """, plugin_metadatas)
+            self.clear_caches()
+            self._index_changes.reload = True
@@ -0,0 +1,113 @@
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor, Future
+from enum import Enum, IntEnum
+from threading import Lock
+from typing import Callable, Any
+
+
+class TaskKind(Enum):
+    # Waits mostly for remote hosts, e.g. git fetches and downloads
+    NETWORK = 0
+    # Works mostly on the local file system and the database
+    DISK = 1
+
+
+class TaskPriority(IntEnum):
+    # Lower values run first
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class _Lane:
+    """
+    Bounded thread pool for one kind of task. Tasks wait in a priority queue and are only handed to the executor when
+    a worker is free, so the queue and not the executor decides the order.
+    """
+    executor: ThreadPoolExecutor
+    max_workers: int
+    running: int
+    # Heap of (priority, sequence number, fn, future). The sequence number keeps tasks of equal priority in order.
+    queued: list[tuple[int, int, Callable[[], Any], Future]]
+
+    def __init__(self, kind: TaskKind, max_workers: int):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'naevpm-{kind.name.lower()}')
+        self.max_workers = max_workers
+        self.running = 0
+        self.queued = []
+
+
+class TaskScheduler:
+    """
+    Runs tasks on a bounded thread pool per task kind, so network-bound tasks do not block disk-bound tasks and
+    vice versa. Queued interactive tasks run before queued background tasks.
+    """
+    _lanes: dict[TaskKind, _Lane]
+    _lock: Lock
+    _sequence: itertools.count
+
+    def __init__(self, network_workers: int, disk_workers: int):
+        super().__init__()
+        self._lanes = {
+            TaskKind.NETWORK: _Lane(TaskKind.NETWORK, network_workers),
+            TaskKind.DISK: _Lane(TaskKind.DISK, disk_workers),
+        }
+        self._lock = Lock()
+        self._sequence = itertools.count()
+
+    def submit(self, fn: Callable[[], Any], kind: TaskKind = TaskKind.DISK,
+               priority: TaskPriority = TaskPriority.BACKGROUND) -> Future:
+        """
+        @return: Future of the task. Cancelling it removes the task from the queue if it has not started yet.
+        """
+        future = Future()
+        lane = self._lanes[kind]
+        with self._lock:
+            heapq.heappush(lane.queued, (priority, next(self._sequence), fn, future))
+            self._dispatch(lane)
+        return future
+
+    def _dispatch(self, lane: _Lane):
+        # Must be called with the lock held
+        while lane.running < lane.max_workers and len(lane.queued) > 0:
+            priority, sequence, fn, future = heapq.heappop(lane.queued)
+            # Skips cancelled tasks
+            if future.set_running_or_notify_cancel():
+                lane.running += 1
+                lane.executor.submit(self._run, lane, fn, future)
+
+    def _run(self, lane: _Lane, fn: Callable[[], Any], future: Future):
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                lane.running -= 1
+                self._dispatch(lane)
+
+    def cancel_queued(self) -> int:
+        """
+        Cancels all tasks which have not started yet.
+
+        @return: Number of cancelled tasks
+        """
+        cancelled = 0
+        with self._lock:
+            for lane in self._lanes.values():
+                for priority, sequence, fn, future in lane.queued:
+                    if future.cancel():
+                        cancelled += 1
+                lane.queued = []
+        return cancelled
+
+    def shutdown(self, wait: bool = False):
+        """
+        Cancels all queued tasks. Running tasks are not interrupted.
+        """
+        self.cancel_queued()
+        for lane in self._lanes.values():
+            lane.executor.shutdown(wait=wait)
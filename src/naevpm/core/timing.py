@@ -0,0 +1,155 @@
+import time
+from threading import Lock
+from typing import Optional, Callable
+
+
+class SpanStats:
+    """
+    Aggregated measurements of all spans with the same name.
+    """
+    name: str
+    count: int
+    total_seconds: float
+    max_seconds: float
+    # Bytes transferred or read by the spans
+    bytes: int
+    # Items handled by the spans, e.g. plugin metadata files or rows
+    items: int
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.items = 0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.count if self.count > 0 else 0.0
+
+
+class Span:
+    """
+    Measures one run of a step. Use as context manager, see Timings.span.
+    """
+    name: str
+    bytes: int
+    items: int
+    _timings: Optional['Timings']
+    _start_time: float
+
+    def __init__(self, timings: Optional['Timings'], name: str):
+        super().__init__()
+        self._timings = timings
+        self.name = name
+        self.bytes = 0
+        self.items = 0
+        self._start_time = 0.0
+
+    def add_bytes(self, count: Optional[int]):
+        if count is not None:
+            self.bytes += count
+
+    def add_items(self, count: int):
+        self.items += count
+
+    def __enter__(self) -> 'Span':
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._timings.record(self, time.perf_counter() - self._start_time)
+
+
+class _DisabledSpan(Span):
+    """
+    Shared by all spans while timings are disabled. Measures and records nothing.
+    """
+
+    def __init__(self):
+        super().__init__(None, 'disabled')
+
+    def add_bytes(self, count: Optional[int]):
+        pass
+
+    def add_items(self, count: int):
+        pass
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_DISABLED_SPAN = _DisabledSpan()
+
+
+class Timings:
+    """
+    Records the duration, bytes and item counts of the steps of the application logic, aggregated by step name:
+
+        with timings.span('registry.read') as span:
+            plugin_metadatas = read()
+            span.add_items(len(plugin_metadatas))
+
+    Spans may be nested and run in any thread. While disabled, span returns a shared object which does nothing, so
+    instrumented code only pays for one attribute check.
+    """
+    enabled: bool
+    # By span name
+    _stats: dict[str, SpanStats]
+    _lock: Lock
+    # Called with every finished span and its duration in seconds, in the thread which ran the span
+    _listeners: list[Callable[[Span, float], None]]
+
+    def __init__(self, enabled: bool = False):
+        super().__init__()
+        self.enabled = enabled
+        self._stats = {}
+        self._lock = Lock()
+        self._listeners = []
+
+    def add_listener(self, listener: Callable[[Span, float], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Span, float], None]):
+        self._listeners.remove(listener)
+
+    def span(self, name: str) -> Span:
+        if not self.enabled:
+            return _DISABLED_SPAN
+        return Span(self, name)
+
+    def record(self, span: Span, seconds: float):
+        with self._lock:
+            stats = self._stats.get(span.name, None)
+            if stats is None:
+                stats = SpanStats(span.name)
+                self._stats[span.name] = stats
+            stats.count += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.bytes += span.bytes
+            stats.items += span.items
+        for listener in self._listeners:
+            listener(span, seconds)
+
+    def get_stats(self) -> list[SpanStats]:
+        """
+        @return: Copies of the stats, the slowest steps in total first
+        """
+        with self._lock:
+            stats = []
+            for s in self._stats.values():
+                copy = SpanStats(s.name)
+                copy.__dict__.update(s.__dict__)
+                stats.append(copy)
+        stats.sort(key=lambda s: s.total_seconds, reverse=True)
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,459 @@
+"""
+Optional long-running naevpm process. It keeps one application logic with its DB connection, caches and worker pools
+and runs the commands of naevpm clients sent over a Unix domain socket. Clients skip importing pygit2 and lxml and
+opening the DB, so repeated commands return quickly, and the CLI does not compete with the GUI for the DB locks while
+the GUI serves the commands.
+
+Protocol: The client sends one request and the daemon answers with any number of messages. Both are JSON objects, one
+per line.
+
+    {"args": ["plugin", "list"], "cwd": "/home/player", "stdout_isatty": false, "stderr_isatty": true}
+    {"stdout": "..."} or {"stderr": "..."}
+    {"exit": 0}
+
+Instead of args, a request may contain "control": "status" or "stop".
+
+Besides this module, the client only imports naevpm.core.config to find the daemon of its config, and with it appdirs
+and the standard library, so clients start fast.
+"""
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from typing import Optional, Callable, TextIO, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from naevpm.core.application_logic import ApplicationLogic
+    from naevpm.core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Commands which always run in the calling process
+LOCAL_COMMANDS = ['daemon']
+# Options of the root command which are followed by a value
+ROOT_OPTIONS_WITH_VALUE = ['--profile', '--config', '--naevpm-root', '--naev-root']
+
+
+class DaemonAlreadyRunning(Exception):
+    pass
+
+
+class DaemonNotSupported(Exception):
+    pass
+
+
+def is_supported() -> bool:
+    # Unix domain sockets are missing on some platforms, e.g. older Windows versions
+    return hasattr(socket, 'AF_UNIX')
+
+
+def parse_root_options(args: list[str]) -> tuple[dict[str, str], Optional[str]]:
+    """
+    @param args: Arguments of naevpm
+    @return: Values of the root options in ROOT_OPTIONS_WITH_VALUE by option, and the name of the command or None if
+    the arguments are only options
+    """
+    options = {}
+    option_with_value = None
+    for arg in args:
+        if option_with_value is not None:
+            options[option_with_value] = arg
+            option_with_value = None
+        elif arg in ROOT_OPTIONS_WITH_VALUE:
+            option_with_value = arg
+        elif arg.split('=', 1)[0] in ROOT_OPTIONS_WITH_VALUE:
+            option, value = arg.split('=', 1)
+            options[option] = value
+        elif not arg.startswith('-'):
+            return options, arg
+    return options, None
+
+
+def get_command_name(args: list[str]) -> Optional[str]:
+    """
+    @param args: Arguments of naevpm
+    @return: The name of the command or None if the arguments are only options
+    """
+    return parse_root_options(args)[1]
+
+
+def load_config(args: list[str]) -> 'Config':
+    """
+    Loads the config the same way the CLI does with the arguments, to find the daemon serving it.
+
+    @raise ConfigInvalid
+    """
+    from naevpm.core.config import Config
+    options = parse_root_options(args)[0]
+    return Config.load({'naevpm_root': options.get('--naevpm-root', None),
+                        'naev_root': options.get('--naev-root', None)},
+                       options.get('--config', None))
+
+
+def _get_roots(config: 'Config') -> list[str]:
+    # Compared by the daemon with its own config
+    return [os.path.abspath(config.PM_ROOT), os.path.abspath(config.NAEV_ROOT)]
+
+
+class _Connection:
+    _socket: socket.socket
+    _reader: io.BufferedReader
+
+    def __init__(self, sock: socket.socket):
+        super().__init__()
+        self._socket = sock
+        self._reader = sock.makefile('rb')
+
+    def send(self, message: dict[str, Any]):
+        self._socket.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+    def receive(self) -> Optional[dict[str, Any]]:
+        """
+        @return: None if the other side closed the connection
+        """
+        line = self._reader.readline()
+        if line == b'':
+            return None
+        return json.loads(line)
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+
+def _connect(socket_path: str) -> Optional[_Connection]:
+    """
+    @return: None if no daemon is running
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        # Not found or refused because the socket was left behind by a daemon which was killed
+        sock.close()
+        return None
+    return _Connection(sock)
+
+
+def run_in_daemon(args: list[str], config: 'Config') -> Optional[int]:
+    """
+    Runs the command in the daemon of the config and writes its output to stdout and stderr of this process.
+
+    @return: Exit code of the command or None if no daemon is running or it serves another config
+    """
+    connection = _connect(config.DAEMON_SOCKET)
+    if connection is None:
+        return None
+    try:
+        connection.send({'args': args, 'cwd': os.getcwd(), 'roots': _get_roots(config),
+                         'stdout_isatty': sys.stdout.isatty(), 'stderr_isatty': sys.stderr.isatty()})
+        while True:
+            message = connection.receive()
+            if message is None:
+                sys.stderr.write('The naevpm daemon closed the connection before the command ended.\n')
+                return 1
+            if 'stdout' in message:
+                sys.stdout.write(message['stdout'])
+                sys.stdout.flush()
+            elif 'stderr' in message:
+                sys.stderr.write(message['stderr'])
+                sys.stderr.flush()
+            elif 'exit' in message:
+                return message['exit']
+            elif 'refused' in message:
+                logger.debug(f"The naevpm daemon refused the command: {message['refused']}")
+                return None
+    except KeyboardInterrupt:
+        # The daemon finishes the command, but its output is discarded
+        return 130
+    finally:
+        connection.close()
+
+
+def send_control(socket_path: str, control: str) -> Optional[dict[str, Any]]:
+    """
+    @param control: status or stop
+    @return: The reply of the daemon or None if no daemon is running
+    """
+    connection = _connect(socket_path)
+    if connection is None:
+        return None
+    try:
+        connection.send({'control': control})
+        return connection.receive()
+    finally:
+        connection.close()
+
+
+class _ClientStream(io.TextIOBase):
+    """
+    stdout or stderr of a command served by the daemon. Writes are sent to the client of the command. They are
+    buffered until flushed or the buffer is full.
+    """
+    BUFFER_SIZE = 64 * 1024
+
+    _name: str
+    _connection: _Connection
+    _isatty: bool
+    # The client of the request disconnected. Its output is discarded.
+    _disconnected: bool
+    _buffer: list[str]
+    _buffer_size: int
+    # Commands may write from worker threads
+    _lock: threading.RLock
+
+    def __init__(self, name: str, connection: _Connection, isatty: bool):
+        """
+        @param name: stdout or stderr, as in the messages of the protocol
+        @param isatty: The stream of the client is a terminal
+        """
+        super().__init__()
+        self._name = name
+        self._connection = connection
+        self._isatty = isatty
+        self._disconnected = False
+        self._buffer = []
+        self._buffer_size = 0
+        self._lock = threading.RLock()
+
+    @property
+    def encoding(self) -> str:
+        return 'utf-8'
+
+    @property
+    def errors(self) -> str:
+        return 'strict'
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return self._isatty
+
+    def write(self, s: str) -> int:
+        if not isinstance(s, str):
+            raise TypeError(f'write() argument must be str, not {type(s).__name__}')
+        with self._lock:
+            if self._disconnected:
+                return len(s)
+            self._buffer.append(s)
+            self._buffer_size += len(s)
+            if self._buffer_size >= self.BUFFER_SIZE:
+                self.flush()
+        return len(s)
+
+    def flush(self):
+        with self._lock:
+            if self._buffer_size == 0 or self._disconnected:
+                return
+            data = ''.join(self._buffer)
+            self._buffer.clear()
+            self._buffer_size = 0
+            try:
+                self._connection.send({self._name: data})
+            except OSError:
+                # The client is gone, e.g. interrupted by the player. The command still finishes, so it does not stop
+                # halfway. Its output is discarded.
+                logger.debug('Client of the command disconnected')
+                self._disconnected = True
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: '_UnixServer'
+
+    def handle(self):
+        connection = _Connection(self.request)
+        try:
+            request = connection.receive()
+            if request is not None:
+                self.server.daemon_server.handle_request(request, connection)
+        except (OSError, ValueError) as e:
+            logger.debug(f'Request failed: {e}')
+
+
+class _UnixServer(socketserver.UnixStreamServer):
+    daemon_server: 'DaemonServer'
+
+
+class DaemonServer:
+    """
+    Serves the commands of naevpm clients with one application logic. Each command writes to the streams of its
+    client and resolves its path arguments against the working directory of its client, see cli.DaemonRequest. The
+    streams, log handlers and working directory of the process are left alone, so the GUI can embed the server.
+    Commands are served one at a time in the order they arrive, because they share the logger of the CLI. The
+    application logic itself may be used by other threads meanwhile, e.g. by the GUI.
+    """
+    socket_path: str
+    requests_served: int
+    start_time: float
+    _logic: 'ApplicationLogic'
+    # Called in the thread of the server after each command
+    _on_command_done: Optional[Callable[[], None]]
+    _server: Optional[_UnixServer]
+    _thread: Optional[threading.Thread]
+    _stopped: threading.Event
+    _stop_lock: threading.Lock
+
+    def __init__(self, logic: 'ApplicationLogic', socket_path: str,
+                 on_command_done: Optional[Callable[[], None]] = None):
+        super().__init__()
+        self._logic = logic
+        self.socket_path = socket_path
+        self._on_command_done = on_command_done
+        self.requests_served = 0
+        self.start_time = 0.0
+        self._server = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._stop_lock = threading.Lock()
+
+    def start(self):
+        """
+        Listens on the socket and serves in a background thread.
+        """
+        if not is_supported():
+            raise DaemonNotSupported('Unix domain sockets are not supported on this platform')
+        if os.path.exists(self.socket_path):
+            if send_control(self.socket_path, 'status') is not None:
+                raise DaemonAlreadyRunning(f'A naevpm daemon is already serving on {self.socket_path}')
+            # Left behind by a daemon which was killed
+            os.remove(self.socket_path)
+        # Only the user may connect
+        umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(self.socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        self._server.daemon_server = self
+        self.start_time = time.time()
+        self._thread = threading.Thread(target=self._server.serve_forever, name='naevpm-daemon', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Waits for the current command to end. Not to be called by a command.
+        """
+        with self._stop_lock:
+            if self._server is None:
+                return
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self._stopped.set()
+
+    def wait(self):
+        """
+        Blocks until the daemon is stopped, e.g. by naevpm daemon stop. Ctrl+C and SIGTERM stop it too, if called in
+        the main thread.
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            # With a timeout, so signals are handled while waiting
+            while not self._stopped.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+
+    def handle_request(self, request: dict[str, Any], connection: _Connection):
+        control = request.get('control', None)
+        if control == 'status':
+            connection.send({'pid': os.getpid(), 'start_time': self.start_time,
+                             'requests_served': self.requests_served})
+        elif control == 'stop':
+            connection.send({'stopping': True})
+            # shutdown waits for this request to end
+            threading.Thread(target=self.stop, name='naevpm-daemon-stop').start()
+        elif 'roots' in request and request['roots'] != _get_roots(self._logic.config):
+            # E.g. --naev-root points to another Naev installation
+            connection.send({'refused': 'The daemon serves other directories'})
+        else:
+            stdout = _ClientStream('stdout', connection, request.get('stdout_isatty', False))
+            stderr = _ClientStream('stderr', connection, request.get('stderr_isatty', False))
+            try:
+                exit_code = self._run_command(request['args'], request['cwd'], stdout, stderr)
+            finally:
+                stdout.flush()
+                stderr.flush()
+                self.requests_served += 1
+                if self._on_command_done is not None:
+                    self._on_command_done()
+            connection.send({'exit': exit_code})
+
+    def _run_command(self, args: list[str], cwd: str, stdout: TextIO, stderr: TextIO) -> int:
+        import click
+        from naevpm import cli
+        if get_command_name(args) in LOCAL_COMMANDS:
+            print(f'{get_command_name(args)} commands cannot run in the daemon', file=stderr)
+            return 2
+        # The log messages of the command go to its client and not to the handlers of the process
+        log_handler = logging.StreamHandler(stderr)
+        log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        log_level = cli.logger.level
+        log_propagate = cli.logger.propagate
+        cli.logger.addHandler(log_handler)
+        cli.logger.propagate = False
+        # Same as in the process of the CLI, regardless of the level of the root logger of the daemon or the GUI
+        cli.logger.setLevel(logging.INFO)
+        try:
+            # Not standalone, so click does not print errors to stderr of the process or exit it
+            request = cli.DaemonRequest(self._logic, cwd, stdout, stderr)
+            exit_code = cli.root.main(args, prog_name='naevpm', obj=request, standalone_mode=False)
+            return exit_code if isinstance(exit_code, int) else 0
+        except click.ClickException as e:
+            e.show(file=stderr)
+            return e.exit_code
+        except click.Abort:
+            print('Aborted!', file=stderr)
+            return 1
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            print(e.code, file=stderr)
+            return 1
+        except Exception:
+            # Same as an uncaught exception of the CLI process
+            traceback.print_exc(file=stderr)
+            return 1
+        finally:
+            # Options like --verbose only apply to one command
+            cli.logger.setLevel(log_level)
+            cli.logger.propagate = log_propagate
+            cli.logger.removeHandler(log_handler)
+
+
+def main():
+    """
+    Entry point of naevpm. Runs the command in the daemon if one is running, else in this process.
+    """
+    args = sys.argv[1:]
+    # click prints the help to stdout of the process
+    if is_supported() and get_command_name(args) not in LOCAL_COMMANDS and '--help' not in args:
+        from naevpm.core.config import ConfigInvalid
+        try:
+            config = load_config(args)
+        except ConfigInvalid:
+            # The CLI reports the error
+            config = None
+        if config is not None:
+            exit_code = run_in_daemon(args, config)
+            if exit_code is not None:
+                sys.exit(exit_code)
+    import locale
+    locale.setlocale(locale.LC_ALL, '')
+    from naevpm.cli import root
+    root(prog_name='naevpm')
+
+
+if __name__ == '__main__':
+    main()
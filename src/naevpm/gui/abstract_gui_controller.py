@@ -1,9 +1,15 @@
+import logging
+from typing import Optional, Callable
+
+from naevpm.core.application_logic import PluginBatchAction
 from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel
+from naevpm.core.progress import Progress
+from naevpm.core.task_scheduler import TaskPriority
 
 
 class AbstractGuiController:
 
-    def refresh_registries_list(self):
+    def refresh_registries_list(self, on_refreshed: Optional[Callable[[], None]] = None):
         pass
 
     def add_registry(self, source: str):
@@ -12,10 +18,17 @@ class AbstractGuiController:
     def remove_registry(self, registry: RegistryDbModel):
         pass
 
-    def fetch_registry_plugin_metadatas(self, registry: RegistryDbModel):
+    def fetch_registry_plugin_metadatas(self, registry: RegistryDbModel,
+                                        priority: TaskPriority = TaskPriority.INTERACTIVE):
+        pass
+
+    def refresh_plugins_list(self, on_refreshed: Optional[Callable[[], None]] = None):
         pass
 
-    def refresh_plugins_list(self):
+    def count_plugins(self) -> int:
+        pass
+
+    def get_plugins_page(self, offset: int, limit: int) -> list[IndexedPluginDbModel]:
         pass
 
     def install_plugin(self, plugin: IndexedPluginDbModel):
@@ -27,7 +40,7 @@ class AbstractGuiController:
     def delete_plugin(self, plugin: IndexedPluginDbModel):
         pass
 
-    def check_plugin(self, plugin: IndexedPluginDbModel):
+    def check_plugin(self, plugin: IndexedPluginDbModel, priority: TaskPriority = TaskPriority.INTERACTIVE):
         pass
 
     def update_plugin(self, plugin: IndexedPluginDbModel):
@@ -36,7 +49,13 @@ class AbstractGuiController:
     def check_for_plugin_updates(self, plugins: list[IndexedPluginDbModel]):
         pass
 
-    def show_status(self, value: str):
+    def run_plugin_batch(self, action: PluginBatchAction, plugins: list[IndexedPluginDbModel]):
+        pass
+
+    def show_status(self, value: str, level: int = logging.INFO):
+        pass
+
+    def show_task_progress(self, threaded_task, progress: Optional[Progress]):
         pass
 
     def remove_plugin(self, plugin: IndexedPluginDbModel):
@@ -45,7 +64,13 @@ class AbstractGuiController:
     def fetch_plugin(self, plugin: IndexedPluginDbModel):
         pass
 
-    def show_plugin_details(self, plugin: IndexedPluginDbModel):
+    def show_plugin_details(self, plugin: IndexedPluginDbModel, neighbours: list[IndexedPluginDbModel]):
+        pass
+
+    def cancel_plugin_details(self):
+        pass
+
+    def show_stats(self):
         pass
 
     def import_existing_plugins_to_index(self):
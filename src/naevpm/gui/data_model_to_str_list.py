@@ -1,7 +1,10 @@
 from naevpm.core import models
 from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel
+from naevpm.core.timing import SpanStats
 from naevpm.gui import display_utils
 
+span_stats_headers = ['Step', 'Count', 'Total', 'Mean', 'Max', 'Bytes', 'Items']
+
 
 def registry_to_str_list(registry: RegistryDbModel) -> list[str]:
     obj = registry.__dict__
@@ -33,3 +36,15 @@ def plugin_to_str_list(plugin: IndexedPluginDbModel) -> list[str]:
             value = ''
         row.append(value)
     return row
+
+
+def span_stats_to_str_list(stats: SpanStats) -> list[str]:
+    return [
+        stats.name,
+        str(stats.count),
+        display_utils.display_milliseconds(stats.total_seconds),
+        display_utils.display_milliseconds(stats.mean_seconds),
+        display_utils.display_milliseconds(stats.max_seconds),
+        display_utils.display_size(stats.bytes) if stats.bytes > 0 else '',
+        str(stats.items) if stats.items > 0 else '',
+    ]
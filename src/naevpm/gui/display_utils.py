@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import Optional
 
 from naevpm.core.config import Config
+from naevpm.core.progress import Progress
 
 
 def display_last_datetime(last: Optional[datetime]) -> str:
@@ -18,3 +19,50 @@ def field_name_as_list_header(field_name: str) -> str:
 
 def display_boolean(v: bool) -> str:
     return 'True' if v else 'False'
+
+
+def display_size(size: float) -> str:
+    for unit in ['B', 'kB', 'MB']:
+        if size < 1000:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1000
+    return f'{size:.1f} GB'
+
+
+def display_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f'{seconds:.0f} s'
+    return f'{seconds // 60:.0f} min {seconds % 60:.0f} s'
+
+
+def display_milliseconds(seconds: float) -> str:
+    milliseconds = seconds * 1000
+    return f'{milliseconds:.1f} ms' if milliseconds < 10 else f'{milliseconds:.0f} ms'
+
+
+def display_progress(progress: Progress) -> str:
+    """
+    @return: e.g. '1.2 MB of 3.4 MB, 500.0 kB/s, ETA 4 s' or '120 of 300 objects, 1.2 MB, 60 objects/s, ETA 3 s'
+    """
+    if progress.unit == 'B':
+        amount = display_size(progress.done)
+        if progress.total is not None:
+            amount += f' of {display_size(progress.total)}'
+        rate = f'{display_size(progress.rate)}/s' if progress.rate is not None else None
+    else:
+        amount = str(progress.done)
+        if progress.total is not None:
+            amount += f' of {progress.total}'
+        amount += f' {progress.unit}'
+        rate = None
+        if progress.rate is not None:
+            rate = f'{progress.rate:.1f}' if progress.rate < 10 else f'{progress.rate:.0f}'
+            rate += f' {progress.unit}/s'
+    parts = [amount]
+    if progress.unit != 'B' and progress.received_bytes is not None:
+        parts.append(display_size(progress.received_bytes))
+    if rate is not None:
+        parts.append(rate)
+    if progress.eta is not None and not progress.finished:
+        parts.append(f'ETA {display_duration(progress.eta)}')
+    return ', '.join(parts)
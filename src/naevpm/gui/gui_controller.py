@@ -1,19 +1,24 @@
 import logging
+import threading
+from concurrent.futures import Future
 from tkinter import messagebox
-from typing import Optional, Any
+from typing import Optional, Any, Callable
 
 from naevpm.core.application_logic import ApplicationLogic, ApplicationLogicRegistrySourceWasAlreadyAdded, \
-    ApplicationLogicEmptyRegistrySource
+    ApplicationLogicEmptyRegistrySource, PluginBatchAction
 from naevpm.core.models import IndexedPluginDbModel, RegistryDbModel, PluginState, PluginMetadataDbModel
-
-from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.core.progress import Progress
+from naevpm.core.task_scheduler import TaskKind, TaskPriority
+from naevpm.core.timing import Timings
 from naevpm.gui.abstract_gui_controller import AbstractGuiController
 from naevpm.gui.naevpm_frame import NaevPmFrame
 
+from naevpm.gui.plugin_details_loader import PluginDetailsLoader
 from naevpm.gui.plugins_frame import PluginsFrame
 from naevpm.gui.registries_frame import RegistriesFrame
+from naevpm.gui.stats_window import StatsWindow
 from naevpm.gui.tk_root import TkRoot
-from naevpm.gui.tk_threading import TkThreading, ThreadCommunication
+from naevpm.gui.tk_threading import TkThreading, ThreadCommunication, ThreadedTask
 
 logger = logging.getLogger(__name__)
 
@@ -26,17 +31,39 @@ class GuiController(AbstractGuiController):
     root: TkRoot
     tk_threading: TkThreading
 
-    application_logic: ApplicationLogic
-
-    database_connector: SqliteDatabaseConnector
-
-    def __init__(self, database_connector: SqliteDatabaseConnector, root: TkRoot, tk_threading: TkThreading,
-                 application_logic: ApplicationLogic):
+    _application_logic_future: Future
+    _plugin_details_loader: PluginDetailsLoader
+    _timings: Timings
+    # Created when shown for the first time
+    _stats_window: Optional[StatsWindow] = None
+
+    def __init__(self, root: TkRoot, tk_threading: TkThreading, application_logic_future: Future, timings: Timings):
+        """
+        @param application_logic_future: The application logic is created in the background during startup, so the
+        window can be shown before the DB is set up.
+        @param timings: Timings of the application logic, shown in the statistics window
+        """
         super().__init__()
-        self.application_logic = application_logic
+        self._application_logic_future = application_logic_future
+        self._timings = timings
         self.tk_threading = tk_threading
         self.root = root
-        self.database_connector = database_connector
+
+        def load_plugin_details(plugin: IndexedPluginDbModel, tc: ThreadCommunication):
+            return self.application_logic.get_plugin_metadata(plugin, tc)
+
+        def show_loaded_plugin_details(plugin: IndexedPluginDbModel, plugin_metadata: PluginMetadataDbModel):
+            self.plugins_frame.show_plugin_details(plugin, plugin_metadata)
+
+        self._plugin_details_loader = PluginDetailsLoader(root, tk_threading, load_plugin_details,
+                                                          show_loaded_plugin_details)
+
+    @property
+    def application_logic(self) -> ApplicationLogic:
+        """
+        Waits for the application logic to be created. Only tasks started during startup wait.
+        """
+        return self._application_logic_future.result()
 
     def add_registry(self, source: str):
         def task(tc: ThreadCommunication) -> RegistryDbModel:
@@ -62,9 +89,9 @@ class GuiController(AbstractGuiController):
 
         self.tk_threading.run_threaded_task('remove_registry', task, callback)
 
-    def refresh_registries_list(self):
+    def refresh_registries_list(self, on_refreshed: Optional[Callable[[], None]] = None):
         def task(tc: ThreadCommunication) -> list[RegistryDbModel]:
-            return self.database_connector.get_registries()
+            return self.application_logic.get_registries()
 
         def callback(registries: list[RegistryDbModel], e: Optional[Exception] = None):
             # Reraise in GUI thread if not handled
@@ -72,6 +99,8 @@ class GuiController(AbstractGuiController):
                 self.show_status(f'Unhandled error occurred: {str(e)}')
                 raise e
             self.registries_frame.put_registries(registries)
+            if on_refreshed is not None:
+                on_refreshed()
 
         self.tk_threading.run_threaded_task('refresh_registries_list', task, callback)
 
@@ -88,7 +117,8 @@ class GuiController(AbstractGuiController):
 
         self.tk_threading.run_threaded_task('remove_registry', task, callback)
 
-    def fetch_registry_plugin_metadatas(self, registry: RegistryDbModel):
+    def fetch_registry_plugin_metadatas(self, registry: RegistryDbModel,
+                                        priority: TaskPriority = TaskPriority.INTERACTIVE):
         def task(tc: ThreadCommunication):
             self.application_logic.fetch_registry_plugin_metadatas(registry, tc)
 
@@ -100,21 +130,31 @@ class GuiController(AbstractGuiController):
             self.registries_frame.update_registry(registry)
             self.refresh_plugins_list()
 
-        self.tk_threading.run_threaded_task('fetch_registry_plugin_metadatas', task, callback)
+        self.tk_threading.run_threaded_task('fetch_registry_plugin_metadatas', task, callback,
+                                            TaskKind.NETWORK, priority)
 
-    def refresh_plugins_list(self):
-        def task(tc: ThreadCommunication) -> list[IndexedPluginDbModel]:
-            return self.database_connector.get_plugins()
+    def refresh_plugins_list(self, on_refreshed: Optional[Callable[[], None]] = None):
+        def task(tc: ThreadCommunication) -> int:
+            # Loads the plugin index outside the GUI thread. The plugins list reads its pages from the loaded index.
+            return self.application_logic.count_plugins()
 
-        def callback(plugins: list[IndexedPluginDbModel], e: Optional[Exception] = None):
+        def callback(count: int, e: Optional[Exception] = None):
             # Reraise in GUI thread if not handled
             if e is not None:
                 self.show_status(f'Unhandled error occurred: {str(e)}')
                 raise e
-            self.plugins_frame.put_plugins(plugins)
+            self.plugins_frame.refresh_plugins()
+            if on_refreshed is not None:
+                on_refreshed()
 
         self.tk_threading.run_threaded_task('refresh_plugins_list', task, callback)
 
+    def count_plugins(self) -> int:
+        return self.application_logic.count_plugins()
+
+    def get_plugins_page(self, offset: int, limit: int) -> list[IndexedPluginDbModel]:
+        return self.application_logic.get_plugins_page(offset, limit)
+
     def install_plugin(self, plugin: IndexedPluginDbModel):
         def task(tc: ThreadCommunication):
             self.application_logic.install_plugin(plugin, tc)
@@ -149,11 +189,12 @@ class GuiController(AbstractGuiController):
             if e is not None:
                 self.show_status(f'Unhandled error occurred: {str(e)}')
                 raise e
+            self._plugin_details_loader.invalidate(plugin)
             self.plugins_frame.update_plugin(plugin)
 
         self.tk_threading.run_threaded_task('delete_plugin_from_cache', task, callback)
 
-    def check_plugin(self, plugin: IndexedPluginDbModel):
+    def check_plugin(self, plugin: IndexedPluginDbModel, priority: TaskPriority = TaskPriority.INTERACTIVE):
         def task(tc: ThreadCommunication):
             self.application_logic.check_plugin(plugin, tc)
 
@@ -164,7 +205,7 @@ class GuiController(AbstractGuiController):
                 raise e
             self.plugins_frame.update_plugin(plugin)
 
-        self.tk_threading.run_threaded_task('check_for_plugin_update', task, callback)
+        self.tk_threading.run_threaded_task('check_for_plugin_update', task, callback, TaskKind.NETWORK, priority)
 
     def update_plugin(self, plugin: IndexedPluginDbModel):
         def task(tc: ThreadCommunication):
@@ -175,14 +216,15 @@ class GuiController(AbstractGuiController):
             if e is not None:
                 self.show_status(f'Unhandled error occurred: {str(e)}')
                 raise e
+            self._plugin_details_loader.invalidate(plugin)
             self.plugins_frame.update_plugin(plugin)
 
-        self.tk_threading.run_threaded_task('update_plugin', task, callback)
+        self.tk_threading.run_threaded_task('update_plugin', task, callback, TaskKind.NETWORK)
 
     def check_for_plugin_updates(self, plugins: list[IndexedPluginDbModel]):
         for plugin in plugins:
             if plugin.state == PluginState.INSTALLED:
-                self.check_plugin(plugin)
+                self.check_plugin(plugin, TaskPriority.BACKGROUND)
 
     def fetch_plugin(self, plugin: IndexedPluginDbModel):
         def task(tc: ThreadCommunication):
@@ -193,10 +235,11 @@ class GuiController(AbstractGuiController):
             if e is not None:
                 self.show_status(f'Unhandled error occurred: {str(e)}')
                 raise e
+            self._plugin_details_loader.invalidate(plugin)
             self.plugins_frame.update_plugin(plugin)
-            self.show_plugin_details(plugin)
+            self.show_plugin_details(plugin, [])
 
-        self.tk_threading.run_threaded_task('fetch_plugin', task, callback)
+        self.tk_threading.run_threaded_task('fetch_plugin', task, callback, TaskKind.NETWORK)
 
     def remove_plugin(self, plugin: IndexedPluginDbModel):
         def task(tc: ThreadCommunication):
@@ -207,25 +250,51 @@ class GuiController(AbstractGuiController):
             if e is not None:
                 self.show_status(f'Unhandled error occurred: {str(e)}')
                 raise e
+            self._plugin_details_loader.invalidate(plugin)
             self.plugins_frame.remove_plugin(plugin)
 
         self.tk_threading.run_threaded_task('remove_plugin_from_index', task, callback)
 
-    def show_status(self, value: str):
-        self.naevpm_frame.add_log_line(value)
+    def run_plugin_batch(self, action: PluginBatchAction, plugins: list[IndexedPluginDbModel]):
+        cancel_event = threading.Event()
 
-    def show_plugin_details(self, plugin: IndexedPluginDbModel):
-        def task(tc: ThreadCommunication):
-            return self.application_logic.get_plugin_metadata(plugin, tc)
+        def task(tc: ThreadCommunication) -> list[IndexedPluginDbModel]:
+            return self.application_logic.run_plugin_batch(action, plugins, tc, cancel_event)
 
-        def callback(plugin_meta_data: PluginMetadataDbModel, e: Optional[Exception] = None):
+        def callback(succeeded_plugins: list[IndexedPluginDbModel], e: Optional[Exception] = None):
+            self.plugins_frame.end_batch()
             # Reraise in GUI thread if not handled
             if e is not None:
                 self.show_status(f'Unhandled error occurred: {str(e)}')
                 raise e
-            self.plugins_frame.show_plugin_details(plugin, plugin_meta_data)
-
-        self.tk_threading.run_threaded_task('remove_plugin_from_index', task, callback)
+            for plugin in plugins:
+                self._plugin_details_loader.invalidate(plugin)
+                self.plugins_frame.update_plugin(plugin)
+
+        self.plugins_frame.start_batch()
+        if action in [PluginBatchAction.FETCH, PluginBatchAction.UPDATE]:
+            kind = TaskKind.NETWORK
+        else:
+            kind = TaskKind.DISK
+        self.tk_threading.run_threaded_task(f'plugin_batch_{action.name.lower()}', task, callback, kind,
+                                            cancel_fn=cancel_event.set)
+
+    def show_status(self, value: str, level: int = logging.INFO):
+        self.naevpm_frame.add_log_line(value, level)
+
+    def show_task_progress(self, threaded_task: ThreadedTask, progress: Optional[Progress]):
+        self.naevpm_frame.task_progress_frame.update_progress(threaded_task, progress)
+
+    def show_plugin_details(self, plugin: IndexedPluginDbModel, neighbours: list[IndexedPluginDbModel]):
+        self._plugin_details_loader.request(plugin, neighbours)
+
+    def cancel_plugin_details(self):
+        self._plugin_details_loader.cancel()
+
+    def show_stats(self):
+        if self._stats_window is None:
+            self._stats_window = StatsWindow(self.root, self._timings)
+        self._stats_window.show()
 
     def import_existing_plugins_to_index(self):
         def task(tc: ThreadCommunication):
@@ -1,21 +1,37 @@
-from tkinter import ttk, VERTICAL
+import logging
+from collections import deque
+from tkinter import ttk, VERTICAL, BooleanVar
 
 from naevpm.core.config import Config
 from naevpm.gui.abstract_gui_controller import AbstractGuiController
 from naevpm.gui.plugins_frame import PluginsFrame
 from naevpm.gui.registries_frame import RegistriesFrame
+from naevpm.gui.task_progress_frame import TaskProgressFrame
 from naevpm.gui.tk_root import TkRoot
 
 
 class NaevPmFrame(ttk.Frame):
+    # Number of lines shown in the log
+    LOG_MAX_LINES = 200
+    # Number of lines kept of all levels, so lines can be shown again after changing the verbosity
+    LOG_BUFFER_LINES = 1000
+
     registries_frame: RegistriesFrame
     plugins_frame: PluginsFrame
-    _log_line_count: int
+    task_progress_frame: TaskProgressFrame
+    # Ring buffers of (log line, level)
+    _log_lines: deque[tuple[str, int]]
+    _pending_log_lines: deque[tuple[str, int]]
+    _log_flush_scheduled: bool
+    _verbose_log_var: BooleanVar
 
     def __init__(self, root: TkRoot, gui_controller: AbstractGuiController, **kwargs):
         super().__init__(root, **kwargs)
 
-        self._log_line_count = 0
+        self._log_lines = deque(maxlen=self.LOG_BUFFER_LINES)
+        # Lines beyond the maximum would be trimmed right away by the next flush. Do not even keep them.
+        self._pending_log_lines = deque(maxlen=self.LOG_MAX_LINES)
+        self._log_flush_scheduled = False
 
         p = ttk.Panedwindow(self, orient=VERTICAL)
         p.grid(column=0, row=0, sticky='NSEW', **Config.GLOBAL_GRID_PADDING)
@@ -55,10 +71,52 @@ class NaevPmFrame(ttk.Frame):
         self.log.configure(yscrollcommand=log_scrollbar.set)
         log_scrollbar.grid(column=1, row=0, sticky='NSE')
 
-    def add_log_line(self, log_line: str):
-        self._log_line_count += 1
-        if self._log_line_count > 200:
-            self.log.delete(self.log.get_children()[0])
-            self._log_line_count -= 1
-        self.log.insert('', 'end', values=[log_line])
+        self._verbose_log_var = BooleanVar(value=False)
+        verbose_log_checkbutton = ttk.Checkbutton(list_frame, text='Verbose log', variable=self._verbose_log_var,
+                                                  command=self._show_log_lines)
+        verbose_log_checkbutton.grid(column=0, row=1, sticky='W')
+        stats_button = ttk.Button(list_frame, text='Statistics', command=gui_controller.show_stats)
+        stats_button.grid(column=0, row=1, columnspan=2, sticky='E')
+
+        self.task_progress_frame = TaskProgressFrame(list_frame)
+        self.task_progress_frame.grid(column=0, row=2, columnspan=2, sticky='EW')
+
+    def _get_log_level(self) -> int:
+        return logging.DEBUG if self._verbose_log_var.get() else logging.INFO
+
+    def add_log_line(self, log_line: str, level: int = logging.INFO):
+        """
+        Lines are added to the log at most once per frame in a single batch.
+        """
+        self._log_lines.append((log_line, level))
+        self._pending_log_lines.append((log_line, level))
+        if not self._log_flush_scheduled:
+            self._log_flush_scheduled = True
+            self.after_idle(self._flush_log_lines)
+
+    def _flush_log_lines(self):
+        self._log_flush_scheduled = False
+        log_level = self._get_log_level()
+        for log_line, level in self._pending_log_lines:
+            if level >= log_level:
+                self.log.insert('', 'end', values=[log_line])
+        self._pending_log_lines.clear()
+        self._trim_log()
+
+    def _show_log_lines(self):
+        """
+        Shows the buffered lines again with the current verbosity.
+        """
+        self.log.delete(*self.log.get_children())
+        log_level = self._get_log_level()
+        lines = [log_line for log_line, level in self._log_lines if level >= log_level]
+        for log_line in lines[-self.LOG_MAX_LINES:]:
+            self.log.insert('', 'end', values=[log_line])
+        self._pending_log_lines.clear()
+        self._trim_log()
+
+    def _trim_log(self):
+        children = self.log.get_children()
+        if len(children) > self.LOG_MAX_LINES:
+            self.log.delete(*children[:len(children) - self.LOG_MAX_LINES])
         self.log.yview_moveto(1)
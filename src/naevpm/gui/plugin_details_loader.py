@@ -0,0 +1,159 @@
+import logging
+from tkinter import Tk
+from typing import Callable, Optional
+
+from naevpm.core.lru_cache import LruCache
+from naevpm.core.models import IndexedPluginDbModel, PluginMetadataDbModel
+from naevpm.core.task_scheduler import TaskKind, TaskPriority
+from naevpm.gui.tk_threading import TkThreading, ThreadCommunication, ThreadedTask
+
+logger = logging.getLogger(__name__)
+
+
+class PluginDetailsLoader:
+    """
+    Loads the metadata of the selected plugin in the background and shows it.
+
+    - Selections are debounced. Arrowing through the list only loads the plugin the selection stops at.
+    - A newer selection cancels the load of an older one if it has not started yet. Responses of older selections
+      are dropped, so they never overwrite the details of the selected plugin.
+    - Loaded metadata is kept in a bounded LRU cache and shown immediately when a plugin is selected again.
+    - After a load, the neighbouring plugins are prefetched in the background.
+
+    Must only be used from the GUI thread.
+    """
+    CACHE_SIZE = 256
+    DEBOUNCE_MS = 120
+
+    _root: Tk
+    _tk_threading: TkThreading
+    _load_fn: Callable[[IndexedPluginDbModel, ThreadCommunication], Optional[PluginMetadataDbModel]]
+    _show_fn: Callable[[IndexedPluginDbModel, PluginMetadataDbModel], None]
+    # Metadata by plugin source
+    _cache: LruCache[str, PluginMetadataDbModel]
+    # Increased with every selection. Responses of older generations are stale.
+    _generation: int
+    _debounce_after_id: Optional[str]
+    _load_task: Optional[ThreadedTask]
+    _load_source: Optional[str]
+    # Sources of the plugins which are loaded right now, so they are not loaded twice
+    _loading_sources: set[str]
+
+    def __init__(self, root: Tk, tk_threading: TkThreading,
+                 load_fn: Callable[[IndexedPluginDbModel, ThreadCommunication], Optional[PluginMetadataDbModel]],
+                 show_fn: Callable[[IndexedPluginDbModel, PluginMetadataDbModel], None],
+                 cache_size: int = CACHE_SIZE):
+        """
+        @param load_fn: Called in a worker thread
+        @param show_fn: Called in the GUI thread with the metadata of the selected plugin
+        """
+        super().__init__()
+        self._root = root
+        self._tk_threading = tk_threading
+        self._load_fn = load_fn
+        self._show_fn = show_fn
+        self._cache = LruCache(cache_size)
+        self._generation = 0
+        self._debounce_after_id = None
+        self._load_task = None
+        self._load_source = None
+        self._loading_sources = set()
+
+    def request(self, plugin: IndexedPluginDbModel, neighbours: list[IndexedPluginDbModel]):
+        """
+        Shows the details of the plugin, immediately if they are cached.
+
+        @param neighbours: Plugins next to the plugin in the list, prefetched after the plugin is loaded
+        """
+        self.cancel()
+        generation = self._generation
+        plugin_metadata = self._cache.get(plugin.source)
+        if plugin_metadata is not None:
+            self._show_fn(plugin, plugin_metadata)
+            self._debounce(lambda: self._prefetch(neighbours))
+        else:
+            self._debounce(lambda: self._load(plugin, neighbours, generation))
+
+    def cancel(self):
+        """
+        Drops the pending load of the last selection, e.g. when the selection is cleared.
+        """
+        self._generation += 1
+        if self._debounce_after_id is not None:
+            self._root.after_cancel(self._debounce_after_id)
+            self._debounce_after_id = None
+        if self._load_task is not None:
+            # Only cancels the task if it has not started yet. The callbacks of cancelled tasks are not called.
+            if self._load_task.future.cancel():
+                self._loading_sources.discard(self._load_source)
+            self._load_task = None
+            self._load_source = None
+
+    def invalidate(self, plugin: IndexedPluginDbModel):
+        """
+        Call when the metadata of the plugin changed, e.g. after it was fetched, updated or deleted.
+        """
+        self._cache.invalidate(plugin.source)
+
+    def _debounce(self, fn: Callable[[], None]):
+        def run():
+            self._debounce_after_id = None
+            fn()
+
+        self._debounce_after_id = self._root.after(self.DEBOUNCE_MS, run)
+
+    def _load(self, plugin: IndexedPluginDbModel, neighbours: list[IndexedPluginDbModel], generation: int):
+        def task(tc: ThreadCommunication) -> Optional[PluginMetadataDbModel]:
+            return self._load_fn(plugin, tc)
+
+        def callback(plugin_metadata: Optional[PluginMetadataDbModel], e: Optional[Exception] = None):
+            self._loading_sources.discard(plugin.source)
+            # Reraise in GUI thread if not handled
+            if e is not None:
+                raise e
+            if plugin_metadata is not None:
+                self._cache.put(plugin.source, plugin_metadata)
+            # A newer selection was made while loading
+            if generation != self._generation:
+                return
+            self._load_task = None
+            self._load_source = None
+            if plugin_metadata is not None:
+                self._show_fn(plugin, plugin_metadata)
+            self._prefetch(neighbours)
+
+        self._loading_sources.add(plugin.source)
+        self._load_source = plugin.source
+        self._load_task = self._tk_threading.run_threaded_task('load_plugin_details', task, callback, TaskKind.DISK,
+                                                               TaskPriority.INTERACTIVE)
+
+    def _prefetch(self, plugins: list[IndexedPluginDbModel]):
+        plugins = [plugin for plugin in plugins
+                   if plugin.source not in self._cache and plugin.source not in self._loading_sources]
+        if len(plugins) == 0:
+            return
+
+        def task(tc: ThreadCommunication) -> list[tuple[IndexedPluginDbModel, Optional[PluginMetadataDbModel]]]:
+            results = []
+            for plugin in plugins:
+                # noinspection PyBroadException
+                try:
+                    results.append((plugin, self._load_fn(plugin, tc)))
+                except Exception:
+                    # Errors are reported when the plugin is selected and loaded again
+                    logger.debug(f'Prefetching details of {plugin.source} failed', exc_info=True)
+            return results
+
+        def callback(results: list[tuple[IndexedPluginDbModel, Optional[PluginMetadataDbModel]]],
+                     e: Optional[Exception] = None):
+            for plugin in plugins:
+                self._loading_sources.discard(plugin.source)
+            if e is not None:
+                raise e
+            for plugin, plugin_metadata in results:
+                if plugin_metadata is not None:
+                    self._cache.put(plugin.source, plugin_metadata)
+
+        self._loading_sources.update(plugin.source for plugin in plugins)
+        self._tk_threading.run_threaded_task('prefetch_plugin_details', task, callback, TaskKind.DISK,
+                                             TaskPriority.BACKGROUND)
@@ -1,17 +1,22 @@
-from tkinter import ttk, E, DISABLED, NORMAL, StringVar, Event, font, NO, HORIZONTAL
+from tkinter import ttk, E, W, DISABLED, NORMAL, StringVar, Event, font, NO, HORIZONTAL, Menu
+from naevpm.core.application_logic import PluginBatchAction
 
 from naevpm.core.config import Config
 from naevpm.core.models import indexed_plugin_fields, IndexedPluginDbModel, PluginState, PluginMetadataDbModel
 from naevpm.gui.abstract_gui_controller import AbstractGuiController
 from naevpm.gui.data_model_to_str_list import plugin_to_str_list
 from naevpm.gui.display_utils import field_name_as_list_header
-from naevpm.gui.synced_tree_view import SyncedTreeView
 from naevpm.gui.tk_root import TkRoot
 from naevpm.gui.treeview_context_menu import TreeviewContextMenu
+from naevpm.gui.virtual_synced_tree_view import VirtualSyncedTreeView
 
 
 class PluginsFrame(ttk.Frame):
-    _plugins_list: SyncedTreeView[IndexedPluginDbModel]
+    # Rows above and below the selected plugin whose details are prefetched
+    PREFETCH_NEIGHBOURS = 2
+
+    _plugins_list: VirtualSyncedTreeView[IndexedPluginDbModel]
+    _batch_menu_button: ttk.Menubutton
 
     plugin_name_var: StringVar
     plugin_author_var: StringVar
@@ -32,13 +37,30 @@ class PluginsFrame(ttk.Frame):
         # Buttons on top of the list -----------------------------------------
         buttons_frame = ttk.Frame(self)
         buttons_frame.grid(column=0, row=0, sticky='NSEW', **Config.GLOBAL_GRID_PADDING)
-        buttons_frame.columnconfigure(0, weight=1)
+        buttons_frame.columnconfigure(1, weight=1)
+
+        # Actions on all selected plugins, run as one background job
+        self._batch_menu_button = ttk.Menubutton(buttons_frame, text="Selected plugins")
+        self._batch_menu_button.grid(column=0, row=0, sticky=W, **Config.GLOBAL_GRID_PADDING)
+        batch_menu = Menu(self._batch_menu_button)
+        self._batch_menu_button['menu'] = batch_menu
+        for label, action in [('Fetch', PluginBatchAction.FETCH),
+                              ('Install', PluginBatchAction.INSTALL),
+                              ('Update', PluginBatchAction.UPDATE),
+                              ('Uninstall', PluginBatchAction.UNINSTALL),
+                              ('Delete from cache', PluginBatchAction.DELETE)]:
+            def run_plugin_batch(a=action):
+                plugins = self._plugins_list.get_selected_objects()
+                if len(plugins) > 0:
+                    gui_controller.run_plugin_batch(a, plugins)
+
+            batch_menu.add_command(label=label, command=run_plugin_batch)
 
         def check_for_updates():
             gui_controller.check_for_plugin_updates(self._plugins_list.get_all_objects())
 
         check_for_updates_button = ttk.Button(buttons_frame, text="Check for updates", command=check_for_updates)
-        check_for_updates_button.grid(column=0, row=0, sticky=E, **Config.GLOBAL_GRID_PADDING)
+        check_for_updates_button.grid(column=1, row=0, sticky=E, **Config.GLOBAL_GRID_PADDING)
 
         paned_window = ttk.Panedwindow(self, orient=HORIZONTAL)
         paned_window.grid(column=0, row=1, sticky='NSEW', **Config.GLOBAL_GRID_PADDING)
@@ -52,18 +74,20 @@ class PluginsFrame(ttk.Frame):
         def get_object_identifier(r: IndexedPluginDbModel):
             return r.source
 
-        self._plugins_list = SyncedTreeView(
+        self._plugins_list = VirtualSyncedTreeView(
             get_str_values_fn=plugin_to_str_list,
             get_object_identifier_fn=get_object_identifier,
+            count_fn=gui_controller.count_plugins,
+            get_page_fn=gui_controller.get_plugins_page,
             master=list_frame,
             columns=indexed_plugin_fields,
             show='headings',
-            selectmode='browse')
+            selectmode='extended')
         plugin_list_scrollbar = ttk.Scrollbar(list_frame,
                                               orient="vertical",
                                               command=self._plugins_list.yview)
         plugin_list_scrollbar.grid(column=1, row=0, sticky='NSE')
-        self._plugins_list.configure(yscrollcommand=plugin_list_scrollbar.set)
+        self._plugins_list.set_scroll_command(plugin_list_scrollbar.set)
         for plugin_field in indexed_plugin_fields:
             self._plugins_list.heading(plugin_field, text=field_name_as_list_header(plugin_field))
             if plugin_field == 'state':
@@ -140,8 +164,9 @@ class PluginsFrame(ttk.Frame):
         def show_plugin_details(ev: Event):
             plugin = self._plugins_list.get_selected_object()
             if plugin is not None and plugin.state in [PluginState.CACHED, PluginState.INSTALLED]:
-                gui_controller.show_plugin_details(plugin)
+                gui_controller.show_plugin_details(plugin, self._get_neighbour_plugins())
             else:
+                gui_controller.cancel_plugin_details()
                 self.plugin_name_var.set(' ' * 80)
                 self.plugin_author_var.set(' ' * 80)
                 self.plugin_version_var.set(' ' * 80)
@@ -201,12 +226,32 @@ class PluginsFrame(ttk.Frame):
         self.list_item_context_menu.add_command(label='Update plugin',
                                                 command=update_plugin)
 
+    def _get_neighbour_plugins(self) -> list[IndexedPluginDbModel]:
+        """
+        @return: Plugins with details in the rows next to the focused row, nearest first
+        """
+        iid = self._plugins_list.focus()
+        if iid == '':
+            return []
+        neighbours = []
+        previous_iid = iid
+        next_iid = iid
+        for i in range(self.PREFETCH_NEIGHBOURS):
+            next_iid = self._plugins_list.next(next_iid) if next_iid != '' else ''
+            previous_iid = self._plugins_list.prev(previous_iid) if previous_iid != '' else ''
+            for neighbour_iid in [next_iid, previous_iid]:
+                if neighbour_iid != '':
+                    plugin = self._plugins_list.get_object_by_iid(neighbour_iid)
+                    if plugin.state in [PluginState.CACHED, PluginState.INSTALLED]:
+                        neighbours.append(plugin)
+        return neighbours
+
     # Functions for use by GUI controller -----------------------------------------
     def put_plugin(self, plugin: IndexedPluginDbModel):
         self._plugins_list.sync_put(plugin)
 
-    def put_plugins(self, plugins: list[IndexedPluginDbModel]):
-        self._plugins_list.sync_put_all(plugins)
+    def refresh_plugins(self):
+        self._plugins_list.sync_refresh()
 
     def clear_plugins(self):
         self._plugins_list.sync_clear()
@@ -217,8 +262,19 @@ class PluginsFrame(ttk.Frame):
     def remove_plugin(self, plugin: IndexedPluginDbModel):
         self._plugins_list.sync_remove(plugin)
 
+    def start_batch(self):
+        """
+        Only one batch job runs at a time. Its progress is shown with the progress of the other tasks.
+        """
+        self._batch_menu_button.state(['disabled'])
+
+    def end_batch(self):
+        self._batch_menu_button.state(['!disabled'])
+
     def show_plugin_details(self, plugin: IndexedPluginDbModel, plugin_meta_data: PluginMetadataDbModel):
-        if self._plugins_list.get_selected_object() is plugin and plugin_meta_data is not None:
+        selected_plugin = self._plugins_list.get_selected_object()
+        # The list reads its rows again while scrolling, so the selected plugin might be another copy of the plugin
+        if selected_plugin is not None and selected_plugin.source == plugin.source and plugin_meta_data is not None:
             self.plugin_name_var.set(plugin_meta_data.name)
             self.plugin_author_var.set(plugin_meta_data.author)
             self.plugin_version_var.set(plugin_meta_data.version)
@@ -2,6 +2,7 @@ from tkinter import ttk
 
 from naevpm.core.config import Config
 from naevpm.core.models import registry_fields, RegistryDbModel
+from naevpm.core.task_scheduler import TaskPriority
 from naevpm.gui.abstract_gui_controller import AbstractGuiController
 from naevpm.gui.add_registry_window import AddRegistryWindow
 from naevpm.gui.data_model_to_str_list import registry_to_str_list
@@ -43,7 +44,7 @@ class RegistriesFrame(ttk.Frame):
 
         def fetch_plugin_metadata_from_all_registries():
             for registry in self._registries_list.get_all_objects():
-                gui_controller.fetch_registry_plugin_metadatas(registry)
+                gui_controller.fetch_registry_plugin_metadatas(registry, TaskPriority.BACKGROUND)
 
         fetch_all_button = ttk.Button(buttons_frame, text="Fetch plugin metadata from all registries",
                                       command=fetch_plugin_metadata_from_all_registries)
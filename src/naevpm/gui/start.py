@@ -1,44 +1,78 @@
+from concurrent.futures import Future
 from importlib import resources
 import locale
 import logging
-from PIL import ImageTk, Image
+import time
+from tkinter import PhotoImage, TclError
+from typing import Optional
 
 from naevpm.core.application_logic import ApplicationLogic
 from naevpm.core.config import Config
 from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.core.timing import Timings
+from naevpm.daemon import DaemonServer, DaemonAlreadyRunning, DaemonNotSupported
 from naevpm.gui.gui_controller import GuiController
 from naevpm.gui.naevpm_frame import NaevPmFrame
 from naevpm.gui.tk_root import TkRoot
-from naevpm.gui.tk_threading import TkThreading
+from naevpm.gui.tk_threading import TkThreading, ThreadCommunication
 
+logger = logging.getLogger(__name__)
 
-def start_gui(config: Config):
+
+def load_icon(root: TkRoot):
+    icon_path = resources.files("naevpm.gui.resources").joinpath('icon2.png')
+    with resources.as_file(icon_path) as f:
+        try:
+            # Tk 8.6 reads PNG files on its own
+            icon = PhotoImage(master=root, file=f)
+        except TclError:
+            # Using Pillow for more image support in tkinter. Importing it takes long, so only import it when needed.
+            from PIL import ImageTk, Image
+            icon = ImageTk.PhotoImage(Image.open(f))
+        root.iconphoto(True, icon)
+
+
+def start_gui(config: Optional[Config] = None):
+    """
+    @param config: Defaults to the settings of the config file and the environment, see Config.load
+
+    Starts in stages, so the window is shown as fast as possible:
+    1. The window and its widgets are created and painted.
+    2. Meanwhile, the DB is set up in the background. Then the lists are loaded in the background.
+    3. After the first paint, the icon is loaded.
+    Time to first paint and time to interactive (all lists loaded) are logged.
+    """
+    start_time = time.perf_counter()
+    if config is None:
+        config = Config.load()
     # Use the system locale
     locale.setlocale(locale.LC_ALL, '')
     logging.basicConfig(level=logging.INFO)
     # TODO logging configuration file
     root = TkRoot(title='Naev Plugin Manager')
 
-    database_connector = SqliteDatabaseConnector(config.DATABASE)
-
-    application_logic = ApplicationLogic(database_connector, config)
     tk_threading = TkThreading(root)
-    gui_controller = GuiController(database_connector, root, tk_threading, application_logic)
+    application_logic_future = Future()
+    # Shown in the statistics window and recorded as metrics. Recording them costs little compared to the steps.
+    timings = Timings(enabled=True)
+    gui_controller = GuiController(root, tk_threading, application_logic_future, timings)
     tk_threading.set_update_gui_fn(gui_controller.show_status)
+    tk_threading.set_update_progress_fn(gui_controller.show_task_progress)
+
+    # Serves the commands of naevpm while the GUI is open, see start_daemon_server
+    daemon_servers: list[DaemonServer] = []
 
     # Check threads before closing
     def on_delete_window():
         if tk_threading.close():
+            for daemon_server in daemon_servers:
+                daemon_server.stop()
+            if application_logic_future.done() and application_logic_future.exception() is None:
+                application_logic_future.result().close()
             root.destroy()
 
     root.protocol("WM_DELETE_WINDOW", on_delete_window)
 
-    # Using Pillow for more image support in tkinter
-
-    icon_path = resources.files("naevpm.gui.resources").joinpath('icon2.png')
-    with resources.as_file(icon_path) as f:
-        icon = ImageTk.PhotoImage(Image.open(f))
-        root.iconphoto(True, icon)
     naevpm_frame = NaevPmFrame(root, gui_controller)
     naevpm_frame.grid(sticky='NSEW')
 
@@ -46,16 +80,79 @@ def start_gui(config: Config):
     gui_controller.plugins_frame = naevpm_frame.plugins_frame
     gui_controller.naevpm_frame = naevpm_frame
 
-    gui_controller.refresh_registries_list()
-    gui_controller.refresh_plugins_list()
+    def log_duration(stage: str):
+        message = f'{stage} after {(time.perf_counter() - start_time) * 1000:.0f} ms'
+        logger.info(message)
+        gui_controller.show_status(message, logging.DEBUG)
+
+    # Stage 2 -----------------------------------------
+    def create_application_logic(tc: ThreadCommunication) -> ApplicationLogic:
+        try:
+            database_connector = SqliteDatabaseConnector(config.DATABASE)
+            application_logic = ApplicationLogic(database_connector, config, timings)
+        except Exception as e:
+            application_logic_future.set_exception(e)
+            raise
+        # Tasks which were started before are waiting for it
+        application_logic_future.set_result(application_logic)
+        return application_logic
+
+    lists_to_load = [2]
+
+    def on_list_loaded():
+        lists_to_load[0] -= 1
+        if lists_to_load[0] == 0:
+            log_duration('Interactive')
+
+    def start_daemon_server(application_logic: ApplicationLogic):
+        # The commands share the DB connection of the GUI instead of competing with it for the locks
+        def on_command_done():
+            # Called in the thread of the server. The event is queued, so the lists are refreshed in the GUI thread.
+            root.event_generate('<<DaemonServer.CommandDone>>', when='tail')
+
+        def refresh_lists(ev):
+            gui_controller.refresh_registries_list()
+            gui_controller.refresh_plugins_list()
+
+        root.bind('<<DaemonServer.CommandDone>>', refresh_lists)
+        daemon_server = DaemonServer(application_logic, config.DAEMON_SOCKET, on_command_done)
+        try:
+            daemon_server.start()
+        except (DaemonAlreadyRunning, DaemonNotSupported) as e:
+            # The commands of naevpm run in the daemon or in their own process instead
+            logger.info(f'Not serving commands: {str(e)}')
+            return
+        daemon_servers.append(daemon_server)
+
+    def on_application_logic_created(application_logic: ApplicationLogic, e: Optional[Exception] = None):
+        # Reraise in GUI thread if not handled
+        if e is not None:
+            gui_controller.show_status(f'Unhandled error occurred: {str(e)}')
+            raise e
+        gui_controller.refresh_registries_list(on_list_loaded)
+        gui_controller.refresh_plugins_list(on_list_loaded)
+        start_daemon_server(application_logic)
+
+    tk_threading.run_threaded_task('create_application_logic', create_application_logic,
+                                   on_application_logic_created)
+
+    # Stage 3 -----------------------------------------
+    def after_first_paint():
+        log_duration('First paint')
+        # Stop dynamic window resizing when contents change in size
+        root.geometry(root.geometry())
+        load_icon(root)
+        gui_controller.show_status('Application started. Welcome.')
+
+    # Any widget being drawn for the first time means the window is painted
+    def on_first_expose(ev):
+        root.unbind('<Expose>')
+        root.after_idle(after_first_paint)
 
-    # Stop dynamic window resizing when contents change in size
-    root.update()
-    root.geometry(root.geometry())
+    root.bind('<Expose>', on_first_expose)
 
-    gui_controller.show_status('Application started. Welcome.')
     root.mainloop()
 
 
 if __name__ == '__main__':
-    start_gui(Config())
+    start_gui()
@@ -0,0 +1,82 @@
+from tkinter import Toplevel, ttk
+
+from naevpm.core.config import Config
+from naevpm.core.timing import Timings
+from naevpm.gui.data_model_to_str_list import span_stats_headers, span_stats_to_str_list
+from naevpm.gui.tk_root import TkRoot
+
+
+class StatsWindow(Toplevel):
+    """
+    Shows the durations of the steps run since the start or the last reset. Refreshed while shown.
+    """
+    REFRESH_MS = 1000
+
+    _timings: Timings
+    _tree: ttk.Treeview
+    _refresh_after_id: str = None
+
+    def __init__(self, root: TkRoot, timings: Timings, **kwargs):
+        title = 'Statistics'
+        # class_ needs to be set to the title to show the right text in the window switcher
+        super().__init__(root, class_=title, **kwargs)
+        self.title(title)
+        self._timings = timings
+
+        # Just hide the window instead of destroying it when closing it.
+        self.protocol("WM_DELETE_WINDOW", self.hide)
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        frame = ttk.Frame(self)
+        frame.grid(sticky='NSEW', **Config.GLOBAL_GRID_PADDING)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(0, weight=1)
+
+        self._tree = ttk.Treeview(frame, show='headings', columns=span_stats_headers)
+        for i, header in enumerate(span_stats_headers):
+            self._tree.heading(header, text=header)
+            self._tree.column(header, anchor='w' if i == 0 else 'e', width=200 if i == 0 else 80)
+        self._tree.grid(column=0, row=0, sticky='NSEW')
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self._tree.yview)
+        self._tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.grid(column=1, row=0, sticky='NSE')
+
+        # Buttons -----------------------------------------
+        buttons_frame = ttk.Frame(frame)
+        buttons_frame.grid(column=0, columnspan=2, row=1, sticky='WES', **Config.GLOBAL_GRID_PADDING)
+        buttons_frame.columnconfigure(0, weight=1)
+        buttons_frame.columnconfigure(1, weight=1)
+
+        def reset():
+            self._timings.reset()
+            self._refresh()
+
+        reset_button = ttk.Button(buttons_frame, text='Reset', command=reset)
+        reset_button.grid(column=0, row=0, sticky='W', **Config.GLOBAL_GRID_PADDING)
+        close_button = ttk.Button(buttons_frame, text='Close', command=self.hide)
+        close_button.grid(column=1, row=0, sticky='E')
+
+    def _refresh(self):
+        self._tree.delete(*self._tree.get_children())
+        for stats in self._timings.get_stats():
+            self._tree.insert('', 'end', values=span_stats_to_str_list(stats))
+
+    def _refresh_periodically(self):
+        self._refresh()
+        self._refresh_after_id = self.after(self.REFRESH_MS, self._refresh_periodically)
+
+    def show(self):
+        # Add window to the taskbar and screen
+        self.deiconify()
+        # Make sure it is on the top
+        self.lift()
+        if self._refresh_after_id is None:
+            self._refresh_periodically()
+
+    def hide(self):
+        if self._refresh_after_id is not None:
+            self.after_cancel(self._refresh_after_id)
+            self._refresh_after_id = None
+        self.withdraw()
@@ -9,11 +9,13 @@ T = TypeVar('T')
 class SyncedTreeView(ttk.Treeview, Generic[T]):
     _sync: TkIidObjSync
     _get_str_values_fn: Callable[[T], list[str]]
+    _get_object_identifier_fn: Callable[[T], str]
 
     def __init__(self, get_str_values_fn: Callable[[T], list[str]],
                  get_object_identifier_fn: Callable[[T], str], master, takefocus=True, **kw):
         super().__init__(master, takefocus=takefocus, **kw)
         self._get_str_values_fn = get_str_values_fn
+        self._get_object_identifier_fn = get_object_identifier_fn
         self._sync = TkIidObjSync(get_object_identifier_fn)
 
         # Set rowheight explicitly to prevent squashed rows
@@ -36,14 +38,60 @@ class SyncedTreeView(ttk.Treeview, Generic[T]):
             self.selection_set(iid)
 
     def sync_put_all(self, objects: list[T]):
-        self.sync_clear()
-        first = True
-        for obj in objects:
-            iid = self.insert('', 'end', values=self._get_str_values_fn(obj))
-            self._sync.put(iid, obj)
-            if iid != '' and first:
-                self.selection_set(iid)
-                first = False
+        """
+        Shows the given objects in the given order. Selects the first row if no row is selected.
+        """
+        self._reconcile(objects)
+        if len(self.selection()) == 0:
+            last_iids = self.get_children()
+            if len(last_iids) > 0:
+                self.selection_set(last_iids[0])
+
+    def _reconcile(self, objects: list[T]):
+        """
+        Makes the rows match the given objects by object identifier. Only rows of removed objects are deleted, only
+        rows of added objects are inserted, only rows with changed values are updated and only rows out of order are
+        moved. Selection, focus and scroll position of the remaining rows are kept.
+
+        Objects which were changed in place are not detected. Use sync_update for them.
+        """
+        get_obj_id_fn = self._get_object_identifier_fn
+        obj_ids = {get_obj_id_fn(obj) for obj in objects}
+        removed_iids = [iid for iid in self.get_children()
+                        if get_obj_id_fn(self._sync.get_object_by_iid(iid)) not in obj_ids]
+        for iid in removed_iids:
+            self._sync.remove_by_iid(iid)
+        if len(removed_iids) > 0:
+            self.delete(*removed_iids)
+
+        # Rows which are not moved keep their order, so the row at an index is always the first existing row which
+        # was not visited yet
+        existing_iids = self.get_children()
+        existing_index = 0
+        visited_iids = set()
+        iids = []
+        for index, obj in enumerate(objects):
+            values = self._get_str_values_fn(obj)
+            iid = self._sync.get_iid_by_object_id(get_obj_id_fn(obj))
+            if iid is None:
+                iid = self.insert('', index, values=values)
+                self._sync.put(iid, obj)
+                iids.append(iid)
+                continue
+            existing_obj = self._sync.get_object_by_iid(iid)
+            if existing_obj is not obj:
+                if self._get_str_values_fn(existing_obj) != values:
+                    self.item(iid, values=values)
+                self._sync.replace(iid, obj)
+            while existing_iids[existing_index] in visited_iids:
+                existing_index += 1
+            if existing_iids[existing_index] == iid:
+                existing_index += 1
+            else:
+                self.move(iid, '', index)
+            visited_iids.add(iid)
+            iids.append(iid)
+        self._sync.reorder(iids)
 
     def sync_clear(self):
         self._sync.clear()
@@ -81,6 +129,9 @@ class SyncedTreeView(ttk.Treeview, Generic[T]):
             return self._sync.get_object_by_iid(selected_iids[0])
         return None
 
+    def get_selected_objects(self) -> list[T]:
+        return [self._sync.get_object_by_iid(iid) for iid in self.selection()]
+
     def get_selected_iid(self) -> str:
         selected_iids = self.selection()
         if len(selected_iids) > 0:
@@ -0,0 +1,80 @@
+from tkinter import ttk, StringVar, HORIZONTAL
+from typing import Optional
+
+from naevpm.core.config import Config
+from naevpm.core.progress import Progress
+from naevpm.gui.display_utils import display_progress
+from naevpm.gui.tk_threading import ThreadedTask
+
+
+class TaskProgressRow:
+    frame: ttk.Frame
+    progress_bar: ttk.Progressbar
+    text_var: StringVar
+
+
+class TaskProgressFrame(ttk.Frame):
+    """
+    Shows a progress bar for every running transfer or job of the background tasks, e.g. one for a batch of plugins
+    and one for the plugin which is fetched right now.
+    """
+    # Rows by task id and progress label
+    _rows: dict[tuple[int, str], TaskProgressRow]
+    # Grid rows are not reused, so new rows always appear below the existing rows
+    _next_grid_row: int
+
+    def __init__(self, parent: ttk.Widget, **kwargs):
+        super().__init__(parent, **kwargs)
+        self._rows = {}
+        self._next_grid_row = 0
+        self.columnconfigure(0, weight=1)
+
+    def update_progress(self, threaded_task: ThreadedTask, progress: Optional[Progress]):
+        """
+        @param progress: None removes all rows of the task
+        """
+        if progress is None:
+            for key in [key for key in self._rows.keys() if key[0] == threaded_task.id]:
+                self._remove_row(key)
+            return
+        key = (threaded_task.id, progress.label)
+        if progress.finished:
+            self._remove_row(key)
+            return
+        row = self._rows.get(key, None)
+        if row is None:
+            row = self._add_row(threaded_task, progress)
+            self._rows[key] = row
+        if progress.total is None:
+            # Moves back and forth as the end is unknown
+            if str(row.progress_bar.cget('mode')) != 'indeterminate':
+                row.progress_bar.configure(mode='indeterminate')
+            row.progress_bar.step()
+        else:
+            row.progress_bar.configure(mode='determinate', maximum=max(progress.total, 1), value=progress.done)
+        row.text_var.set(f'{progress.label}: {display_progress(progress)}')
+
+    def _add_row(self, threaded_task: ThreadedTask, progress: Progress) -> TaskProgressRow:
+        row = TaskProgressRow()
+        row.frame = ttk.Frame(self)
+        row.frame.columnconfigure(1, weight=1)
+        row.frame.grid(column=0, row=self._next_grid_row, sticky='EW')
+        self._next_grid_row += 1
+        row.text_var = StringVar()
+        label = ttk.Label(row.frame, textvariable=row.text_var, width=60)
+        label.grid(column=0, row=0, sticky='W', **Config.GLOBAL_GRID_PADDING)
+        row.progress_bar = ttk.Progressbar(row.frame, orient=HORIZONTAL)
+        row.progress_bar.grid(column=1, row=0, sticky='EW', **Config.GLOBAL_GRID_PADDING)
+        if threaded_task.cancel_fn is not None:
+            def cancel():
+                threaded_task.cancel_fn()
+                cancel_button.state(['disabled'])
+
+            cancel_button = ttk.Button(row.frame, text='Cancel', command=cancel)
+            cancel_button.grid(column=2, row=0, **Config.GLOBAL_GRID_PADDING)
+        return row
+
+    def _remove_row(self, key: tuple[int, str]):
+        row = self._rows.pop(key, None)
+        if row is not None:
+            row.frame.destroy()
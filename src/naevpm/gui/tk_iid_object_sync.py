@@ -4,15 +4,23 @@ T = TypeVar('T')
 
 
 class TkIidObjSync:
-    _iid_to_object_map: dict[str, T] = {}
-    _obj_id_to_iid_map: dict[str, str] = {}
-    _objects: list[T] = []
+    """
+    Maps the item identifiers (iids) of a Treeview to objects and back.
+
+    The iid to object map keeps the insertion order and doubles as the ordered list of objects, so adding and
+    removing objects and getting the last iid take constant time.
+    """
+    # Ordered like the rows
+    _iid_to_object_map: dict[str, T]
+    _obj_id_to_iid_map: dict[str, str]
 
     _get_obj_id_fn: Callable[[T], str]
 
     def __init__(self, get_obj_id_fn: Callable[[T], str]):
         super().__init__()
         self._get_obj_id_fn = get_obj_id_fn
+        self._iid_to_object_map = {}
+        self._obj_id_to_iid_map = {}
 
     def put(self, iid: str, obj: T):
         existing_obj = self._iid_to_object_map.get(iid, None)
@@ -29,27 +37,36 @@ class TkIidObjSync:
                                  "This is likely a programming error as this should never happen.")
         self._obj_id_to_iid_map[obj_id] = iid
         self._iid_to_object_map[iid] = obj
-        self._objects.append(obj)
 
     def remove_by_object(self, obj: T) -> str:
         obj_id = self._get_obj_id_fn(obj)
-        iid = self._obj_id_to_iid_map[obj_id]
-        del self._obj_id_to_iid_map[obj_id]
+        iid = self._obj_id_to_iid_map.pop(obj_id)
         del self._iid_to_object_map[iid]
-        self._objects.remove(obj)
         return iid
 
     def remove_by_iid(self, iid: str):
-        obj = self._iid_to_object_map[iid]
-        obj_id = self._get_obj_id_fn(obj)
-        del self._obj_id_to_iid_map[obj_id]
-        del self._iid_to_object_map[iid]
-        self._objects.remove(obj)
+        obj = self._iid_to_object_map.pop(iid)
+        del self._obj_id_to_iid_map[self._get_obj_id_fn(obj)]
+
+    def replace(self, iid: str, obj: T):
+        """
+        Maps an iid to another object with the same object id, e.g. a newer copy of the object.
+        """
+        existing_obj = self._iid_to_object_map[iid]
+        if self._get_obj_id_fn(existing_obj) != self._get_obj_id_fn(obj):
+            raise ValueError("The object id of the new object differs from the object id of the existing object.")
+        # Assigning an existing key keeps its position
+        self._iid_to_object_map[iid] = obj
+
+    def reorder(self, iids: list[str]):
+        """
+        Orders the objects like the given iids, which must be all mapped iids.
+        """
+        self._iid_to_object_map = {iid: self._iid_to_object_map[iid] for iid in iids}
 
     def clear(self):
         self._iid_to_object_map = {}
         self._obj_id_to_iid_map = {}
-        self._objects = []
 
     def get_object_by_iid(self, iid: str) -> T:
         return self._iid_to_object_map[iid]
@@ -58,17 +75,17 @@ class TkIidObjSync:
         obj_id = self._get_obj_id_fn(obj)
         return self._obj_id_to_iid_map[obj_id]
 
+    def get_iid_by_object_id(self, obj_id: str) -> Optional[str]:
+        return self._obj_id_to_iid_map.get(obj_id, None)
+
     def get_all_objects(self) -> list[T]:
-        return self._objects
+        return list(self._iid_to_object_map.values())
 
     def get_all_item_iids(self) -> list[str]:
         return list(self._iid_to_object_map.keys())
 
     def is_empty(self) -> bool:
-        return len(self._objects) == 0
+        return len(self._iid_to_object_map) == 0
 
     def get_last_iid(self) -> Optional[str]:
-        iids = self.get_all_item_iids()
-        if len(iids) > 0:
-            return iids[-1]
-        return None
+        return next(reversed(self._iid_to_object_map), None)
@@ -1,11 +1,16 @@
+import itertools
 import logging
 import sys
+import time
+from concurrent.futures import Future
 from queue import Queue, Empty
-from threading import Thread
 from tkinter import Tk, messagebox
 from typing import Callable, Optional, Any
 
 from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.config import Config
+from naevpm.core.progress import Progress
+from naevpm.core.task_scheduler import TaskScheduler, TaskKind, TaskPriority
 
 logger = logging.getLogger(__name__)
 
@@ -13,22 +18,33 @@ logger = logging.getLogger(__name__)
 class ThreadCommunication(AbstractCommunication):
     _root: Tk
     _queue: Queue
+    _progress_queue: Queue
+    _threaded_task: 'ThreadedTask'
 
     # assuming variable read / writes are atomic in Python
     closed = False
 
-    def __init__(self, root: Tk, queue: Queue):
+    def __init__(self, root: Tk, queue: Queue, progress_queue: Queue, threaded_task: 'ThreadedTask'):
         self._root = root
         self._queue = queue
+        self._progress_queue = progress_queue
+        self._threaded_task = threaded_task
 
-    def message(self, msg: str, delay: bool = False):
+    def message(self, msg: str, delay: bool = False, level: int = logging.INFO):
         if not self.closed:
             # queue is thread safe
-            self._queue.put(msg)
+            self._queue.put((msg, level))
             if not delay:
                 # Assuming the event system of tkinter is thread safe
                 self._root.event_generate('<<ThreadedTask.RequestGuiUpdate>>')
 
+    def progress(self, progress: Progress):
+        if not self.closed:
+            # queue is thread safe
+            self._progress_queue.put((self._threaded_task, progress))
+            # Assuming the event system of tkinter is thread safe
+            self._root.event_generate('<<ThreadedTask.RequestGuiUpdate>>')
+
     # def request_gui_update(self):
     #     if not self.closed:
     #         # Assuming the event system of tkinter is thread safe
@@ -36,87 +52,163 @@ class ThreadCommunication(AbstractCommunication):
 
 
 class ThreadedTask:
-    thread: Thread
+    id: int
+    future: Future
     communication: ThreadCommunication
     label: str
+    # Cancels the task while it is running, e.g. by setting an event the task checks
+    cancel_fn: Optional[Callable[[], None]]
     completion_callback: Callable[[Optional[Any], Optional[Exception]], None]
     return_value: Optional[Any]
     exception: Exception
 
 
 class TkThreading:
+    # Maximum time spent on processing queued messages before giving tkinter the chance to redraw
+    FRAME_TIME_BUDGET = 0.016
+
     _root: Tk
     _queue: Queue
+    # Progress reports of (threaded task, progress)
+    _progress_queue: Queue
     _threaded_tasks: list[ThreadedTask]
-    _update_gui_fn: Optional[Callable[[str], None]]
-    _detect_completed_task_schedule: Optional[str] = None
+    _task_ids: itertools.count
+    _update_gui_fn: Optional[Callable[[str, int], None]]
+    _update_progress_fn: Optional[Callable[[ThreadedTask, Optional[Progress]], None]]
+    _task_scheduler: TaskScheduler
+    # Tasks are put here by the worker threads when they are done and taken out by the GUI thread
+    _completed_tasks: Queue
+    # assuming variable read / writes are atomic in Python
+    _completed_event_pending: bool = False
+    _process_queue_scheduled: bool = False
+    _closed: bool = False
 
-    def __init__(self, root: Tk):
+    def __init__(self, root: Tk, network_workers: int = Config.NETWORK_WORKERS,
+                 disk_workers: int = Config.DISK_WORKERS):
         super().__init__()
         self._root = root
         self._queue = Queue()
+        self._progress_queue = Queue()
         self._threaded_tasks = []
+        self._task_ids = itertools.count()
         self._update_gui_fn = None
+        self._update_progress_fn = None
+        self._task_scheduler = TaskScheduler(network_workers, disk_workers)
+        self._completed_tasks = Queue()
 
         root.bind('<<ThreadedTask.RequestGuiUpdate>>', self._process_queue)
+        root.bind('<<ThreadedTask.Completed>>', self._process_completed_tasks)
 
-    def set_update_gui_fn(self, update_gui_fn: Callable[[str], None]):
+    def set_update_gui_fn(self, update_gui_fn: Callable[[str, int], None]):
         self._update_gui_fn = update_gui_fn
 
+    def set_update_progress_fn(self, update_progress_fn: Callable[[ThreadedTask, Optional[Progress]], None]):
+        """
+        @param update_progress_fn: Called with the latest progress of each transfer or job of a task. Called with None
+        when the task is done.
+        """
+        self._update_progress_fn = update_progress_fn
+
     # noinspection PyUnusedLocal
     def _process_queue(self, ev=None) -> None:
         """
+        Processes all queued messages. If that takes longer than the time budget of a frame, the rest is processed
+        after tkinter had the chance to redraw.
+
         @param ev: Is only set when function is called by the tkinter event system
         """
-        try:
-            msg = self._queue.get_nowait()
+        if ev is None:
+            self._process_queue_scheduled = False
+        self._process_progress_queue()
+        deadline = time.perf_counter() + self.FRAME_TIME_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                msg, level = self._queue.get_nowait()
+            except Empty:
+                return
 
-            logger.info(msg)
+            logger.log(level, msg)
 
             # Update GUI
             if self._update_gui_fn is not None:
-                self._update_gui_fn(msg)
-
-            # In case the task added multiple queue events to process without requesting immediate GUI update,
-            # schedule this function in the next loop otherwise the additional
-            # queue items are never processed
-            if self._queue.qsize() > 0:
-                # Process another queue event in the next loop
-                self._root.after(100, self._process_queue)
-        except Empty:
-            pass
-
-    def _detect_completed_tasks(self):
+                self._update_gui_fn(msg, level)
+
+        if not self._process_queue_scheduled:
+            self._process_queue_scheduled = True
+            # Idle callbacks added now run after the pending redraw
+            self._root.after_idle(self._process_queue)
+
+    def _process_progress_queue(self):
+        # Only the latest progress of each transfer or job of a task is shown
+        latest_progress: dict[tuple[int, str], tuple[ThreadedTask, Progress]] = {}
+        while True:
+            try:
+                threaded_task, progress = self._progress_queue.get_nowait()
+            except Empty:
+                break
+            latest_progress[(threaded_task.id, progress.label)] = (threaded_task, progress)
+        if self._update_progress_fn is not None:
+            for threaded_task, progress in latest_progress.values():
+                self._update_progress_fn(threaded_task, progress)
+
+    def _on_task_done(self, threaded_task: ThreadedTask):
+        """
+        Called by the thread that completed or cancelled the task.
+        """
+        if self._closed:
+            return
+        self._completed_tasks.put(threaded_task)
+        # One event is enough for all tasks that complete until it is processed
+        if not self._completed_event_pending:
+            self._completed_event_pending = True
+            # Assuming the event system of tkinter is thread safe. The event is queued, so the callbacks never run
+            # inside of run_threaded_task even if the task was already done.
+            self._root.event_generate('<<ThreadedTask.Completed>>', when='tail')
+
+    # noinspection PyUnusedLocal
+    def _process_completed_tasks(self, ev=None):
+        # Reset before taking tasks out of the queue. A task put after this point generates a new event.
+        self._completed_event_pending = False
+        # Messages of the tasks appear before the results of the tasks
+        self._process_queue(ev)
         completed_threaded_tasks = []
-        for threaded_task in self._threaded_tasks:
-            if not threaded_task.thread.is_alive():
-                completed_threaded_tasks.append(threaded_task)
+        while True:
+            try:
+                completed_threaded_tasks.append(self._completed_tasks.get_nowait())
+            except Empty:
+                break
         for completed_threaded_task in completed_threaded_tasks:
             self._threaded_tasks.remove(completed_threaded_task)
-        if len(self._threaded_tasks) > 0:
-            self._detect_completed_task_schedule = self._root.after(100, self._detect_completed_tasks)
-        else:
-            self._detect_completed_task_schedule = None
-        # loop a second time over completed tasks to run the callbacks that can throw exceptions.
+            if self._update_progress_fn is not None:
+                self._update_progress_fn(completed_threaded_task, None)
         # Even if a callback throws an error, continue calling the callbacks.
         for completed_threaded_task in completed_threaded_tasks:
-            if completed_threaded_task is not None:
-                # noinspection PyBroadException
-                try:
-                    completed_threaded_task.completion_callback(
-                        completed_threaded_task.return_value,
-                        completed_threaded_task.exception)
-                except Exception:
-                    self._root.report_callback_exception(*sys.exc_info())
+            # Cancelled tasks never ran
+            if completed_threaded_task.future.cancelled() or completed_threaded_task.completion_callback is None:
+                continue
+            # noinspection PyBroadException
+            try:
+                completed_threaded_task.completion_callback(
+                    completed_threaded_task.return_value,
+                    completed_threaded_task.exception)
+            except Exception:
+                self._root.report_callback_exception(*sys.exc_info())
 
     def run_threaded_task(self, label: str, threaded_task_fn: Callable[[ThreadCommunication], Any],
-                          completion_callback: Optional[Callable[[Optional[Any], Optional[Exception]], None]] = None):
-        if self._detect_completed_task_schedule is None:
-            self._detect_completed_task_schedule = self._root.after(100, self._detect_completed_tasks)
-
-        comm = ThreadCommunication(self._root, self._queue)
+                          completion_callback: Optional[Callable[[Optional[Any], Optional[Exception]], None]] = None,
+                          kind: TaskKind = TaskKind.DISK,
+                          priority: TaskPriority = TaskPriority.INTERACTIVE,
+                          cancel_fn: Optional[Callable[[], None]] = None) -> ThreadedTask:
+        """
+        Queues the task on the worker pool of its kind. Queued interactive tasks start before background tasks.
+        The completion callback is called in the GUI thread as soon as the task is done.
 
+        @param cancel_fn: Offered to the user next to the progress of the task
+        @return: Cancelling the future of the task drops it if it has not started yet. Its completion callback is
+        not called then.
+        """
         t = ThreadedTask()
+        comm = ThreadCommunication(self._root, self._queue, self._progress_queue, t)
 
         def top_level_exception_handler(c: ThreadCommunication):
             try:
@@ -124,17 +216,17 @@ class TkThreading:
             except Exception as e:
                 t.exception = e
 
-        thread = Thread(target=top_level_exception_handler, args=[comm])
-
+        t.id = next(self._task_ids)
         t.label = label
+        t.cancel_fn = cancel_fn
         t.communication = comm
-        t.thread = thread
         t.completion_callback = completion_callback
         t.exception = None
         t.return_value = None
         self._threaded_tasks.append(t)
-
-        thread.start()
+        t.future = self._task_scheduler.submit(lambda: top_level_exception_handler(comm), kind, priority)
+        t.future.add_done_callback(lambda future: self._on_task_done(t))
+        return t
 
     def close(self) -> bool:
         """
@@ -144,11 +236,15 @@ class TkThreading:
         @return: True if GUI can continue to close, False if it should not close
         """
         for threaded_background_task in self._threaded_tasks:
-            if threaded_background_task.thread.is_alive():
+            if threaded_background_task.future.running():
                 yes = messagebox.askyesno("Running background task",
                                           f"Background task '{threaded_background_task.label}' is still running. "
                                           f"Ignore?")
                 if not yes:
                     return False
-                threaded_background_task.communication.closed = True
+        self._closed = True
+        for threaded_background_task in self._threaded_tasks:
+            threaded_background_task.communication.closed = True
+        # Tasks which did not start yet are dropped
+        self._task_scheduler.shutdown(wait=False)
         return True
@@ -0,0 +1,213 @@
+from tkinter import ttk
+from typing import Callable, TypeVar, Optional
+
+from naevpm.gui.synced_tree_view import SyncedTreeView
+
+T = TypeVar('T')
+
+
+class VirtualSyncedTreeView(SyncedTreeView[T]):
+    """
+    Synced tree view which only inserts the rows of the visible viewport plus a buffer above and below it. Rows are
+    read in pages with get_page_fn whenever the viewport comes close to the first or last inserted row, so the number
+    of Tk items stays the same no matter how many objects there are.
+
+    Only inserted rows have an iid. Selection, focus and the context menu work through get_object_by_iid as usual.
+    The selection is kept by object identifier when the inserted rows change. With several selected rows, only the
+    first one is kept when it is no longer inserted.
+
+    The scrollbar is driven by the position in all rows and not only the inserted rows. Set its command to yview of
+    this tree view and pass its set method to set_scroll_command.
+    """
+    # Rows inserted above and below the viewport
+    BUFFER_ROWS = 100
+    # Used until the tree view is mapped and the style can be looked up
+    DEFAULT_ROW_HEIGHT = 20
+
+    _count_fn: Callable[[], int]
+    _get_page_fn: Callable[[int, int], list[T]]
+    _scroll_command: Optional[Callable[[float, float], None]]
+    # Number of all rows
+    _total: int
+    # Position of the first inserted row in all rows
+    _window_start: int
+    # Position of the first visible row in all rows
+    _top: int
+    _visible_rows: int
+    # Identifier of the selected object, which might not be inserted
+    _selected_id: Optional[str]
+
+    def __init__(self, get_str_values_fn: Callable[[T], list[str]], get_object_identifier_fn: Callable[[T], str],
+                 count_fn: Callable[[], int], get_page_fn: Callable[[int, int], list[T]], master, takefocus=True,
+                 **kw):
+        super().__init__(get_str_values_fn, get_object_identifier_fn, master, takefocus=takefocus, **kw)
+        self._count_fn = count_fn
+        self._get_page_fn = get_page_fn
+        self._scroll_command = None
+        self._total = 0
+        self._window_start = 0
+        self._top = 0
+        self._visible_rows = 1
+        self._selected_id = None
+
+        # The Treeview scrolls through the inserted rows on its own when using the mouse wheel or the keyboard
+        super().configure(yscrollcommand=self._on_view_scrolled)
+        # Own binding tag, so bindings of the users of this tree view do not replace these bindings
+        binding_tag = f'{self}.virtual'
+        self.bindtags((binding_tag,) + self.bindtags())
+        self.bind_class(binding_tag, '<Configure>', lambda ev: self._on_resize(ev.height))
+        self.bind_class(binding_tag, '<<TreeviewSelect>>', lambda ev: self._remember_selection())
+
+    def set_scroll_command(self, scroll_command: Callable[[float, float], None]):
+        self._scroll_command = scroll_command
+        self._update_scrollbar()
+
+    def yview(self, *args):
+        """
+        Scrolls through all rows. Meant as command of the scrollbar.
+        """
+        if len(args) == 0:
+            return self._get_fractions()
+        if args[0] == 'moveto':
+            self._scroll_to(int(float(args[1]) * self._total))
+        elif args[0] == 'scroll':
+            if args[2] == 'pages':
+                self._scroll_to(self._top + int(args[1]) * self._visible_rows)
+            else:
+                self._scroll_to(self._top + int(args[1]))
+
+    def _get_fractions(self) -> tuple[float, float]:
+        if self._total == 0:
+            return 0.0, 1.0
+        return self._top / self._total, min(1.0, (self._top + self._visible_rows) / self._total)
+
+    def _update_scrollbar(self):
+        if self._scroll_command is not None:
+            self._scroll_command(*self._get_fractions())
+
+    def _get_row_height(self) -> int:
+        row_height = ttk.Style(self).lookup('Treeview', 'rowheight')
+        if row_height in ('', None):
+            return self.DEFAULT_ROW_HEIGHT
+        return int(row_height)
+
+    def _on_resize(self, height: int):
+        # The heading takes about one row
+        visible_rows = max(1, height // self._get_row_height() - 1)
+        if visible_rows != self._visible_rows:
+            self._visible_rows = visible_rows
+            self._scroll_to(self._top)
+
+    def _on_view_scrolled(self, first: str, last: str):
+        window_size = len(self.get_children())
+        if window_size > 0:
+            self._top = self._window_start + round(float(first) * window_size)
+        if self._is_close_to_window_edge(self._top):
+            self._move_window(self._top)
+        self._update_scrollbar()
+
+    def _is_close_to_window_edge(self, top: int) -> bool:
+        margin = self.BUFFER_ROWS // 2
+        window_end = self._window_start + len(self.get_children())
+        return (self._window_start > 0 and top - self._window_start < margin) or \
+            (window_end < self._total and window_end - (top + self._visible_rows) < margin)
+
+    def _clamp(self, top: int) -> int:
+        return max(0, min(top, self._total - self._visible_rows))
+
+    def _scroll_to(self, top: int):
+        top = self._clamp(top)
+        if self._is_close_to_window_edge(top):
+            self._move_window(top)
+        else:
+            self._top = top
+            self._show_top()
+        self._update_scrollbar()
+
+    def _show_top(self):
+        window_size = len(self.get_children())
+        if window_size > 0:
+            # A quarter row more, so the fraction lands inside the row regardless of rounding
+            super().yview_moveto((self._top - self._window_start + 0.25) / window_size)
+
+    def _move_window(self, top: int):
+        """
+        Replaces the inserted rows with the rows around top.
+        """
+        top = self._clamp(top)
+        window_start = max(0, top - self.BUFFER_ROWS)
+        objects = self._get_page_fn(window_start, self._visible_rows + 2 * self.BUFFER_ROWS)
+
+        # Rows which stay inserted keep their iid, selection and focus
+        self._reconcile(objects)
+        self._window_start = window_start
+        self._top = top
+        if len(self.selection()) == 0 and self._selected_id is not None:
+            # The selected row scrolled back into the inserted rows
+            selected_iid = self._sync.get_iid_by_object_id(self._selected_id)
+            if selected_iid is not None:
+                self.selection_set(selected_iid)
+        self._show_top()
+
+    def _remember_selection(self):
+        # An empty selection means the selected row is not inserted right now
+        selected_obj = self.get_selected_object()
+        if selected_obj is not None:
+            self._selected_id = self._get_object_identifier_fn(selected_obj)
+
+    def sync_refresh(self):
+        """
+        Reads the number of rows and the rows around the viewport again.
+        """
+        self._total = self._count_fn()
+        if self._selected_id is None and self._total > 0:
+            self._selected_id = self._get_object_identifier_fn(self._get_page_fn(0, 1)[0])
+        self._move_window(self._top)
+        self._update_scrollbar()
+
+    def sync_put(self, obj: T):
+        self._selected_id = self._get_object_identifier_fn(obj)
+        self.sync_refresh()
+
+    def sync_put_all(self, objects: list[T]):
+        """
+        Same as sync_refresh. The given objects are not used, as the rows are read with get_page_fn.
+        """
+        self.sync_refresh()
+
+    def sync_clear(self):
+        super().sync_clear()
+        self._total = 0
+        self._window_start = 0
+        self._top = 0
+        self._update_scrollbar()
+
+    def sync_update(self, obj: T):
+        try:
+            iid = self._sync.get_iid_by_object(obj)
+        except KeyError:
+            # Not inserted. The row is read again when it scrolls into view.
+            return
+        # The inserted object might be another copy of the same object
+        self._sync.replace(iid, obj)
+        self.item(iid, values=self._get_str_values_fn(obj))
+
+    def sync_remove(self, obj: T):
+        try:
+            iid = self._sync.get_iid_by_object(obj)
+        except KeyError:
+            iid = None
+        if iid is not None and self._get_object_identifier_fn(obj) == self._selected_id:
+            sibling = self.prev(iid)
+            if sibling == '':
+                sibling = self.next(iid)
+            self._selected_id = None
+            if sibling != '':
+                self._selected_id = self._get_object_identifier_fn(self.get_object_by_iid(sibling))
+        self.sync_refresh()
+
+    def get_all_objects(self) -> list[T]:
+        return self._get_page_fn(0, self._count_fn())
+
+    def is_empty(self) -> bool:
+        return self._total == 0
@@ -0,0 +1,10 @@
+from naevpm.core.config import Config
+
+
+class TempDirConfig(Config):
+    """
+    Config of the tests, with all data in temp/.
+    """
+
+    def __init__(self, ):
+        super().__init__("temp/naev-package-manager", "temp/naev")
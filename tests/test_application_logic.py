@@ -0,0 +1,332 @@
+import logging
+import os
+import shutil
+import unittest
+import zipfile
+from hashlib import sha256
+from threading import Event
+from typing import Optional
+
+from benchmarks import fixtures
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.application_logic import ApplicationLogic, PluginBatchAction
+from naevpm.core.config import Config
+from naevpm.core.manifest import Manifest, ManifestEntry, ApplyAction
+from naevpm.core.models import RegistryDbModel, RegistryPluginMetaDataModel, PluginState, IndexedPluginDbModel
+from naevpm.core.plugin_workflows.plugin_workflow import PluginContentHashMismatch, VerifyStatus
+from naevpm.core.progress import Progress
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.core.timing import Timings
+from tests.temp_dir_config import TempDirConfig
+
+
+class ProgressCommunication(AbstractCommunication):
+    progress_reports: list[tuple[int, int, bool]]
+
+    def __init__(self):
+        super().__init__()
+        self.progress_reports = []
+
+    def progress(self, progress: Progress):
+        self.progress_reports.append((progress.done, progress.total, progress.finished))
+
+
+class TestApplicationLogic(unittest.TestCase):
+
+    def test_lock_and_verify(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/naev'):
+            shutil.rmtree('temp/naev')
+        if os.path.exists('temp/verify-test'):
+            shutil.rmtree('temp/verify-test')
+
+        config = TempDirConfig()
+        os.makedirs(config.NAEV_PLUGIN_DIR)
+        os.makedirs('temp/verify-test')
+        sources = [f'temp/verify-test/plugin{i}.zip' for i in range(3)]
+        for source in sources:
+            with zipfile.ZipFile(source, 'w') as z:
+                z.write('tests/test-resources/git-plugin-test/plugin.xml', 'plugin.xml')
+                z.writestr('id.txt', source)
+
+        database_connector = SqliteDatabaseConnector(config.DATABASE)
+        application_logic = ApplicationLogic(database_connector, config)
+        database_connector.add_registry(RegistryDbModel('registry1'))
+        for i, source in enumerate(sources):
+            database_connector.index_plugin('registry1', RegistryPluginMetaDataModel(f'name{i}', source))
+        tc = AbstractCommunication()
+        plugins = [application_logic.get_plugin(source) for source in sources[:2]]
+        application_logic.run_plugin_batch(PluginBatchAction.FETCH, plugins, tc)
+        application_logic.run_plugin_batch(PluginBatchAction.INSTALL, plugins, tc)
+
+        # Only installed plugins are locked
+        manifest = application_logic.create_lockfile_manifest()
+        content_hashes = []
+        for source in sources[:2]:
+            with open(source, 'rb') as f:
+                content_hashes.append(sha256(f.read()).hexdigest())
+        self.assertEqual([(entry.source, entry.content_hash, entry.name) for entry in manifest.entries],
+                         [(sources[0], content_hashes[0], 'name0'), (sources[1], content_hashes[1], 'name1')])
+
+        results = application_logic.verify_manifest(manifest, tc)
+        self.assertEqual([result.status for result in results], [VerifyStatus.OK, VerifyStatus.OK])
+
+        # Tampering with an installed plugin is detected, even though its digest was cached
+        cache_location, install_location = application_logic.plugin_workflow_manager.get_locations(plugins[1])
+        with open(install_location, 'ab') as f:
+            f.write(b'tampered')
+        manifest.entries.append(ManifestEntry(sources[2], '0' * 64))
+        reported_results = []
+        results = application_logic.verify_manifest(manifest, tc, reported_results.append)
+        self.assertEqual([(result.source, result.status) for result in results], [
+            (sources[0], VerifyStatus.OK),
+            (sources[1], VerifyStatus.MISMATCH),
+            (sources[2], VerifyStatus.NOT_INSTALLED),
+        ])
+        self.assertEqual(len(reported_results), 3)
+        self.assertEqual(results[1].expected_content_hash, content_hashes[1])
+        self.assertNotEqual(results[1].actual_content_hash, content_hashes[1])
+
+    def test_plugin_batch(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/naev'):
+            shutil.rmtree('temp/naev')
+        if os.path.exists('temp/batch-test'):
+            shutil.rmtree('temp/batch-test')
+
+        config = TempDirConfig()
+        os.makedirs(config.NAEV_PLUGIN_DIR)
+        os.makedirs('temp/batch-test')
+        sources = [f'temp/batch-test/plugin{i}.zip' for i in range(4)]
+        for source in sources[:3]:
+            with zipfile.ZipFile(source, 'w') as z:
+                z.write('tests/test-resources/git-plugin-test/plugin.xml', 'plugin.xml')
+
+        database_connector = SqliteDatabaseConnector(config.DATABASE)
+        application_logic = ApplicationLogic(database_connector, config)
+        database_connector.add_registry(RegistryDbModel('registry1'))
+        for i, source in enumerate(sources):
+            database_connector.index_plugin('registry1', RegistryPluginMetaDataModel(f'name{i}', source))
+        plugins = [database_connector.get_plugin(source) for source in sources]
+
+        # A chunk which fails to save is rolled back. Its plugins are not reported and keep their state.
+        manager = application_logic.plugin_workflow_manager
+        save_fetched_plugin = manager.save_fetched_plugin
+
+        def failing_save_fetched_plugin(plugin: IndexedPluginDbModel, tc: AbstractCommunication):
+            save_fetched_plugin(plugin, tc)
+            if plugin.source == sources[1]:
+                raise Exception('failed')
+
+        manager.save_fetched_plugin = failing_save_fetched_plugin
+        self.assertEqual(application_logic.run_plugin_batch(PluginBatchAction.FETCH, plugins[:2],
+                                                            AbstractCommunication()), [])
+        self.assertEqual([plugin.state for plugin in plugins], [PluginState.INDEXED] * 4)
+        self.assertEqual([database_connector.get_plugin(source).state for source in sources],
+                         [PluginState.INDEXED] * 4)
+        del manager.save_fetched_plugin
+
+        # The zip of the last plugin does not exist. It fails without stopping the batch.
+        tc = ProgressCommunication()
+        fetched_plugins = application_logic.run_plugin_batch(PluginBatchAction.FETCH, plugins, tc)
+        self.assertEqual(fetched_plugins, plugins[:3])
+        self.assertEqual(tc.progress_reports, [(0, 4, False), (1, 4, False), (2, 4, False), (3, 4, False),
+                                               (4, 4, False), (4, 4, True)])
+        self.assertFalse(database_connector.db.in_transaction)
+        self.assertEqual([database_connector.get_plugin(source).state for source in sources],
+                         [PluginState.CACHED] * 3 + [PluginState.INDEXED])
+        self.assertEqual(application_logic.get_plugin_metadata(plugins[0], tc).name, 'Test Plugin')
+
+        # The files are written outside of transactions, so other threads can write meanwhile
+        class TransactionCommunication(AbstractCommunication):
+            in_transaction_messages: list[str]
+
+            def __init__(self):
+                super().__init__()
+                self.in_transaction_messages = []
+
+            def message(self, msg: str, delay: bool = False, level: int = logging.INFO):
+                if msg.startswith('Installing:') and database_connector.db.in_transaction:
+                    self.in_transaction_messages.append(msg)
+
+        tc = TransactionCommunication()
+        application_logic.run_plugin_batch(PluginBatchAction.INSTALL, plugins[1:3], tc)
+        self.assertEqual(tc.in_transaction_messages, [])
+        application_logic.run_plugin_batch(PluginBatchAction.UNINSTALL, plugins[1:3], tc)
+
+        # Plugins in other states are skipped. Cancelling skips the remaining plugins and commits the handled ones.
+        cancel_event = Event()
+
+        class CancellingCommunication(ProgressCommunication):
+            def progress(self, progress: Progress):
+                super().progress(progress)
+                if progress.done == 1:
+                    cancel_event.set()
+
+        tc = CancellingCommunication()
+        installed_plugins = application_logic.run_plugin_batch(PluginBatchAction.INSTALL, plugins, tc, cancel_event)
+        self.assertEqual(installed_plugins, plugins[:1])
+        self.assertEqual(tc.progress_reports, [(0, 3, False), (1, 3, False), (1, 3, True)])
+        self.assertEqual([database_connector.get_plugin(source).state for source in sources],
+                         [PluginState.INSTALLED, PluginState.CACHED, PluginState.CACHED, PluginState.INDEXED])
+
+        uninstalled_plugins = application_logic.run_plugin_batch(PluginBatchAction.UNINSTALL, plugins,
+                                                                 AbstractCommunication())
+        self.assertEqual(uninstalled_plugins, plugins[:1])
+        deleted_plugins = application_logic.run_plugin_batch(PluginBatchAction.DELETE, plugins,
+                                                             AbstractCommunication())
+        self.assertEqual(deleted_plugins, plugins[:3])
+        self.assertEqual([database_connector.get_plugin(source).state for source in sources],
+                         [PluginState.INDEXED] * 4)
+
+    def test_missing_plugin_metadata(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/metadata-test'):
+            shutil.rmtree('temp/metadata-test')
+
+        config = TempDirConfig()
+        os.makedirs('temp/metadata-test')
+        source = 'temp/metadata-test/plugin.zip'
+        with zipfile.ZipFile(source, 'w') as z:
+            z.writestr('id.txt', source)
+
+        database_connector = SqliteDatabaseConnector(config.DATABASE)
+        timings = Timings(enabled=True)
+        application_logic = ApplicationLogic(database_connector, config, timings)
+        database_connector.add_registry(RegistryDbModel('registry1'))
+        database_connector.index_plugin('registry1', RegistryPluginMetaDataModel('name', source))
+        tc = AbstractCommunication()
+        application_logic.fetch_plugin(application_logic.get_plugin(source), tc)
+        commits = []
+        database_connector.add_commit_listener(commits.append)
+
+        # The content without plugin.xml is parsed once. Looking it up again neither parses nor commits.
+        plugin = application_logic.get_plugin(source)
+        for i in range(3):
+            self.assertIsNone(application_logic.get_plugin_metadata(plugin, tc))
+        parse_stats = [stats for stats in timings.get_stats() if stats.name == 'plugin.parse_metadata']
+        self.assertEqual(parse_stats[0].count, 1)
+        self.assertEqual(commits, [])
+
+        # Changed content is parsed again
+        with zipfile.ZipFile('temp/metadata-test/changed.zip', 'w') as z:
+            z.write('tests/test-resources/git-plugin-test/plugin.xml', 'plugin.xml')
+        cache_location = application_logic.plugin_workflow_manager.get_locations(plugin)[0]
+        os.remove(cache_location)
+        shutil.copyfile('temp/metadata-test/changed.zip', cache_location)
+        self.assertEqual(application_logic.get_plugin_metadata(plugin, tc).name, 'Test Plugin')
+        self.assertIsNone(database_connector.get_plugin_metadata_missing_hash(source))
+
+    def test_fetch_after_index_import(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/index-import-test'):
+            shutil.rmtree('temp/index-import-test')
+
+        registry_source = os.path.abspath('temp/index-import-test/registry')
+        fixtures.create_registry(registry_source, {f'name{i}': f'source{i}' for i in range(3)})
+        tc = AbstractCommunication()
+        exporting_logic = ApplicationLogic(SqliteDatabaseConnector(TempDirConfig().DATABASE), TempDirConfig())
+        registry = exporting_logic.add_registry(registry_source, tc)
+        exporting_logic.fetch_registry_plugin_metadatas(registry, tc)
+        exporting_logic.export_index('temp/index-import-test/index.db', tc)
+
+        config = Config('temp/index-import-test/naev-package-manager', 'temp/index-import-test/naev')
+        timings = Timings(enabled=True)
+        application_logic = ApplicationLogic(SqliteDatabaseConnector(config.DATABASE), config, timings)
+        application_logic.import_index('temp/index-import-test/index.db', tc)
+
+        # The HEAD of the registry is unchanged since the export, so its plugin XMLs are not read again
+        application_logic.fetch_registry_plugin_metadatas(application_logic.get_registry(registry_source), tc)
+        self.assertEqual([stats.name for stats in timings.get_stats() if stats.name.startswith('registry.')],
+                         ['registry.fetch', 'registry.sync', 'registry.save'])
+        self.assertEqual(len(application_logic.get_plugins()), 3)
+
+    def test_apply_manifest(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/naev'):
+            shutil.rmtree('temp/naev')
+        if os.path.exists('temp/apply-test'):
+            shutil.rmtree('temp/apply-test')
+
+        config = TempDirConfig()
+        os.makedirs(config.NAEV_PLUGIN_DIR)
+        os.makedirs('temp/apply-test')
+        sources = [f'temp/apply-test/plugin{i}.zip' for i in range(4)]
+        for source in sources:
+            with zipfile.ZipFile(source, 'w') as z:
+                z.write('tests/test-resources/git-plugin-test/plugin.xml', 'plugin.xml')
+                z.writestr('id.txt', source)
+
+        database_connector = SqliteDatabaseConnector(config.DATABASE)
+        application_logic = ApplicationLogic(database_connector, config)
+        database_connector.add_registry(RegistryDbModel('registry1'))
+        for i, source in enumerate(sources):
+            database_connector.index_plugin('registry1', RegistryPluginMetaDataModel(f'name{i}', source))
+        tc = AbstractCommunication()
+        # Installed, but not in the manifest
+        application_logic.run_plugin_batch(PluginBatchAction.FETCH, [application_logic.get_plugin(sources[3])], tc)
+        application_logic.run_plugin_batch(PluginBatchAction.INSTALL, [application_logic.get_plugin(sources[3])], tc)
+
+        with open(sources[0], 'rb') as f:
+            content_hash = sha256(f.read()).hexdigest()
+        manifest = Manifest([
+            ManifestEntry(sources[0], content_hash),
+            ManifestEntry(sources[1]),
+            ManifestEntry(sources[2], '0' * 64),
+            ManifestEntry('temp/apply-test/not-indexed.zip'),
+        ])
+        plan = application_logic.plan_manifest(manifest)
+        self.assertEqual(plan.missing_sources, ['temp/apply-test/not-indexed.zip'])
+        self.assertEqual({plugin_plan.plugin.source: plugin_plan.actions for plugin_plan in plan.plugin_plans}, {
+            sources[0]: [ApplyAction.FETCH, ApplyAction.INSTALL],
+            sources[1]: [ApplyAction.FETCH, ApplyAction.INSTALL],
+            sources[2]: [ApplyAction.FETCH, ApplyAction.INSTALL],
+            sources[3]: [ApplyAction.UNINSTALL],
+        })
+
+        results = {}
+
+        def on_item_done(source: str, e: Optional[Exception]):
+            results[source] = e
+
+        succeeded_plugins = application_logic.apply_plan(plan, tc, on_item_done)
+        self.assertEqual({plugin.source for plugin in succeeded_plugins}, {sources[0], sources[1], sources[3]})
+        self.assertIsInstance(results[sources[2]], PluginContentHashMismatch)
+        self.assertEqual([application_logic.get_plugin(source).state for source in sources],
+                         [PluginState.INSTALLED, PluginState.INSTALLED, PluginState.CACHED, PluginState.CACHED])
+
+        # Applying again only repeats what failed
+        plan = application_logic.plan_manifest(manifest)
+        self.assertEqual([(plugin_plan.plugin.source, plugin_plan.actions) for plugin_plan in plan.plugin_plans],
+                         [(sources[2], [ApplyAction.INSTALL])])
+
+        # A changed pin updates the installed plugin
+        with open(sources[1], 'rb') as f:
+            content_hash = sha256(f.read()).hexdigest()
+        manifest.entries[0].content_hash = content_hash
+        plan = application_logic.plan_manifest(manifest)
+        self.assertEqual([(plugin_plan.plugin.source, plugin_plan.actions) for plugin_plan in plan.plugin_plans],
+                         [(sources[0], [ApplyAction.UPDATE]), (sources[2], [ApplyAction.INSTALL])])
+
+        # The installed content is checked, not the cached one. Updating saves the plugin like update_plugin.
+        manifest.entries[0].content_hash = None
+        manifest.entries[1].content_hash = content_hash
+        plugin = application_logic.get_plugin(sources[1])
+        os.remove(application_logic.plugin_workflow_manager.get_locations(plugin)[1])
+        database_connector.set_plugin_update_available(sources[1], True)
+        plan = application_logic.plan_manifest(manifest)
+        self.assertEqual([(plugin_plan.plugin.source, plugin_plan.actions) for plugin_plan in plan.plugin_plans],
+                         [(sources[1], [ApplyAction.UPDATE]), (sources[2], [ApplyAction.INSTALL])])
+        plan.plugin_plans = plan.plugin_plans[:1]
+        self.assertEqual(application_logic.apply_plan(plan, tc), [plan.plugin_plans[0].plugin])
+        self.assertFalse(application_logic.get_plugin(sources[1]).update_available)
+        self.assertEqual(application_logic.plan_manifest(manifest).plugin_plans[0].plugin.source, sources[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
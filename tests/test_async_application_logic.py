@@ -0,0 +1,100 @@
+import asyncio
+import os
+import shutil
+import unittest
+from typing import Optional
+from unittest.mock import patch
+
+from benchmarks.fixtures import ZipServer, create_zip_plugin
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.application_logic import ApplicationLogic, PluginBatchAction
+from naevpm.core.async_application_logic import AsyncApplicationLogic, is_aiohttp_installed
+from naevpm.core.batch_saver import BatchSaver
+from naevpm.core.models import RegistryDbModel, RegistryPluginMetaDataModel, PluginState
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector, IndexChanges
+from tests.temp_dir_config import TempDirConfig
+
+
+class TestAsyncApplicationLogic(unittest.TestCase):
+    zip_dir = 'temp/async-test'
+
+    def setUp(self):
+        for path in ['temp/naev-package-manager', 'temp/naev', self.zip_dir]:
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        os.makedirs(self.zip_dir)
+        for i in range(3):
+            create_zip_plugin(os.path.join(self.zip_dir, f'plugin{i}.zip'), f'plugin{i}')
+
+    def test_fetch_and_check_remote_zips(self):
+        # Downloads with requests in the executor are always tested, with aiohttp only if installed
+        for use_aiohttp in [False, True] if is_aiohttp_installed() else [False]:
+            with self.subTest(use_aiohttp=use_aiohttp), ZipServer(self.zip_dir) as server:
+                self.setUp()
+                self.check_fetch_and_check(server, use_aiohttp)
+
+    def check_fetch_and_check(self, server: ZipServer, use_aiohttp: bool):
+        config = TempDirConfig()
+        os.makedirs(config.NAEV_PLUGIN_DIR)
+        database_connector = SqliteDatabaseConnector(config.DATABASE)
+        application_logic = ApplicationLogic(database_connector, config)
+        database_connector.add_registry(RegistryDbModel('registry1'))
+        sources = [server.url(f'plugin{i}.zip') for i in range(3)] + [server.url('missing.zip')]
+        for i, source in enumerate(sources):
+            database_connector.index_plugin('registry1', RegistryPluginMetaDataModel(f'name{i}', source))
+        tc = AbstractCommunication()
+        commits = [0]
+
+        def on_commit(changes: IndexChanges):
+            commits[0] += 1
+
+        database_connector.add_commit_listener(on_commit)
+        results: dict[str, Optional[Exception]] = {}
+
+        def on_item_done(source: str, e: Optional[Exception]):
+            results[source] = e
+
+        async def fetch_plugins():
+            # One operation at a time still handles all plugins
+            async with AsyncApplicationLogic(application_logic, max_concurrency=1,
+                                             use_aiohttp=use_aiohttp) as async_logic:
+                return await async_logic.fetch_plugins(application_logic.get_plugins(), tc, on_item_done)
+
+        fetched_plugins = asyncio.run(fetch_plugins())
+        self.assertEqual(sorted(plugin.source for plugin in fetched_plugins), sources[:3])
+        self.assertIsNone(results[sources[0]])
+        self.assertIsNotNone(results[sources[3]])
+        for source in sources[:3]:
+            self.assertEqual(application_logic.get_plugin(source).state, PluginState.CACHED)
+            self.assertIsNotNone(database_connector.get_plugin_metadata(source))
+        self.assertEqual(application_logic.get_plugin(sources[3]).state, PluginState.INDEXED)
+
+        application_logic.run_plugin_batch(PluginBatchAction.INSTALL, application_logic.get_plugins(), tc)
+        # The author publishes a new version of one plugin
+        create_zip_plugin(os.path.join(self.zip_dir, 'plugin1.zip'), 'plugin1', file_count=11)
+        results.clear()
+        commits[0] = 0
+        saved_when_done: list[Optional[bool]] = []
+
+        def on_check_done(source: str, e: Optional[Exception]):
+            on_item_done(source, e)
+            saved_when_done.append(database_connector.get_plugin(source).update_available)
+
+        async def check_plugins():
+            async with AsyncApplicationLogic(application_logic, max_concurrency=1,
+                                             use_aiohttp=use_aiohttp) as async_logic:
+                await async_logic.check_plugins(application_logic.get_plugins(), tc, on_check_done)
+
+        with patch.object(BatchSaver, 'CHUNK_SIZE', 1):
+            asyncio.run(check_plugins())
+        self.assertEqual(results, {source: None for source in sources[:3]})
+        self.assertEqual([application_logic.get_plugin(source).update_available for source in sources[:3]],
+                         [False, True, False])
+        # Each result is reported after it was saved, while the other plugins are still being checked
+        self.assertNotIn(None, saved_when_done)
+        self.assertGreater(commits[0], 1)
+        database_connector.db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
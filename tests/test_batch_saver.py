@@ -0,0 +1,72 @@
+import os
+import shutil
+import unittest
+from typing import Optional
+
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.batch_saver import BatchSaver
+from naevpm.core.models import RegistryDbModel
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector, IndexChanges
+from tests.temp_dir_config import TempDirConfig
+
+
+class TestBatchSaver(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        self.database_connector = SqliteDatabaseConnector(TempDirConfig().DATABASE)
+        self.commits = 0
+
+        def on_commit(changes: IndexChanges):
+            self.commits += 1
+
+        self.database_connector.add_commit_listener(on_commit)
+        self.reported: list[tuple[str, Optional[Exception]]] = []
+
+    def on_item_done(self, source: str, e: Optional[Exception]):
+        self.reported.append((source, e))
+
+    def add_registry(self, source: str):
+        return lambda: self.database_connector.add_registry(RegistryDbModel(source))
+
+    def test_chunks(self):
+        saver = BatchSaver(self.database_connector, AbstractCommunication(), self.on_item_done)
+        saver.CHUNK_SIZE = 2
+        saver.add('registry1', self.add_registry('registry1'))
+        # Nothing is saved or reported before the chunk is full
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(self.reported, [])
+        failure = Exception('failed')
+        saver.add_failed('registry2', failure)
+        saver.add('registry3', self.add_registry('registry3'))
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self.reported, [('registry2', failure), ('registry1', None), ('registry3', None)])
+        saver.add('registry4', self.add_registry('registry4'))
+        saver.flush()
+        self.assertEqual(self.commits, 2)
+        self.assertEqual([r.source for r in self.database_connector.get_registries()],
+                         ['registry1', 'registry3', 'registry4'])
+        # Flushing without pending items does not commit
+        saver.flush()
+        self.assertEqual(self.commits, 2)
+
+    def test_failing_save(self):
+        saver = BatchSaver(self.database_connector, AbstractCommunication(), self.on_item_done)
+        rolled_back = []
+        saver.add('registry1', self.add_registry('registry1'), lambda: rolled_back.append('registry1'))
+        # Already exists
+        saver.add('registry1', self.add_registry('registry1'))
+        saver.add('registry2', self.add_registry('registry2'), lambda: rolled_back.append('registry2'))
+        with self.assertRaises(Exception):
+            saver.flush()
+        # The chunk is rolled back and not saved again. Only the items whose save ran are rolled back.
+        self.assertEqual(self.database_connector.get_registries(), [])
+        self.assertEqual(self.reported, [])
+        self.assertEqual(rolled_back, ['registry1'])
+        saver.flush()
+        self.assertEqual(self.commits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
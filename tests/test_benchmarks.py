@@ -0,0 +1,39 @@
+import json
+import os
+import unittest
+
+from benchmarks.run import BenchmarkParams, run_benchmarks, write_results, compare_results, BENCHMARKS
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_run_benchmarks(self):
+        # Tiny fixtures, so the harness is checked without taking long
+        params = BenchmarkParams(registry_plugins=20, git_plugins=2, large_tree_files=20, zip_plugins=2, repeat=1)
+        results = run_benchmarks('temp/benchmarks-test', params)
+        self.assertEqual(list(results['benchmarks'].keys()), [benchmark.name for benchmark in BENCHMARKS])
+        for result in results['benchmarks'].values():
+            self.assertEqual(len(result['runs']), 1)
+            self.assertGreater(result['median'], 0)
+        self.assertEqual(results['params']['registry_plugins'], 20)
+
+        path = 'temp/benchmarks-test/results.json'
+        write_results(results, path)
+        with open(path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), results)
+
+        # Twice as slow is a regression, twice as fast is not
+        slower = json.loads(json.dumps(results))
+        faster = json.loads(json.dumps(results))
+        for name in results['benchmarks'].keys():
+            slower['benchmarks'][name]['median'] *= 2
+            faster['benchmarks'][name]['median'] /= 2
+        rows, regressions = compare_results(results, slower, 0.2)
+        self.assertEqual(regressions, list(results['benchmarks'].keys()))
+        rows, regressions = compare_results(results, faster, 0.2)
+        self.assertEqual(regressions, [])
+        self.assertTrue(os.path.exists('temp/benchmarks-test/fixtures/registry'))
+
+
+if __name__ == '__main__':
+    unittest.main()
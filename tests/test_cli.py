@@ -0,0 +1,80 @@
+import json
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import unittest
+
+from naevpm.core import models
+from naevpm.core.config import Config
+from naevpm.core.models import RegistryDbModel, RegistryPluginMetaDataModel
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+
+
+class TestCli(unittest.TestCase):
+    data_home = 'temp/cli'
+
+    def setUp(self):
+        if os.path.exists(self.data_home):
+            shutil.rmtree(self.data_home)
+        self.data_home = os.path.abspath(self.data_home)
+        # Same locations as the CLI uses with this XDG_DATA_HOME
+        config = Config(os.path.join(self.data_home, 'naev-package-manager'), os.path.join(self.data_home, 'naev'))
+        database_connector = SqliteDatabaseConnector(config.DATABASE)
+        database_connector.add_registry(RegistryDbModel('registry1'))
+        database_connector.index_plugin('registry1', RegistryPluginMetaDataModel('name0', 'source0', author='a\tb'))
+        database_connector.index_plugin('registry1', RegistryPluginMetaDataModel('name1', 'source1'))
+        database_connector.db.close()
+
+    def run_cli_process(self, *args: str) -> subprocess.CompletedProcess:
+        env = dict(os.environ)
+        env['XDG_DATA_HOME'] = self.data_home
+        completed_process = subprocess.run([sys.executable, '-m', 'naevpm.cli', *args], env=env, capture_output=True,
+                                           text=True)
+        self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+        return completed_process
+
+    def run_cli(self, *args: str) -> str:
+        return self.run_cli_process(*args).stdout
+
+    def test_plugin_list_jsonl(self):
+        records = [json.loads(line) for line in self.run_cli('plugin', 'list', '--format', 'jsonl').splitlines()]
+        self.assertEqual([record['source'] for record in records], ['source0', 'source1'])
+        self.assertEqual(list(records[0].keys()), models.indexed_plugin_fields)
+        self.assertEqual(records[0]['state'], 'INDEXED')
+        self.assertEqual(records[0]['author'], 'a\tb')
+        self.assertIsNone(records[0]['update_available'])
+
+    def test_plugin_list_tsv(self):
+        lines = self.run_cli('plugin', 'list', '--format', 'tsv').splitlines()
+        self.assertEqual(lines[0].split('\t'), models.indexed_plugin_fields)
+        self.assertEqual(len(lines), 3)
+        values = dict(zip(models.indexed_plugin_fields, lines[1].split('\t')))
+        # Tabs in values are escaped, so the columns stay aligned
+        self.assertEqual(values['author'], 'a\\tb')
+        self.assertEqual(values['registry_source'], 'registry1')
+
+    def test_registry_list_jsonl(self):
+        records = [json.loads(line) for line in self.run_cli('registry', 'list', '--format', 'jsonl').splitlines()]
+        self.assertEqual(records, [{'source': 'registry1', 'last_fetched': None}])
+
+    def test_timings_and_profile(self):
+        local_registry = os.path.join(self.data_home, 'naev-package-manager', 'registries', 'LOCAL')
+        self.run_cli('registry', 'add', local_registry)
+        profile_path = os.path.join(self.data_home, 'profile.out')
+        completed_process = self.run_cli_process('--timings', '--profile', profile_path, 'registry', 'fetch',
+                                                 local_registry)
+        self.assertIn('registry.fetch', completed_process.stderr)
+        self.assertIn('registry.read', completed_process.stderr)
+        self.assertIn('registry.save', completed_process.stderr)
+        stats = pstats.Stats(profile_path)
+        self.assertTrue(any(function_name == 'fetch_registry_plugin_metadatas'
+                            for file_name, line, function_name in stats.stats.keys()))
+        # Without the flag, nothing is timed
+        completed_process = self.run_cli_process('registry', 'fetch', local_registry)
+        self.assertNotIn('registry.fetch', completed_process.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+import unittest
+
+# Modules which are only needed by commands that touch git or the network
+HEAVY_MODULES = ['pygit2', 'requests', 'lxml']
+# Generous budgets, so slow CI machines do not fail. Regressions like importing pygit2 at startup exceed them anyway.
+IMPORT_TIME_BUDGET_US = 500_000
+WALL_CLOCK_BUDGET_S = 3.0
+
+
+def run_cli(data_home: str, *args: str) -> tuple[subprocess.CompletedProcess, float]:
+    env = dict(os.environ)
+    # appdirs puts the data of the package manager and of Naev here
+    env['XDG_DATA_HOME'] = data_home
+    # No config file of the user
+    env['XDG_CONFIG_HOME'] = data_home
+    start_time = time.perf_counter()
+    completed_process = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'naevpm.cli', *args],
+                                       env=env, capture_output=True, text=True)
+    return completed_process, time.perf_counter() - start_time
+
+
+def imported_modules(importtime_output: str) -> tuple[dict[str, int], int]:
+    """
+    @return: Cumulative import time in microseconds by module name and the total import time of all modules
+    """
+    modules = {}
+    total_time = 0
+    for line in importtime_output.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative_time, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative_time)
+        # Nested imports are indented. Their time is part of the cumulative time of the top level imports.
+        if not name[1:].startswith(' '):
+            total_time += int(cumulative_time)
+    return modules, total_time
+
+
+class TestCliStartup(unittest.TestCase):
+    data_home = 'temp/cli-startup'
+
+    def setUp(self):
+        if os.path.exists(self.data_home):
+            shutil.rmtree(self.data_home)
+        os.makedirs(self.data_home)
+        self.data_home = os.path.abspath(self.data_home)
+
+    def test_help(self):
+        completed_process, wall_clock_time = run_cli(self.data_home, '--help')
+        self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+        modules, total_import_time = imported_modules(completed_process.stderr)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, modules)
+        self.assertLess(total_import_time, IMPORT_TIME_BUDGET_US)
+        self.assertLess(wall_clock_time, WALL_CLOCK_BUDGET_S)
+        # Neither directories nor the DB are created
+        self.assertEqual(os.listdir(self.data_home), [])
+
+    def test_plugin_list(self):
+        completed_process, wall_clock_time = run_cli(self.data_home, 'plugin', 'list')
+        self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+        modules, total_import_time = imported_modules(completed_process.stderr)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, modules)
+        self.assertLess(wall_clock_time, WALL_CLOCK_BUDGET_S)
+        # The index of a fresh installation is empty, so the table only has its header. Neither directories nor the DB
+        # are created.
+        self.assertEqual(len(completed_process.stdout.splitlines()), 2)
+        self.assertEqual(os.listdir(self.data_home), [])
+
+    def test_registry_list(self):
+        completed_process, wall_clock_time = run_cli(self.data_home, 'registry', 'list', '--format', 'jsonl')
+        self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+        self.assertEqual(completed_process.stdout, '')
+        self.assertEqual(os.listdir(self.data_home), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import pickle
+import shutil
+import unittest
+
+from naevpm.core.config import Config, ConfigInvalid
+
+
+class TestConfig(unittest.TestCase):
+    root = 'temp/config'
+
+    def setUp(self):
+        if os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        os.makedirs(self.root)
+        self.root = os.path.abspath(self.root)
+        self.config_path = os.path.join(self.root, 'naevpm.ini')
+        with open(self.config_path, 'w', encoding='utf-8') as f:
+            f.write('[paths]\n'
+                    f'naevpm_root = {self.root}/file-pm\n'
+                    f'naev_root = {self.root}/file-naev\n'
+                    '[metrics]\n'
+                    'record = no\n')
+
+    def test_no_directories_created(self):
+        config = Config(os.path.join(self.root, 'pm'), os.path.join(self.root, 'naev'))
+        self.assertEqual(config.DATABASE, os.path.join(self.root, 'pm', 'naevpm.db'))
+        self.assertEqual(config.NAEV_PLUGIN_DIR, os.path.join(self.root, 'naev', 'plugins'))
+        self.assertEqual(os.listdir(self.root), ['naevpm.ini'])
+        self.assertEqual(config.ensure_directory(config.PLUGINS_CACHE), config.PLUGINS_CACHE)
+        self.assertTrue(os.path.isdir(config.PLUGINS_CACHE))
+        # Exists already
+        config.ensure_directory(config.PLUGINS_CACHE)
+
+    def test_immutable(self):
+        config = Config(os.path.join(self.root, 'pm'), os.path.join(self.root, 'naev'), record_metrics=False)
+        with self.assertRaises(AttributeError):
+            config.PM_ROOT = 'other'
+        with self.assertRaises(AttributeError):
+            config.RECORD_METRICS = True
+        copy = pickle.loads(pickle.dumps(config))
+        self.assertEqual(copy.DATABASE, config.DATABASE)
+        self.assertFalse(copy.RECORD_METRICS)
+        with self.assertRaises(AttributeError):
+            copy.PM_ROOT = 'other'
+
+    def test_load_layers(self):
+        # The config file of the environment
+        config = Config.load(environ={'NAEVPM_CONFIG': self.config_path})
+        self.assertEqual(config.PM_ROOT, os.path.join(self.root, 'file-pm'))
+        self.assertEqual(config.NAEV_ROOT, os.path.join(self.root, 'file-naev'))
+        self.assertFalse(config.RECORD_METRICS)
+        # The environment overrides the config file
+        environ = {'NAEV_ROOT': os.path.join(self.root, 'env-naev'), 'NAEVPM_RECORD_METRICS': 'yes'}
+        config = Config.load(config_path=self.config_path, environ=environ)
+        self.assertEqual(config.PM_ROOT, os.path.join(self.root, 'file-pm'))
+        self.assertEqual(config.NAEV_ROOT, os.path.join(self.root, 'env-naev'))
+        self.assertTrue(config.RECORD_METRICS)
+        # The overrides override the environment, unless they are None
+        config = Config.load({'naevpm_root': None, 'naev_root': os.path.join(self.root, 'flag-naev')},
+                             self.config_path, environ)
+        self.assertEqual(config.PM_ROOT, os.path.join(self.root, 'file-pm'))
+        self.assertEqual(config.NAEV_ROOT, os.path.join(self.root, 'flag-naev'))
+        # Only the directories of the config file are read
+        self.assertEqual(os.listdir(self.root), ['naevpm.ini'])
+
+    def test_load_invalid(self):
+        with self.assertRaises(ConfigInvalid):
+            Config.load(config_path=os.path.join(self.root, 'missing.ini'), environ={})
+        with self.assertRaises(ConfigInvalid):
+            Config.load(config_path=self.config_path, environ={'NAEVPM_RECORD_METRICS': 'maybe'})
+        with open(self.config_path, 'w', encoding='utf-8') as f:
+            f.write('naevpm_root = outside of a section\n')
+        with self.assertRaises(ConfigInvalid):
+            Config.load(config_path=self.config_path, environ={})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import unittest
+from typing import Optional
+
+from naevpm.core.application_logic import ApplicationLogic
+from naevpm.core.config import Config
+from naevpm.core.models import RegistryDbModel
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from naevpm.core.timing import Span
+from naevpm.daemon import DaemonServer, DaemonAlreadyRunning, get_command_name, send_control, parse_root_options
+
+
+class TestDaemon(unittest.TestCase):
+    data_home = 'temp/daemon'
+
+    def setUp(self):
+        if os.path.exists(self.data_home):
+            shutil.rmtree(self.data_home)
+        self.data_home = os.path.abspath(self.data_home)
+        # Same locations as the CLI uses with this XDG_DATA_HOME
+        self.config = Config(os.path.join(self.data_home, 'naev-package-manager'), os.path.join(self.data_home, 'naev'))
+        database_connector = SqliteDatabaseConnector(self.config.DATABASE)
+        database_connector.add_registry(RegistryDbModel('registry1'))
+        database_connector.db.close()
+        self.env = dict(os.environ)
+        self.env['XDG_DATA_HOME'] = self.data_home
+        self.env['XDG_CONFIG_HOME'] = self.data_home
+
+    def run_client(self, *args: str, cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        return subprocess.run([sys.executable, '-m', 'naevpm.daemon', *args], env=self.env, capture_output=True,
+                              text=True, cwd=cwd)
+
+    def test_get_command_name(self):
+        self.assertEqual(get_command_name(['plugin', 'list']), 'plugin')
+        self.assertEqual(get_command_name(['-v', '--profile', 'daemon', 'daemon', 'stop']), 'daemon')
+        self.assertIsNone(get_command_name(['--help']))
+        self.assertEqual(parse_root_options(['--naev-root', 'naev', '--config=naevpm.ini', 'plugin', '--naev-root', 'x']),
+                         ({'--naev-root': 'naev', '--config': 'naevpm.ini'}, 'plugin'))
+
+    def test_commands_in_daemon(self):
+        daemon_process = subprocess.Popen([sys.executable, '-m', 'naevpm.cli', 'daemon', 'run'], env=self.env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 10
+            while send_control(self.config.DAEMON_SOCKET, 'status') is None:
+                self.assertLess(time.monotonic(), deadline, 'Daemon did not start')
+                time.sleep(0.05)
+
+            completed_process = self.run_client('registry', 'list', '--format', 'jsonl')
+            self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+            self.assertEqual([json.loads(line) for line in completed_process.stdout.splitlines()],
+                             [{'source': 'registry1', 'last_fetched': None}])
+            # Log messages and exit codes of the command reach the client
+            completed_process = self.run_client('verify', 'missing.toml')
+            self.assertEqual(completed_process.returncode, 1)
+            self.assertIn('missing.toml', completed_process.stderr)
+            completed_process = self.run_client('plugin', 'missing-command')
+            self.assertEqual(completed_process.returncode, 2)
+            self.assertIn('No such command', completed_process.stderr)
+            self.assertEqual(send_control(self.config.DAEMON_SOCKET, 'status')['requests_served'], 3)
+            # The daemon refuses commands for other directories. They run in the process of the client.
+            completed_process = self.run_client('--naev-root', os.path.join(self.data_home, 'other-naev'),
+                                                'registry', 'list')
+            self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+            self.assertIn('registry1', completed_process.stdout)
+            self.assertEqual(send_control(self.config.DAEMON_SOCKET, 'status')['requests_served'], 3)
+
+            completed_process = self.run_client('daemon', 'stop')
+            self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+            self.assertEqual(daemon_process.wait(10), 0)
+        finally:
+            if daemon_process.poll() is None:
+                daemon_process.kill()
+        self.assertFalse(os.path.exists(self.config.DAEMON_SOCKET))
+        # Without a daemon, the commands run in the process of the client
+        completed_process = self.run_client('registry', 'list', '--format', 'jsonl')
+        self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+        self.assertIn('registry1', completed_process.stdout)
+        self.assertEqual(self.run_client('daemon', 'status').returncode, 1)
+
+    def test_embedded_server(self):
+        # Like the GUI, which serves the commands in its own process
+        logic = ApplicationLogic(SqliteDatabaseConnector(self.config.DATABASE), self.config)
+        server = DaemonServer(logic, self.config.DAEMON_SOCKET)
+        stdout, stderr, cwd = sys.stdout, sys.stderr, os.getcwd()
+        handler_streams = [(handler, handler.stream) for handler in logging.getLogger().handlers
+                           if isinstance(handler, logging.StreamHandler)]
+        client_cwd = os.path.join(self.data_home, 'client')
+        os.makedirs(client_cwd)
+        server.start()
+        try:
+            # Relative paths are relative to the directory of the client
+            completed_process = self.run_client('lock', 'naevpm.lock.toml', cwd=client_cwd)
+            self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+            self.assertIn('Locked: 0 plugins', completed_process.stderr)
+            self.assertTrue(os.path.exists(os.path.join(client_cwd, 'naevpm.lock.toml')))
+            completed_process = self.run_client('registry', 'list', '--format', 'tsv', cwd=client_cwd)
+            self.assertEqual(completed_process.stdout.splitlines(), ['source\tlast_fetched', 'registry1\t'])
+            # Only the steps of the command are shown. The timings of the server are left as they were.
+            logic.timings.record(Span(logic.timings, 'before'), 1.0)
+            completed_process = self.run_client('--timings', 'registry', 'list')
+            self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+            self.assertIn('Step', completed_process.stderr)
+            self.assertNotIn('before', completed_process.stderr)
+            self.assertFalse(logic.timings.enabled)
+            self.assertIn('before', [stats.name for stats in logic.timings.get_stats()])
+            # Help is printed by the client
+            completed_process = self.run_client('plugin', '--help')
+            self.assertEqual(completed_process.returncode, 0, completed_process.stderr)
+            self.assertIn('check-all-for-update', completed_process.stdout)
+            self.assertEqual(send_control(self.config.DAEMON_SOCKET, 'status')['requests_served'], 3)
+        finally:
+            server.stop()
+        # The streams, log handlers and working directory of the process are left alone
+        self.assertIs(sys.stdout, stdout)
+        self.assertIs(sys.stderr, stderr)
+        self.assertEqual(os.getcwd(), cwd)
+        for handler, stream in handler_streams:
+            self.assertIs(handler.stream, stream)
+
+    def test_stale_socket(self):
+        # Left behind by a daemon which was killed
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.config.DAEMON_SOCKET)
+        sock.close()
+        logic = ApplicationLogic(SqliteDatabaseConnector(self.config.DATABASE), self.config)
+        server = DaemonServer(logic, self.config.DAEMON_SOCKET)
+        server.start()
+        try:
+            self.assertEqual(send_control(self.config.DAEMON_SOCKET, 'status')['requests_served'], 0)
+            with self.assertRaises(DaemonAlreadyRunning):
+                DaemonServer(logic, self.config.DAEMON_SOCKET).start()
+        finally:
+            server.stop()
+        self.assertFalse(os.path.exists(self.config.DAEMON_SOCKET))
+        self.assertIsNone(send_control(self.config.DAEMON_SOCKET, 'status'))
+
+
+if __name__ == '__main__':
+    unittest.main()
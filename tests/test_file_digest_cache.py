@@ -0,0 +1,63 @@
+import os
+import shutil
+import unittest
+from hashlib import sha256
+
+from naevpm.core.file_digest_cache import FileDigestCache
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from tests.temp_dir_config import TempDirConfig
+
+
+class TestFileDigestCache(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/digest-test'):
+            shutil.rmtree('temp/digest-test')
+        os.makedirs('temp/digest-test')
+        self.database_connector = SqliteDatabaseConnector(TempDirConfig().DATABASE)
+
+    def write_file(self, path: str, content: bytes, age_seconds: int = 60):
+        with open(path, 'wb') as f:
+            f.write(content)
+        stat = os.stat(path)
+        # Older than the racy window, so the digest is cached
+        mtime_ns = stat.st_mtime_ns - age_seconds * 1_000_000_000
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_sha256(self):
+        path = 'temp/digest-test/file'
+        self.write_file(path, b'content')
+        cache = FileDigestCache(self.database_connector)
+        self.assertEqual(cache.sha256(path), sha256(b'content').hexdigest())
+        self.assertIsNone(cache.sha256('temp/digest-test/missing'))
+
+        # Digests are only stored in the DB by flush
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        self.assertIsNone(self.database_connector.get_file_digest(*key))
+        cache.flush()
+        self.assertEqual(self.database_connector.get_file_digest(*key), sha256(b'content').hexdigest())
+
+        # A new cache reads the digest from the DB. Faking the stored digest shows that the file is not hashed again.
+        self.database_connector.set_file_digests([(*key, 'stored')])
+        self.assertEqual(FileDigestCache(self.database_connector).sha256(path), 'stored')
+
+        # A changed file is hashed again
+        self.write_file(path, b'changed content')
+        self.assertEqual(FileDigestCache(self.database_connector).sha256(path), sha256(b'changed content').hexdigest())
+
+    def test_racy_file(self):
+        path = 'temp/digest-test/file'
+        self.write_file(path, b'content', age_seconds=0)
+        cache = FileDigestCache(self.database_connector)
+        self.assertEqual(cache.sha256(path), sha256(b'content').hexdigest())
+        cache.flush()
+        stat = os.stat(path)
+        self.assertIsNone(self.database_connector.get_file_digest(os.path.abspath(path), stat.st_size,
+                                                                  stat.st_mtime_ns, stat.st_ino))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from naevpm.core.lru_cache import LruCache
+
+
+class TestLruCache(unittest.TestCase):
+
+    def test_eviction(self):
+        cache: LruCache[str, int] = LruCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # Using 'a' makes 'b' the least recently used entry
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+        cache.invalidate('a')
+        self.assertNotIn('a', cache)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            LruCache(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import json
+import os
+import unittest
+
+from naevpm.core.manifest import Manifest, ManifestEntry, write_manifest, read_manifest, ManifestInvalid
+
+
+class TestManifest(unittest.TestCase):
+
+    def test_write_read(self):
+        os.makedirs('temp', exist_ok=True)
+        path = 'temp/manifest-test.json'
+        write_manifest(Manifest([ManifestEntry('https://example.com/plugin.zip', 'abc', 'Plugin'),
+                                 ManifestEntry('https://example.com/plugin')]), path)
+        manifest = read_manifest(path)
+        self.assertEqual([(e.source, e.content_hash, e.name) for e in manifest.entries],
+                         [('https://example.com/plugin.zip', 'abc', 'Plugin'),
+                          ('https://example.com/plugin', None, None)])
+
+    def test_invalid(self):
+        os.makedirs('temp', exist_ok=True)
+        path = 'temp/manifest-test.json'
+        for obj in [{'plugins': []},
+                    {'version': 1, 'plugins': [{'content_hash': 'abc'}]},
+                    {'version': 1, 'plugins': [{'source': 'a'}, {'source': 'a'}]}]:
+            with open(path, 'w') as f:
+                json.dump(obj, f)
+            with self.assertRaises(ManifestInvalid):
+                read_manifest(path)
+        with open(path, 'w') as f:
+            f.write('{')
+        with self.assertRaises(ManifestInvalid):
+            read_manifest(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
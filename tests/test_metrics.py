@@ -0,0 +1,154 @@
+import os
+import shutil
+import unittest
+from datetime import datetime, timezone
+
+from naevpm.core.application_logic import ApplicationLogic
+from naevpm.core.config import Config
+from naevpm.core.metrics import MetricsRecorder, get_operation_stats, get_cache_hit_rates, get_database_sizes, \
+    DATABASE_SIZE, get_bucket_index, get_bucket_value, DURATION_BUCKETS
+from naevpm.core.models import RegistryDbModel
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector, IndexChanges
+from naevpm.core.timing import Timings
+from tests.temp_dir_config import TempDirConfig
+
+DAY = 24 * 60 * 60
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        self.database_connector = SqliteDatabaseConnector(TempDirConfig().DATABASE)
+        self.commits = 0
+
+        def on_commit(changes: IndexChanges):
+            self.commits += 1
+
+        self.database_connector.add_commit_listener(on_commit)
+
+    def count_events(self) -> int:
+        return self.database_connector.db.execute("SELECT count(*) FROM metric_event;").fetchone()[0]
+
+    def test_buffered_inserts(self):
+        recorder = MetricsRecorder(self.database_connector)
+        recorder.FLUSH_SIZE = 5
+        for i in range(4):
+            recorder.record('step', 0.1)
+        self.assertEqual(self.count_events(), 0)
+        # The full buffer is written at once
+        recorder.record('step', 0.1)
+        self.assertEqual(self.count_events(), 5)
+        recorder.record('step', 0.1)
+        recorder.flush()
+        self.assertEqual(self.count_events(), 6)
+        # Metrics are not part of the index, so it is not reloaded
+        self.assertEqual(self.commits, 0)
+
+    def test_timings_listener(self):
+        timings = Timings(enabled=True)
+        recorder = MetricsRecorder(self.database_connector)
+        timings.add_listener(recorder.record_span)
+        for i in range(3):
+            with timings.span('registry.fetch') as span:
+                span.add_bytes(100)
+                span.add_items(2)
+        recorder.flush()
+        stats = get_operation_stats(self.database_connector, 1)
+        self.assertEqual([(s.name, s.count, s.bytes, s.items) for s in stats], [('registry.fetch', 3, 300, 6)])
+
+    def test_percentiles(self):
+        recorder = MetricsRecorder(self.database_connector)
+        for i in range(1, 101):
+            recorder.record('step', i / 1000)
+        recorder.record('other', None, bytes_=10)
+        recorder.flush()
+        stats = {s.name: s for s in get_operation_stats(self.database_connector, 1)}
+        self.assertAlmostEqual(stats['step'].p50, 0.050)
+        self.assertAlmostEqual(stats['step'].p90, 0.090)
+        self.assertAlmostEqual(stats['step'].p99, 0.099)
+        self.assertAlmostEqual(stats['step'].max, 0.100)
+        self.assertEqual(stats['step'].count, 100)
+        self.assertIsNone(stats['other'].p50)
+        self.assertEqual(stats['other'].bytes, 10)
+
+    def test_rollup_and_retention(self):
+        now = datetime(2024, 6, 30, 12, tzinfo=timezone.utc).timestamp()
+        recorder = MetricsRecorder(self.database_connector)
+        for i in range(1, 101):
+            recorder.record('step', i / 1000, bytes_=1, unix_time=now - 20 * DAY)
+        recorder.record('step', 5.0, unix_time=now - 400 * DAY)
+        recorder.record('step', 0.2, unix_time=now)
+        recorder.maintain(now)
+        # Only the recent event stays raw. The expired one is gone.
+        self.assertEqual(self.count_events(), 2)
+        rollups = self.database_connector.get_metric_rollups('0000-00-00')
+        self.assertEqual([(name, day, count) for name, day, count, *rest in rollups], [('step', '2024-06-10', 100)])
+        self.assertEqual(sum(rollups[0][7]), 100)
+
+        # Maintaining again on the same day does nothing
+        recorder.maintain(now + 60)
+        self.assertEqual(self.count_events(), 2)
+        # On the next day, only the DB size is measured again, as rolled up events are deleted
+        recorder.maintain(now + DAY)
+        self.assertEqual(self.count_events(), 3)
+        self.assertEqual(self.database_connector.get_metric_rollups('0000-00-00'), rollups)
+
+        stats = get_operation_stats(self.database_connector, 30, now)
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0].count, 101)
+        self.assertEqual(stats[0].bytes, 100)
+        self.assertEqual(stats[0].max, 0.2)
+        # Estimated from the histogram: within the bucket of the exact value
+        self.assertEqual(get_bucket_index(stats[0].p50), get_bucket_index(0.050))
+        self.assertEqual(get_bucket_index(stats[0].p90), get_bucket_index(0.090))
+        # Rolled up days are outside of a short window
+        self.assertEqual(get_operation_stats(self.database_connector, 1, now)[0].count, 1)
+
+        sizes = get_database_sizes(self.database_connector, 30, now + DAY)
+        self.assertEqual([day for day, size in sizes], ['2024-06-30', '2024-07-01'])
+        self.assertGreater(sizes[0][1], 0)
+        self.assertNotIn(DATABASE_SIZE, [s.name for s in stats])
+        self.assertEqual(self.commits, 0)
+
+    def test_close(self):
+        config = Config('temp/naev-package-manager', 'temp/naev', record_metrics=False)
+        application_logic = ApplicationLogic(self.database_connector, config)
+        application_logic.metrics.record('step', 0.1)
+        application_logic.close()
+        # Buffered events are written, but the DB size is not measured
+        self.assertEqual(self.count_events(), 1)
+
+        # Without changes of the index, e.g. after plugin list, the history is not maintained
+        application_logic = ApplicationLogic(self.database_connector, TempDirConfig())
+        application_logic.get_plugins()
+        application_logic.close()
+        self.assertEqual(self.count_events(), 1)
+
+        application_logic = ApplicationLogic(self.database_connector, TempDirConfig())
+        self.database_connector.add_registry(RegistryDbModel('registry1'))
+        application_logic.close()
+        self.assertEqual(self.count_events(), 2)
+        self.assertEqual([day for day, size in get_database_sizes(self.database_connector, 1)],
+                         [datetime.now(timezone.utc).date().isoformat()])
+
+    def test_buckets(self):
+        for duration in [0.0005, 0.001, 0.0015, 0.3, 100.0]:
+            bucket_index = get_bucket_index(duration)
+            self.assertEqual(get_bucket_index(get_bucket_value(bucket_index)), bucket_index)
+        self.assertEqual(get_bucket_index(10 ** 6), len(DURATION_BUCKETS) - 1)
+
+    def test_cache_hit_rates(self):
+        recorder = MetricsRecorder(self.database_connector)
+        for i in range(4):
+            recorder.record('file_digest.lookup', 0.001)
+        recorder.record('file_digest.hash', 0.01)
+        recorder.flush()
+        hit_rates = get_cache_hit_rates(get_operation_stats(self.database_connector, 1))
+        self.assertEqual(hit_rates['file_digest'], 0.75)
+        self.assertIsNone(hit_rates['plugin_metadata'])
+
+
+if __name__ == '__main__':
+    unittest.main()
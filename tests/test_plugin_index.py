@@ -0,0 +1,82 @@
+import os
+import shutil
+import unittest
+
+from naevpm.core.models import RegistryDbModel, RegistryPluginMetaDataModel, PluginState, PluginMetadataDbModel
+from naevpm.core.plugin_index import PluginIndex
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
+from tests.temp_dir_config import TempDirConfig
+
+
+class TestPluginIndex(unittest.TestCase):
+
+    def test_plugin_index(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+
+        config = TempDirConfig()
+
+        database_connector = SqliteDatabaseConnector(config.DATABASE)
+        database_connector.add_registry(RegistryDbModel('registry1'))
+        database_connector.add_registry(RegistryDbModel('registry2'))
+        database_connector.index_plugin('registry1', RegistryPluginMetaDataModel('b', 'source1'))
+        database_connector.index_plugin('registry2', RegistryPluginMetaDataModel('a', 'source2'))
+
+        plugin_index = PluginIndex(database_connector)
+        self.assertEqual([p.source for p in plugin_index.get_plugins()], ['source2', 'source1'])
+        self.assertEqual([r.source for r in plugin_index.get_registries()], ['registry1', 'registry2'])
+        self.assertEqual(plugin_index.get_plugin('source1').name, 'b')
+        self.assertIsNone(plugin_index.get_plugin('source3'))
+        self.assertEqual(plugin_index.get_registry('registry2').source, 'registry2')
+        self.assertEqual([p.source for p in plugin_index.get_plugins_of_registry('registry1')], ['source1'])
+        self.assertEqual(plugin_index.count_plugins(), 2)
+        self.assertEqual([p.source for p in plugin_index.get_plugins_page(1, 5)], ['source1'])
+        self.assertEqual(plugin_index.get_plugins_page(2, 5), [])
+
+        # Returned models are copies
+        plugin = plugin_index.get_plugin('source1')
+        plugin.state = PluginState.INSTALLED
+        self.assertEqual(plugin_index.get_plugin('source1').state, PluginState.INDEXED)
+
+        # Reads do not touch the DB
+        snapshot = plugin_index.get_snapshot()
+        database_connector.db.execute("UPDATE indexed_plugin SET name = 'changed' WHERE source = 'source1'")
+        self.assertIs(plugin_index.get_snapshot(), snapshot)
+        self.assertEqual(plugin_index.get_plugin('source1').name, 'b')
+
+        # Commits swap the snapshot, once per transaction
+        with database_connector.transaction():
+            database_connector.set_plugin_state('source1', PluginState.CACHED)
+            database_connector.index_plugin('registry1', RegistryPluginMetaDataModel('c', 'source3'))
+            self.assertIs(plugin_index.get_snapshot(), snapshot)
+        self.assertIsNot(plugin_index.get_snapshot(), snapshot)
+        plugin = plugin_index.get_plugin('source1')
+        self.assertEqual(plugin.name, 'changed')
+        self.assertEqual(plugin.state, PluginState.CACHED)
+        self.assertEqual([p.source for p in plugin_index.get_plugins_of_registry('registry1')],
+                         ['source3', 'source1'])
+
+        # Updates in place patch the snapshot with the changed rows. The index is not loaded again.
+        snapshot = plugin_index.get_snapshot()
+        database_connector.set_plugin_update_available('source1', True)
+        patched_snapshot = plugin_index.get_snapshot()
+        self.assertIsNot(patched_snapshot, snapshot)
+        self.assertIs(patched_snapshot._plugin_positions, snapshot._plugin_positions)
+        self.assertTrue(plugin_index.get_plugin('source1').update_available)
+        self.assertFalse(snapshot.get_plugin('source1').update_available)
+        # Writes which do not change the index are ignored
+        database_connector.set_file_digests([('path', 1, 2, 3, 'digest')])
+        database_connector.save_plugin_metadata(PluginMetadataDbModel(name='b', source='source1'))
+        self.assertIs(plugin_index.get_snapshot(), patched_snapshot)
+        # Inserts and deletes only mark the snapshot stale. The next read loads the index again.
+        database_connector.remove_plugin('source3')
+        self.assertIs(plugin_index._snapshot, patched_snapshot)
+        self.assertEqual([p.source for p in plugin_index.get_plugins()], ['source2', 'source1'])
+
+        database_connector.remove_registry('registry2')
+        self.assertIsNone(plugin_index.get_registry('registry2'))
+        self.assertEqual([p.source for p in plugin_index.get_plugins_of_registry(None)], ['source2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
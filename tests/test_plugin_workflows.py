@@ -6,16 +6,17 @@ import uuid
 import pygit2
 
 from naevpm.core.abstract_thread_communication import AbstractCommunication
-from naevpm.core.config import Config
 from naevpm.core.models import IndexedPluginDbModel, PluginState
+from naevpm.core.plugin_workflows.plugin_workflow import PluginContentHashMismatch, VerifyStatus
 from naevpm.core.plugin_workflows.plugin_workflow_manager import PluginWorkflowManager
 from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
 from unittest.mock import patch, MagicMock
+from tests.temp_dir_config import TempDirConfig
 
 
-class TestConfig(Config):
+class PluginDirConfig(TempDirConfig):
     def __init__(self, ):
-        super().__init__("temp/naev-package-manager", "temp/naev")
+        super().__init__()
 
         if not os.path.exists(self.NAEV_PLUGIN_DIR):
             os.makedirs(self.NAEV_PLUGIN_DIR)
@@ -23,19 +24,20 @@ class TestConfig(Config):
 
 class TestPluginWorkflows(unittest.TestCase):
 
-    @patch('naevpm.core.plugin_workflows.remote_zip_plugin_workflow.requests')
+    # requests is imported on first use, so requests.get is patched instead of the module attribute
+    @patch('requests.get')
     def test_remote_zip(self, mock):
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.iter_content = lambda chunk_size: [b'cool works']
-        mock.get.return_value = mock_response
+        mock.return_value = mock_response
 
         if os.path.exists('temp/naev-package-manager'):
             shutil.rmtree('temp/naev-package-manager')
         if os.path.exists('temp/naev'):
             shutil.rmtree('temp/naev')
 
-        config = TestConfig()
+        config = PluginDirConfig()
 
         database_connector = SqliteDatabaseConnector(config.DATABASE)
         plugin_workflow_manager = PluginWorkflowManager(database_connector, config)
@@ -158,7 +160,7 @@ class TestPluginWorkflows(unittest.TestCase):
             shutil.rmtree('temp/naev')
         if os.path.exists('temp/test.zip'):
             os.remove('temp/test.zip')
-        config = TestConfig()
+        config = PluginDirConfig()
 
         shutil.copyfile('tests/test-resources/test.zip', 'temp/test.zip')
 
@@ -279,6 +281,67 @@ class TestPluginWorkflows(unittest.TestCase):
         plugin_workflow_manager.remove_plugin(plugin, tc)
         self.assertIsNone(database_connector.get_plugin('temp/test.zip'))
 
+    def test_git_pin(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/naev'):
+            shutil.rmtree('temp/naev')
+        if os.path.exists('temp/git-plugin-test'):
+            shutil.rmtree('temp/git-plugin-test')
+        config = PluginDirConfig()
+
+        shutil.copytree('tests/test-resources/git-plugin-test', 'temp/git-plugin-test')
+        repo = pygit2.init_repository('temp/git-plugin-test', initial_head='main')
+        signature = pygit2.Signature('test', 'dummy@mail.address')
+        commit_oids = []
+        for i in range(2):
+            with open('temp/git-plugin-test/test.txt', 'w') as f:
+                f.write(f'version {i}')
+            index = repo.index
+            index.add('plugin.xml')
+            index.add('test.txt')
+            index.write()
+            parents = [] if repo.head_is_unborn else [repo.head.target]
+            commit_oids.append(str(repo.create_commit('HEAD', signature, signature, f'Version {i}',
+                                                      index.write_tree(), parents)))
+
+        database_connector = SqliteDatabaseConnector(config.DATABASE)
+        plugin_workflow_manager = PluginWorkflowManager(database_connector, config)
+        plugin = IndexedPluginDbModel(
+            name='test',
+            source='temp/git-plugin-test/',
+            state=PluginState.CACHED
+        )
+        cache_location, install_location = plugin_workflow_manager.get_locations(plugin)
+        # Full clone, as the local transport does not support shallow fetches
+        pygit2.clone_repository(plugin.source, cache_location, checkout_branch='main')
+        tc = AbstractCommunication()
+        plugin_workflow_manager.install_plugin(plugin, tc)
+        self.assertEqual(plugin_workflow_manager.get_content_hash(plugin), commit_oids[1])
+
+        # Pinning an installed plugin installs the pinned commit
+        plugin_workflow_manager.pin_plugin(plugin, commit_oids[0], tc)
+        self.assertEqual(plugin_workflow_manager.get_content_hash(plugin), commit_oids[0])
+        with open(os.path.join(install_location, 'test.txt')) as f:
+            self.assertEqual(f.read(), 'version 0')
+
+        with self.assertRaises(PluginContentHashMismatch):
+            plugin_workflow_manager.pin_plugin(plugin, '0' * 40, tc)
+        self.assertEqual(plugin_workflow_manager.get_content_hash(plugin), commit_oids[0])
+
+        # Verification checks the installed commit and changes of the installed files
+        self.assertEqual(plugin_workflow_manager.verify_plugin(plugin, commit_oids[0]),
+                         (VerifyStatus.OK, commit_oids[0]))
+        self.assertEqual(plugin_workflow_manager.verify_plugin(plugin, commit_oids[1]),
+                         (VerifyStatus.MISMATCH, commit_oids[0]))
+        with open(os.path.join(install_location, 'test.txt'), 'w') as f:
+            f.write('modified')
+        self.assertEqual(plugin_workflow_manager.verify_plugin(plugin, commit_oids[0]),
+                         (VerifyStatus.MODIFIED, commit_oids[0]))
+        plugin_workflow_manager.uninstall_plugin(plugin, tc)
+        self.assertEqual(plugin_workflow_manager.verify_plugin(plugin, commit_oids[0]),
+                         (VerifyStatus.NOT_INSTALLED, None))
+
     def test_git(self):
         if os.path.exists('temp/naev-package-manager'):
             shutil.rmtree('temp/naev-package-manager')
@@ -286,10 +349,11 @@ class TestPluginWorkflows(unittest.TestCase):
             shutil.rmtree('temp/naev')
         if os.path.exists('temp/git-plugin-test'):
             shutil.rmtree('temp/git-plugin-test')
-        config = TestConfig()
+        config = PluginDirConfig()
 
         shutil.copytree('tests/test-resources/git-plugin-test', 'temp/git-plugin-test')
-        pygit2.init_repository('temp/git-plugin-test')
+        # The branch the workflow checks out, independent of init.defaultBranch
+        pygit2.init_repository('temp/git-plugin-test', initial_head='main')
         repo = pygit2.Repository('temp/git-plugin-test/')
         index = repo.index
         index.add('plugin.xml')
@@ -0,0 +1,50 @@
+import unittest
+
+from naevpm.core.abstract_thread_communication import AbstractCommunication
+from naevpm.core.progress import Progress, ProgressReporter
+
+
+class ProgressCommunication(AbstractCommunication):
+    progress_reports: list[Progress]
+
+    def __init__(self):
+        super().__init__()
+        self.progress_reports = []
+
+    def progress(self, progress: Progress):
+        self.progress_reports.append(progress)
+
+
+class TestProgress(unittest.TestCase):
+
+    def test_rate_limit(self):
+        tc = ProgressCommunication()
+        progress_reporter = ProgressReporter(tc, 'source', 'objects', min_interval=60)
+        # Like the transfer callback of pygit2, which learns the total with the first callback
+        for i in range(1000):
+            progress_reporter.update(i, 1000, received_bytes=i * 100)
+        # The first update and reaching the total are reported. Everything in between comes too fast.
+        progress_reporter.update(1000)
+        progress_reporter.finish()
+        self.assertEqual([(p.done, p.total, p.finished) for p in tc.progress_reports],
+                         [(0, 1000, False), (1000, 1000, False), (1000, 1000, True)])
+        last_progress = tc.progress_reports[-1]
+        self.assertEqual(last_progress.label, 'source')
+        self.assertEqual(last_progress.unit, 'objects')
+        self.assertEqual(last_progress.received_bytes, 99900)
+        self.assertGreater(last_progress.rate, 0)
+        self.assertEqual(last_progress.eta, 0)
+
+    def test_unknown_total(self):
+        tc = ProgressCommunication()
+        progress_reporter = ProgressReporter(tc, 'source', 'B', min_interval=0)
+        progress_reporter.update(0)
+        progress_reporter.update(100)
+        self.assertEqual([p.done for p in tc.progress_reports], [0, 100])
+        self.assertIsNone(tc.progress_reports[0].rate)
+        self.assertIsNone(tc.progress_reports[-1].total)
+        self.assertIsNone(tc.progress_reports[-1].eta)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,16 @@
 import os
 import shutil
+import sqlite3
 import unittest
+import zipfile
+from threading import Thread
+
+from naevpm.core.abstract_thread_communication import AbstractCommunication
 from naevpm.core.application_logic import ApplicationLogic
 from naevpm.core.config import Config
-from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector
-
-
-class TestConfig(Config):
-    def __init__(self, ):
-        super().__init__("temp/naev-package-manager", "temp/naev")
+from naevpm.core.models import RegistryDbModel, RegistryPluginMetaDataModel, PluginState, PluginMetadataDbModel
+from naevpm.core.sqlite_database_connector import SqliteDatabaseConnector, IndexSnapshotVersionNotSupported
+from tests.temp_dir_config import TempDirConfig
 
 
 class TestSqliteDatabaseConnector(unittest.TestCase):
@@ -19,7 +21,7 @@ class TestSqliteDatabaseConnector(unittest.TestCase):
         if os.path.exists('temp/naev'):
             shutil.rmtree('temp/naev')
 
-        config = TestConfig()
+        config = TempDirConfig()
 
         sqlite_data_connector = SqliteDatabaseConnector(config.DATABASE)
         no_plugin_metadata = sqlite_data_connector.get_plugin_metadata('temp/test-resources/git-plugin-test')
@@ -52,3 +54,232 @@ class TestSqliteDatabaseConnector(unittest.TestCase):
         self.assertEqual(db_plugin_metadata.blacklist, ['asdf', 'asdf2'])
         self.assertEqual(db_plugin_metadata.whitelist, ['weoine', 'weoine2'])
         self.assertTrue(db_plugin_metadata.total_conversion)
+
+    def test_lookup_cache(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/naev'):
+            shutil.rmtree('temp/naev')
+
+        config = TempDirConfig()
+
+        sqlite_data_connector = SqliteDatabaseConnector(config.DATABASE)
+        sqlite_data_connector.add_registry(RegistryDbModel('registry1'))
+        sqlite_data_connector.index_plugin('registry1', RegistryPluginMetaDataModel('name1', 'source1'))
+
+        plugin = sqlite_data_connector.get_plugin('source1')
+        self.assertEqual(plugin.state, PluginState.INDEXED)
+        # Callers get their own copy which they can modify
+        plugin.state = PluginState.INSTALLED
+        self.assertEqual(sqlite_data_connector.get_plugin('source1').state, PluginState.INDEXED)
+
+        # Changes made behind the back of the connector are not seen as the row is cached
+        sqlite_data_connector.db.execute("UPDATE indexed_plugin SET name = 'changed' WHERE source = 'source1'")
+        self.assertEqual(sqlite_data_connector.get_plugin('source1').name, 'name1')
+
+        # Write methods of the connector invalidate the cached row
+        sqlite_data_connector.set_plugin_state('source1', PluginState.CACHED)
+        plugin = sqlite_data_connector.get_plugin('source1')
+        self.assertEqual(plugin.name, 'changed')
+        self.assertEqual(plugin.state, PluginState.CACHED)
+        sqlite_data_connector.set_plugin_update_available('source1', True)
+        self.assertTrue(sqlite_data_connector.get_plugin('source1').update_available)
+
+        # Removing the registry nulls the registry source of its plugins
+        self.assertEqual(sqlite_data_connector.get_registry('registry1').source, 'registry1')
+        sqlite_data_connector.remove_registry('registry1')
+        self.assertIsNone(sqlite_data_connector.get_registry('registry1'))
+        self.assertIsNone(sqlite_data_connector.get_plugin('source1').registry_source)
+
+        sqlite_data_connector.remove_plugin('source1')
+        self.assertIsNone(sqlite_data_connector.get_plugin('source1'))
+
+        # Lists of cached rows are copied too
+        sqlite_data_connector.insert_plugin_metadata(PluginMetadataDbModel('name2', source='source2',
+                                                                           blacklist=['a']))
+        sqlite_data_connector.get_plugin_metadata('source2').blacklist.append('b')
+        self.assertEqual(sqlite_data_connector.get_plugin_metadata('source2').blacklist, ['a'])
+
+        # Removing a plugin invalidates the cached row of its registry
+        sqlite_data_connector.add_registry(RegistryDbModel('registry2'))
+        sqlite_data_connector.index_plugin('registry2', RegistryPluginMetaDataModel('name3', 'source3'))
+        self.assertIsNone(sqlite_data_connector.get_registry('registry2').last_fetched)
+        sqlite_data_connector.db.execute("UPDATE registry SET last_fetched = '2024-01-01T00:00:00+00:00' "
+                                         "WHERE source = 'registry2'")
+        sqlite_data_connector.remove_plugin('source3')
+        self.assertIsNotNone(sqlite_data_connector.get_registry('registry2').last_fetched)
+
+    def test_iter_plugins(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+
+        config = TempDirConfig()
+
+        sqlite_data_connector = SqliteDatabaseConnector(config.DATABASE)
+        sqlite_data_connector.add_registry(RegistryDbModel('registry1'))
+        for i in range(10):
+            sqlite_data_connector.index_plugin('registry1', RegistryPluginMetaDataModel(f'name{i}', f'source{i}'))
+
+        plugins = sqlite_data_connector.get_plugins()
+        self.assertEqual(len(plugins), 10)
+        # An existing DB is opened as usual without create
+        self.assertEqual(len(SqliteDatabaseConnector(config.DATABASE, create=False).get_plugins()), 10)
+        self.assertEqual([p.source for p in sqlite_data_connector.iter_plugins()], [p.source for p in plugins])
+        self.assertEqual([r.source for r in sqlite_data_connector.iter_registries()], ['registry1'])
+
+        # Writes of other threads wait until the iterator is closed
+        iterator = sqlite_data_connector.iter_plugins()
+        self.assertEqual(next(iterator).source, 'source0')
+        writer = Thread(target=sqlite_data_connector.index_plugin,
+                        args=['registry1', RegistryPluginMetaDataModel('name10', 'source10')])
+        writer.start()
+        writer.join(0.2)
+        self.assertTrue(writer.is_alive())
+        self.assertEqual(len(list(iterator)), 9)
+        writer.join()
+        self.assertTrue(sqlite_data_connector.exists_plugin('source10'))
+
+    def test_transaction(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/naev'):
+            shutil.rmtree('temp/naev')
+
+        config = TempDirConfig()
+
+        sqlite_data_connector = SqliteDatabaseConnector(config.DATABASE)
+        sqlite_data_connector.add_registry(RegistryDbModel('registry1'))
+
+        # Writes join the transaction and are committed once at the end of the outermost block
+        with sqlite_data_connector.transaction():
+            sqlite_data_connector.index_plugin('registry1', RegistryPluginMetaDataModel('name1', 'source1'))
+            with sqlite_data_connector.transaction():
+                sqlite_data_connector.index_plugin('registry1', RegistryPluginMetaDataModel('name2', 'source2'))
+            self.assertTrue(sqlite_data_connector.db.in_transaction)
+            sqlite_data_connector.set_plugin_state('source1', PluginState.CACHED)
+            self.assertTrue(sqlite_data_connector.db.in_transaction)
+        self.assertFalse(sqlite_data_connector.db.in_transaction)
+        self.assertEqual(len(sqlite_data_connector.get_plugins()), 2)
+
+        # Everything is rolled back on error, including rows cached during the transaction
+        try:
+            with sqlite_data_connector.transaction():
+                sqlite_data_connector.set_plugin_state('source1', PluginState.INSTALLED)
+                self.assertEqual(sqlite_data_connector.get_plugin('source1').state, PluginState.INSTALLED)
+                sqlite_data_connector.remove_plugin('source2')
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        self.assertFalse(sqlite_data_connector.db.in_transaction)
+        self.assertEqual(sqlite_data_connector.get_plugin('source1').state, PluginState.CACHED)
+        self.assertIsNotNone(sqlite_data_connector.get_plugin('source2'))
+
+    def test_plugin_metadata_extraction(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/naev'):
+            shutil.rmtree('temp/naev')
+        if os.path.exists('temp/metadata-test.zip'):
+            os.remove('temp/metadata-test.zip')
+
+        config = TempDirConfig()
+        os.makedirs(config.NAEV_PLUGIN_DIR)
+        with zipfile.ZipFile('temp/metadata-test.zip', 'w') as z:
+            z.write('tests/test-resources/git-plugin-test/plugin.xml', 'plugin.xml')
+
+        sqlite_data_connector = SqliteDatabaseConnector(config.DATABASE)
+        application_logic = ApplicationLogic(sqlite_data_connector, config)
+        sqlite_data_connector.add_registry(RegistryDbModel('registry1'))
+        sqlite_data_connector.index_plugin('registry1',
+                                           RegistryPluginMetaDataModel('name1', 'temp/metadata-test.zip'))
+        plugin = sqlite_data_connector.get_plugin('temp/metadata-test.zip')
+        tc = AbstractCommunication()
+
+        # Metadata is extracted and committed when fetching
+        application_logic.fetch_plugin(plugin, tc)
+        self.assertFalse(sqlite_data_connector.db.in_transaction)
+        db_plugin_metadata = sqlite_data_connector.get_plugin_metadata('temp/metadata-test.zip')
+        self.assertEqual(db_plugin_metadata.name, 'Test Plugin')
+        content_hash = db_plugin_metadata.content_hash
+        self.assertIsNotNone(content_hash)
+        self.assertEqual(application_logic.get_plugin_metadata(plugin, tc).name, 'Test Plugin')
+
+        # Changed content replaces the stale metadata when updating
+        application_logic.install_plugin(plugin, tc)
+        os.remove('temp/metadata-test.zip')
+        with zipfile.ZipFile('temp/metadata-test.zip', 'w') as z:
+            z.writestr('plugin.xml', '<plugin name="Changed Plugin"><version>0.2</version></plugin>')
+        application_logic.update_plugin(plugin, tc)
+        db_plugin_metadata = sqlite_data_connector.get_plugin_metadata('temp/metadata-test.zip')
+        self.assertEqual(db_plugin_metadata.name, 'Changed Plugin')
+        self.assertEqual(db_plugin_metadata.version, '0.2')
+        self.assertNotEqual(db_plugin_metadata.content_hash, content_hash)
+
+        # Metadata is removed together with the cache
+        application_logic.uninstall_plugin(plugin, tc)
+        application_logic.delete_plugin(plugin, tc)
+        self.assertIsNone(sqlite_data_connector.get_plugin_metadata('temp/metadata-test.zip'))
+
+    def test_index_snapshot(self):
+        if os.path.exists('temp/naev-package-manager'):
+            shutil.rmtree('temp/naev-package-manager')
+        if os.path.exists('temp/naev'):
+            shutil.rmtree('temp/naev')
+        if os.path.exists('temp/other-naev-package-manager'):
+            shutil.rmtree('temp/other-naev-package-manager')
+        if os.path.exists('temp/index-snapshot.db'):
+            os.remove('temp/index-snapshot.db')
+
+        config = TempDirConfig()
+
+        sqlite_data_connector = SqliteDatabaseConnector(config.DATABASE)
+        sqlite_data_connector.add_registry(RegistryDbModel('registry1'))
+        sqlite_data_connector.set_registry_commit_oid('registry1', 'abc')
+        sqlite_data_connector.index_plugin('registry1', RegistryPluginMetaDataModel('name1', 'source1', 'author1'))
+        sqlite_data_connector.index_plugin('registry1', RegistryPluginMetaDataModel('name2', 'source2'))
+        sqlite_data_connector.set_plugin_state('source1', PluginState.INSTALLED)
+        sqlite_data_connector.insert_plugin_metadata(PluginMetadataDbModel(name='name1', source='source1',
+                                                                           blacklist=['a'], content_hash='def'))
+        sqlite_data_connector.export_index_snapshot('temp/index-snapshot.db')
+
+        other_config = Config('temp/other-naev-package-manager', 'temp/naev')
+        other_connector = SqliteDatabaseConnector(other_config.DATABASE)
+        other_connector.add_registry(RegistryDbModel('registry2'))
+        other_connector.index_plugin('registry2', RegistryPluginMetaDataModel('name2', 'source2'))
+        other_connector.set_plugin_state('source2', PluginState.CACHED)
+        other_connector.set_registry_commit_oid('registry2', 'ghi')
+        other_connector.import_index_snapshot('temp/index-snapshot.db')
+
+        self.assertEqual([r.source for r in other_connector.get_registries()], ['registry1', 'registry2'])
+        # A new registry keeps its commit. The next fetch reads the registry which lost a plugin again.
+        self.assertEqual(other_connector.get_registry_commit_oid('registry1'), 'abc')
+        self.assertIsNone(other_connector.get_registry_commit_oid('registry2'))
+        # Local state of the exporting machine is not imported, but the local state of the importing one is kept
+        plugin1 = other_connector.get_plugin('source1')
+        self.assertEqual(plugin1.author, 'author1')
+        self.assertEqual(plugin1.state, PluginState.INDEXED)
+        plugin2 = other_connector.get_plugin('source2')
+        self.assertEqual(plugin2.registry_source, 'registry1')
+        self.assertEqual(plugin2.state, PluginState.CACHED)
+        plugin_metadata = other_connector.get_plugin_metadata('source1')
+        self.assertEqual(plugin_metadata.blacklist, ['a'])
+        self.assertEqual(plugin_metadata.content_hash, 'def')
+
+        # The next fetch reads a registry merged into an existing one again
+        other_connector.import_index_snapshot('temp/index-snapshot.db')
+        self.assertIsNone(other_connector.get_registry_commit_oid('registry1'))
+
+        # Existing files are only overwritten if asked for
+        with self.assertRaises(FileExistsError):
+            sqlite_data_connector.export_index_snapshot('temp/index-snapshot.db')
+        sqlite_data_connector.export_index_snapshot('temp/index-snapshot.db', overwrite=True)
+
+        # Removing a plugin from the index clears the commit of its registry
+        sqlite_data_connector.remove_plugin('source2')
+        self.assertIsNone(sqlite_data_connector.get_registry_commit_oid('registry1'))
+
+        snapshot = sqlite3.connect('temp/index-snapshot.db')
+        snapshot.execute('PRAGMA user_version = 1000;')
+        snapshot.close()
+        with self.assertRaises(IndexSnapshotVersionNotSupported):
+            other_connector.import_index_snapshot('temp/index-snapshot.db')
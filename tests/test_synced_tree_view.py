@@ -0,0 +1,50 @@
+import tkinter
+import unittest
+
+from naevpm.core.models import IndexedPluginDbModel, PluginState
+from naevpm.gui.synced_tree_view import SyncedTreeView
+
+
+class TestSyncedTreeView(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            self.root = tkinter.Tk()
+        except tkinter.TclError:
+            self.skipTest('No display')
+        self.root.withdraw()
+        self.view = SyncedTreeView(
+            get_str_values_fn=lambda p: [p.name, p.source],
+            get_object_identifier_fn=lambda p: p.source,
+            master=self.root,
+            columns=['name', 'source'],
+            show='headings')
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def test_sync_put_all(self):
+        plugins = [IndexedPluginDbModel(f'name{i}', f'source{i}', PluginState.INDEXED) for i in range(6)]
+        self.view.sync_put_all(plugins)
+        iids = dict(zip([p.source for p in plugins], self.view.get_children()))
+        self.view.selection_set(iids['source3'])
+
+        # Removed, added and moved rows
+        plugins = [plugins[5], plugins[0], IndexedPluginDbModel('name', 'source', PluginState.INDEXED),
+                   plugins[3], plugins[2], plugins[1]]
+        self.view.sync_put_all(plugins)
+        self.assertEqual([self.view.get_object_by_iid(iid).source for iid in self.view.get_children()],
+                         [p.source for p in plugins])
+        self.assertEqual(self.view.get_all_objects(), plugins)
+        # Remaining rows keep their iid and selection
+        self.assertEqual(self.view.get_children()[3], iids['source3'])
+        self.assertEqual(self.view.selection(), (iids['source3'],))
+
+        # Changed rows are updated
+        plugins[0] = IndexedPluginDbModel('renamed', 'source5', PluginState.INDEXED)
+        self.view.sync_put_all(plugins)
+        self.assertEqual(self.view.item(self.view.get_children()[0], 'values'), ('renamed', 'source5'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import threading
+import unittest
+from concurrent.futures import wait
+
+from naevpm.core.task_scheduler import TaskScheduler, TaskKind, TaskPriority
+
+
+class TestTaskScheduler(unittest.TestCase):
+
+    def test_bounded_workers(self):
+        scheduler = TaskScheduler(network_workers=3, disk_workers=1)
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+        release = threading.Event()
+
+        def task():
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            release.wait(5)
+            with lock:
+                running[0] -= 1
+            return 'done'
+
+        futures = [scheduler.submit(task, TaskKind.NETWORK) for _ in range(20)]
+        release.set()
+        wait(futures, 5)
+        self.assertEqual(max_running[0], 3)
+        self.assertEqual([f.result() for f in futures], ['done'] * 20)
+        scheduler.shutdown(wait=True)
+
+    def test_priority_and_cancel(self):
+        scheduler = TaskScheduler(network_workers=1, disk_workers=1)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def blocking_task():
+            started.set()
+            release.wait(5)
+
+        blocking_future = scheduler.submit(blocking_task, TaskKind.DISK)
+        started.wait(5)
+        # The only worker is busy. Everything else is queued.
+        background_future = scheduler.submit(lambda: order.append('background'), TaskKind.DISK,
+                                             TaskPriority.BACKGROUND)
+        interactive_future = scheduler.submit(lambda: order.append('interactive'), TaskKind.DISK,
+                                              TaskPriority.INTERACTIVE)
+        # Other kinds of tasks do not wait for the busy worker
+        network_future = scheduler.submit(lambda: 'network', TaskKind.NETWORK)
+        self.assertEqual(network_future.result(5), 'network')
+        release.set()
+        wait([blocking_future, background_future, interactive_future], 5)
+        self.assertEqual(order, ['interactive', 'background'])
+
+        release.clear()
+        started.clear()
+        blocking_future = scheduler.submit(blocking_task, TaskKind.DISK)
+        started.wait(5)
+        queued_future = scheduler.submit(lambda: order.append('cancelled'), TaskKind.DISK)
+        self.assertEqual(scheduler.cancel_queued(), 1)
+        self.assertTrue(queued_future.cancelled())
+        release.set()
+        blocking_future.result(5)
+        self.assertEqual(order, ['interactive', 'background'])
+
+        # Exceptions are passed on by the future
+        def failing_task():
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            scheduler.submit(failing_task).result(5)
+        scheduler.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
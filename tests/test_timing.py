@@ -0,0 +1,60 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from naevpm.core.timing import Timings
+
+
+class TestTiming(unittest.TestCase):
+
+    def test_disabled(self):
+        timings = Timings()
+        with timings.span('step') as span:
+            span.add_bytes(10)
+            span.add_items(1)
+        self.assertEqual(timings.get_stats(), [])
+        # All disabled spans are the same object, so nothing is allocated
+        self.assertIs(timings.span('a'), timings.span('b'))
+
+    def test_span(self):
+        timings = Timings(enabled=True)
+        for i in range(3):
+            with timings.span('outer') as outer_span:
+                outer_span.add_bytes(100)
+                outer_span.add_bytes(None)
+                with timings.span('inner') as inner_span:
+                    inner_span.add_items(2)
+        with self.assertRaises(ValueError):
+            with timings.span('failing'):
+                raise ValueError()
+
+        stats = {s.name: s for s in timings.get_stats()}
+        self.assertEqual(set(stats.keys()), {'outer', 'inner', 'failing'})
+        self.assertEqual(stats['outer'].count, 3)
+        self.assertEqual(stats['outer'].bytes, 300)
+        self.assertEqual(stats['outer'].items, 0)
+        self.assertEqual(stats['inner'].items, 6)
+        self.assertEqual(stats['failing'].count, 1)
+        # Nested spans are part of the outer span
+        self.assertGreaterEqual(stats['outer'].total_seconds, stats['inner'].total_seconds)
+        self.assertGreaterEqual(stats['outer'].max_seconds, stats['outer'].mean_seconds)
+        self.assertEqual(timings.get_stats()[0].name, 'outer')
+
+        timings.reset()
+        self.assertEqual(timings.get_stats(), [])
+
+    def test_threads(self):
+        timings = Timings(enabled=True)
+
+        def step(i: int):
+            with timings.span('step') as span:
+                span.add_items(1)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(step, range(100)))
+        stats = timings.get_stats()
+        self.assertEqual(stats[0].count, 100)
+        self.assertEqual(stats[0].items, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,10 @@ from naevpm.core.models import IndexedPluginDbModel, PluginState
 from naevpm.gui.tk_iid_object_sync import TkIidObjSync
 
 
+def get_object_identifier(plugin: IndexedPluginDbModel) -> str:
+    return plugin.source
+
+
 class TestTkItemIdentifierObjectSync(unittest.TestCase):
 
     def test_sync(self):
@@ -100,6 +104,59 @@ class TestTkItemIdentifierObjectSync(unittest.TestCase):
         except ValueError:
             pass
 
+    def test_per_instance_state(self):
+        sync1 = TkIidObjSync(get_object_identifier)
+        sync2 = TkIidObjSync(get_object_identifier)
+        plugin = IndexedPluginDbModel('name', 'source', PluginState.INDEXED)
+        sync1.put('I001', plugin)
+        # Tk starts the iids of every Treeview at I001
+        sync2.put('I001', plugin)
+        sync2.remove_by_iid('I001')
+        self.assertIs(sync1.get_object_by_iid('I001'), plugin)
+        self.assertTrue(sync2.is_empty())
+
+    def test_order(self):
+        sync = TkIidObjSync(get_object_identifier)
+        self.assertIsNone(sync.get_last_iid())
+        plugins = [IndexedPluginDbModel(f'name{i}', f'source{i}', PluginState.INDEXED)
+                   for i in range(4)]
+        for i, plugin in enumerate(plugins):
+            sync.put(f'I{i}', plugin)
+        self.assertEqual(sync.get_last_iid(), 'I3')
+
+        sync.remove_by_object(plugins[3])
+        self.assertEqual(sync.get_last_iid(), 'I2')
+        copy = IndexedPluginDbModel('changed', 'source1', PluginState.INDEXED)
+        sync.replace('I1', copy)
+        self.assertEqual(sync.get_all_objects(), [plugins[0], copy, plugins[2]])
+        with self.assertRaises(ValueError):
+            sync.replace('I1', plugins[0])
+
+        sync.reorder(['I2', 'I0', 'I1'])
+        self.assertEqual(sync.get_all_item_iids(), ['I2', 'I0', 'I1'])
+        self.assertEqual(sync.get_iid_by_object_id('source2'), 'I2')
+        self.assertIsNone(sync.get_iid_by_object_id('source3'))
+
+    def test_remove(self):
+        sync = TkIidObjSync(get_object_identifier)
+        plugins = [IndexedPluginDbModel(f'name{i}', f'source{i}', PluginState.INDEXED)
+                   for i in range(100)]
+        for i, plugin in enumerate(plugins):
+            sync.put(f'I{i}', plugin)
+
+        # Removes rows spread over the view, half of them by object and half of them by iid
+        for i in range(0, 100, 10):
+            self.assertEqual(sync.remove_by_object(plugins[i]), f'I{i}')
+            sync.remove_by_iid(f'I{i + 5}')
+
+        kept = [i for i in range(100) if i % 5 != 0]
+        self.assertEqual(sync.get_all_item_iids(), [f'I{i}' for i in kept])
+        self.assertEqual(sync.get_all_objects(), [plugins[i] for i in kept])
+        self.assertEqual(sync.get_last_iid(), 'I99')
+        self.assertIsNone(sync.get_iid_by_object_id('source5'))
+        with self.assertRaises(KeyError):
+            sync.get_object_by_iid('I10')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,90 @@
+import tkinter
+import unittest
+
+from naevpm.core.models import IndexedPluginDbModel, PluginState
+from naevpm.gui.virtual_synced_tree_view import VirtualSyncedTreeView
+
+
+class TestVirtualSyncedTreeView(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            self.root = tkinter.Tk()
+        except tkinter.TclError:
+            self.skipTest('No display')
+        self.root.withdraw()
+        self.plugins = [IndexedPluginDbModel(f'name{i:04}', f'source{i:04}', PluginState.INDEXED)
+                        for i in range(1000)]
+        # Not placed in the window, so the number of visible rows stays 1
+        self.view = VirtualSyncedTreeView(
+            get_str_values_fn=lambda p: [p.name, p.source],
+            get_object_identifier_fn=lambda p: p.source,
+            count_fn=lambda: len(self.plugins),
+            get_page_fn=lambda offset, limit: self.plugins[offset:offset + limit],
+            master=self.root,
+            columns=['name', 'source'],
+            show='headings')
+        self.view.BUFFER_ROWS = 10
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def get_inserted_sources(self) -> list[str]:
+        return [self.view.get_object_by_iid(iid).source for iid in self.view.get_children()]
+
+    def test_window(self):
+        self.view.sync_refresh()
+        self.assertEqual(self.get_inserted_sources(), [f'source{i:04}' for i in range(21)])
+
+        # Scrolling within the inserted rows keeps them
+        self.view.yview('scroll', 2, 'units')
+        self.assertEqual(self.get_inserted_sources()[0], 'source0000')
+        self.assertEqual(self.view.yview(), (0.002, 0.003))
+
+        # Scrolling close to the last inserted row replaces them with the rows around the viewport
+        self.view.yview('moveto', 0.5)
+        self.assertEqual(self.get_inserted_sources(), [f'source{i:04}' for i in range(490, 511)])
+        self.assertEqual(self.view.yview(), (0.5, 0.501))
+
+        self.view.yview('moveto', 1.0)
+        self.assertEqual(self.get_inserted_sources(), [f'source{i:04}' for i in range(989, 1000)])
+        self.assertEqual(self.view.yview(), (0.999, 1.0))
+
+        # Rows are read again on refresh
+        del self.plugins[500:]
+        self.view.sync_put_all([])
+        self.assertEqual(self.get_inserted_sources(), [f'source{i:04}' for i in range(489, 500)])
+        self.assertEqual(self.view.yview(), (0.998, 1.0))
+
+    def test_selection(self):
+        self.view.sync_refresh()
+        # The first row is selected by default
+        self.assertEqual(self.view.get_selected_object().source, 'source0000')
+
+        self.view.selection_set(self.view.get_children()[5])
+        # Tk sends it on the next update, which would also run the layout of the Treeview
+        self.view.event_generate('<<TreeviewSelect>>')
+        self.view.yview('moveto', 0.5)
+        # The selected row is not inserted anymore
+        self.assertIsNone(self.view.get_selected_object())
+
+        # The selection is restored when the row is inserted again
+        self.view.yview('moveto', 0.0)
+        self.assertEqual(self.view.get_selected_object().source, 'source0005')
+
+        # Rows which stay inserted keep their iid and selection
+        iid = self.view.get_selected_iid()
+        self.plugins.insert(0, IndexedPluginDbModel('name', 'source', PluginState.INDEXED))
+        self.view.sync_refresh()
+        self.assertEqual(self.view.get_selected_iid(), iid)
+        self.assertEqual(self.get_inserted_sources()[:2], ['source', 'source0000'])
+
+        # Removing the selected row selects its neighbour
+        plugin = self.view.get_selected_object()
+        self.plugins.remove(plugin)
+        self.view.sync_remove(plugin)
+        self.assertEqual(self.view.get_selected_object().source, 'source0004')
+
+
+if __name__ == '__main__':
+    unittest.main()